@@ -0,0 +1,103 @@
+from app.core.config import settings as config
+from app.core.profiling import loop_lag_monitor, sample_stacks
+from app.database.database import ReplicaSessionLocal
+from app.services.audit_partitions import audit_partitions, query_audit_logs
+from app.schemas.client import CredentialCreate, CredentialResponse
+from app.services.client_snapshot import client_snapshot
+from app.services.credential_service import credential_engine
+from app.services.webhook_service import webhook_dispatcher
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import hmac
+import logging
+import uuid
+
+router = APIRouter()
+logger = logging.getLogger("fastapi_app")
+
+PROFILE_MAX_SECONDS = 60
+AUDIT_MAX_RANGE = timedelta(days=31)
+_profile_lock = asyncio.Lock()
+
+async def verify_admin_token(request: Request):
+    token = getattr(config, "ADMIN_TOKEN", None)
+    if not token:
+        raise HTTPException(status_code=403, detail="Rotas administrativas desabilitadas")
+    auth_header = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth_header, f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Não autorizado")
+    return True
+
+@router.get("/loop-lag", dependencies=[Depends(verify_admin_token)])
+async def get_loop_lag():
+    return loop_lag_monitor.stats()
+
+@router.get("/client-snapshot", dependencies=[Depends(verify_admin_token)])
+async def get_client_snapshot():
+    return client_snapshot.stats()
+
+@router.get("/profile", dependencies=[Depends(verify_admin_token)], response_class=PlainTextResponse)
+async def run_profiler(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=100),
+    include_idle: bool = False
+):
+    # Um profiling por vez: amostragem concorrente distorce o resultado
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="Já existe um profiling em execução")
+    async with _profile_lock:
+        logger.info(f"Profiling iniciado por {seconds}s (intervalo {interval_ms}ms)")
+        collapsed = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000, include_idle)
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+@router.get("/audit-logs", dependencies=[Depends(verify_admin_token)])
+async def list_audit_logs(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    client_id: Optional[uuid.UUID] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    include_payload: bool = False
+):
+    # created_at é UTC sem fuso: parâmetros com offset são convertidos antes de comparar
+    since, until = _naive_utc(since), _naive_utc(until)
+    until = until or datetime.utcnow()
+    since = since or until - timedelta(days=1)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="'since' deve ser anterior a 'until'")
+    # Intervalo limitado para que a consulta toque no máximo duas partições mensais
+    if until - since > AUDIT_MAX_RANGE:
+        raise HTTPException(status_code=400, detail=f"Intervalo máximo de {AUDIT_MAX_RANGE.days} dias")
+    async with ReplicaSessionLocal() as session:
+        return await query_audit_logs(session, since, until, client_id, cursor, limit, include_payload)
+
+@router.post("/audit-logs/maintenance", dependencies=[Depends(verify_admin_token)])
+async def run_audit_maintenance():
+    return await audit_partitions.run_once()
+
+@router.post("/webhooks/{client_id}/requeue", dependencies=[Depends(verify_admin_token)])
+async def requeue_webhooks(client_id: uuid.UUID):
+    requeued = await webhook_dispatcher.requeue_dead_letters(str(client_id))
+    return {"client_id": str(client_id), "requeued_events": requeued}
+
+@router.post("/clients/{client_id}/credentials", dependencies=[Depends(verify_admin_token)], response_model=CredentialResponse, status_code=201)
+async def issue_credential(client_id: uuid.UUID, body: CredentialCreate):
+    # api_secret e signing_key só aparecem nesta resposta
+    return await credential_engine.issue(client_id, body.label, body.expires_in_days)
+
+@router.delete("/credentials/{credential_id}", dependencies=[Depends(verify_admin_token)])
+async def revoke_credential(credential_id: uuid.UUID):
+    if not await credential_engine.revoke(credential_id):
+        raise HTTPException(status_code=404, detail="Credencial não encontrada ou já revogada")
+    return {"id": str(credential_id), "revoked": True}
@@ -0,0 +1,19 @@
+from app.schemas.schemas import BatchRequest, BatchResponse
+from app.services.batch_service import run_batch
+from fastapi import APIRouter, HTTPException, Request
+import logging
+
+router = APIRouter()
+logger = logging.getLogger("fastapi_app")
+
+@router.post("", response_model=BatchResponse)
+async def batch_requests(request: Request, payload: BatchRequest):
+    client = getattr(request.state, "client", None)
+    if not client:
+        raise HTTPException(status_code=401, detail="Cliente não autenticado")
+
+    ids = [sub.id for sub in payload.requests]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="IDs de sub-requisição duplicados")
+
+    return {"responses": await run_batch(request, payload.requests)}
@@ -1,8 +1,5 @@
 from app.core.config import settings as config
 from app.schemas.schemas import UploadPicturePayload, UploadPictureResponse
-
-import requests
-from firebase_admin import storage, auth
 from fastapi import APIRouter, HTTPException, Depends, status, Header
 import logging
 
@@ -17,7 +14,8 @@ async def get_current_user(authorization: str = Header(...)):
         )
     
     id_token = authorization.split("Bearer ")[1]
-    
+
+    from firebase_admin import auth
     try:
         decoded_token = auth.verify_id_token(id_token)
         return decoded_token
@@ -32,6 +30,9 @@ async def upload_profile_picture(
     payload: UploadPicturePayload,
     current_user = Depends(get_current_user)
 ):
+    import requests
+    from firebase_admin import storage
+
     uid = current_user['uid']
     photo_url = str(payload.photo_url)
 
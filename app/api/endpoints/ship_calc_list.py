@@ -0,0 +1,17 @@
+from app.schemas.schemas import ShippingQuoteRequest, ShippingQuoteResponse
+from app.services.shipping_service import quote_cart
+from fastapi import APIRouter
+import logging
+
+router = APIRouter()
+logger = logging.getLogger("fastapi_app")
+
+@router.post("/quotes", response_model=ShippingQuoteResponse)
+async def calculate_shipping_quotes(payload: ShippingQuoteRequest):
+    quotes = await quote_cart(
+        items=payload.items,
+        destinations=payload.destinations,
+        origin_cep=payload.origin_cep,
+        carriers=payload.carriers
+    )
+    return {"quotes": quotes}
@@ -0,0 +1,35 @@
+from app.middlewares.cache_middleware import etag_matches
+from app.services.image_proxy import decode_token, image_proxy, normalize_width
+from fastapi import APIRouter, Query, Request
+from starlette.responses import Response
+from typing import Optional
+import logging
+
+router = APIRouter()
+logger = logging.getLogger("fastapi_app")
+
+@router.get("/{token}")
+async def get_product_image(request: Request, token: str, w: Optional[int] = Query(None, ge=1, le=4096)):
+    url = decode_token(token)
+    width = normalize_width(w)
+    accept = request.headers.get("accept", "")
+    if_none_match = request.headers.get("if-none-match")
+
+    # ETag endereçado por conteúdo: revalidação sem buscar, redimensionar nem ler o arquivo
+    if if_none_match:
+        etag = await image_proxy.cached_etag(url, width, accept)
+        if etag and etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers=image_headers(etag))
+
+    content, media_type, etag = await image_proxy.get(url, width, accept)
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=image_headers(etag))
+    return Response(content=content, media_type=media_type, headers=image_headers(etag))
+
+
+def image_headers(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=86400",
+        "Vary": "Accept",
+    }
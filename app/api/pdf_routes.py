@@ -1,5 +1,9 @@
 import logging
-from fastapi import APIRouter
+from app.services.event_hub import event_hub, sse_stream
+from app.services.pdf_queue import issue_events_token, pdf_events_topic, pdf_queue, verify_events_token
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
 
 router = APIRouter()
 logger = logging.getLogger("fastapi_app")
@@ -17,5 +21,29 @@ async def download_pdf(task_id: str):
     return None
 
 @router.get("/pdf-queue")
-async def view_pdf_queue():
-    return None
+async def view_pdf_queue(request: Request):
+    return [job.model_dump(mode="json") for job in pdf_queue.pending(request.state.client.id)]
+
+@router.post("/pdf-events/token")
+async def create_pdf_events_token(request: Request):
+    """ Token de curta duração para `new EventSource(".../pdf-events?token=...")`. """
+    client = request.state.client
+    token, expires = issue_events_token(client.id)
+    return {"token": token, "expires_at": expires}
+
+@router.get("/pdf-events")
+async def stream_pdf_events(token: Optional[str] = Query(None), last_event_id: Optional[str] = Header(None)):
+    # O token identifica o cliente: o stream só recebe os jobs dele
+    client_id = verify_events_token(token)
+    if client_id is None:
+        raise HTTPException(status_code=401, detail="Token inválido ou expirado")
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+
+    return StreamingResponse(
+        sse_stream(event_hub, pdf_events_topic(client_id), last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,7 +1,12 @@
 from app.api.utils.api_caller import api_request
 from app.core.config import settings as config
+from app.services.image_proxy import proxy_url
+from app.services.product_loader import product_loader
+from app.services.static_frontend import serve_asset
+from app.services.catalog_export import EXPORT_FORMATS, decode_cursor, stream_catalog
 from app.schemas.schemas import PaginatedProductsResponse, ProductResponse, CategoryResponse, ContactFormCreate, ContactFormResponse, MainPageContentResponse, FeaturedProductResponse
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 import logging
 
@@ -84,7 +89,7 @@ async def list_products(
     return await api_request(endpoint=ENDPOINT_WMS_PROD_LIST,method="GET",params=params)
 
 @router.get("/featured", response_model=List[FeaturedProductResponse])
-async def list_featured_products():
+async def list_featured_products(request: Request):
     limit: int = 6
     response = await api_request(endpoint=ENDPOINT_WMS_FEAT_PROD,method="GET",params={"limit": limit})
     products = response
@@ -94,7 +99,7 @@ async def list_featured_products():
             "id":       p.get("id_produto"),
             "name":     p.get("nome_comercial"),
             "price":    formatar_preco(p.get("preco_venda")),
-            "image":    p.get("imagem_principal"),
+            "image":    proxy_url(p.get("imagem_principal"), str(request.base_url)),
             "category": p.get("categoria_nome"),
             "is_active": p.get("ativo"),
             "created_at": p.get("data_criacao")
@@ -102,14 +107,36 @@ async def list_featured_products():
         for p in products
     ]
 
+@router.get("/export")
+async def export_products(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+):
+    client = getattr(request.state, "client", None)
+    if not client:
+        raise HTTPException(status_code=401, detail="Cliente não autenticado")
+
+    # CSV não carrega cursor: só o NDJSON é retomável
+    if cursor and format == "csv":
+        raise HTTPException(status_code=400, detail="Exportação CSV não pode ser retomada; use format=ndjson")
+    start_page = decode_cursor(cursor)
+    params = {"app_id": str(config.API_APP_ID)}
+    if search:     params["search"]    = search
+    if category:   params["category"]  = category
+
+    return StreamingResponse(
+        stream_catalog(ENDPOINT_WMS_PROD_LIST, params, fmt=format, start_page=start_page),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="catalog.{format}"'}
+    )
+
 @router.get("/search")
 async def search_products_endpoint():
     return True
 
-@router.get("/{product_id}")
-async def get_product():
-    return True
-
 @router.get("/categories")
 async def list_categories():
     return True
@@ -126,6 +153,14 @@ async def submit_contact_form():
 async def get_main_page_content_endpoint():
     return True
 
+# Rota dinâmica declarada após as rotas fixas (/categories, /search, ...)
+@router.get("/{product_id}")
+async def get_product(product_id: int):
+    product = await product_loader.load(product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    return product
+
 @router.get("/app/{path:path}")
-async def serve_frontend(path: str):
-    return True
\ No newline at end of file
+async def serve_frontend(request: Request, path: str):
+    return await serve_asset(request, path)
\ No newline at end of file
@@ -1,13 +1,18 @@
 import httpx
+import logging
 import hmac
 import hashlib
 import random
 import string
+import time
 from datetime import datetime, timezone
 from app.core.config import settings
+from app.core.metrics import current_timings, wms_request_seconds
 
 BACKEND_URL=settings.API_WMS_URL
 
+logger = logging.getLogger("fastapi_app")
+
 def generate_alleatory_string():
     base36=string.digits + string.ascii_lowercase[:26]
     response = ''.join(random.choices(base36,k=13))
@@ -24,7 +29,8 @@ async def api_request(
     method: str = "GET",
     params: dict = None,
     body: dict = None,
-    extra_headers: dict = None
+    extra_headers: dict = None,
+    http_client: httpx.AsyncClient = None
 ):
     appId = str(settings.API_APP_ID)
     appKey = str(settings.API_APP_KEY)
@@ -51,21 +57,38 @@ async def api_request(
         **(extra_headers or {})
     }
 
+    # Reaproveita o cliente (pool de conexões) quando o chamador fornece um
+    if http_client is not None:
+        return await _send(http_client, method, endpoint, params, payload, base_headers)
+
     async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            response = await client.request(
-                method=method,
-                url=f"{BACKEND_URL}{endpoint}",
-                params=params,
-                json=payload,
-                headers=base_headers
-            )
+        return await _send(client, method, endpoint, params, payload, base_headers)
+
+async def _send(client: httpx.AsyncClient, method, endpoint, params, payload, headers):
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await client.request(
+            method=method,
+            url=f"{BACKEND_URL}{endpoint}",
+            params=params,
+            json=payload,
+            headers=headers
+        )
 
-            response.raise_for_status()
-            return response.json()
-        except httpx.ConnectError as e:
-            print("CONEXÃO FALHOU:", e)
-            raise
-        except httpx.TimeoutException as e:
-            print("TIMEOUT:", e)
-            raise
\ No newline at end of file
+        response.raise_for_status()
+        outcome = "ok"
+        return response.json()
+    except httpx.ConnectError as e:
+        logger.error(f"CONEXÃO FALHOU: {endpoint} - {e}")
+        raise
+    except httpx.TimeoutException as e:
+        logger.error(f"TIMEOUT: {endpoint} - {e}")
+        outcome = "timeout"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        wms_request_seconds.observe(elapsed, endpoint, outcome)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add("wms", elapsed, histogram=None)
\ No newline at end of file
@@ -2,6 +2,7 @@ import logging
 from typing import Dict
 
 from fastapi import logger, Depends
+from pydantic import ValidationError
 from sqlalchemy import and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -16,7 +17,7 @@ def client_base_query():
     return (
         select(Client)
         .options(
-            selectinload(Client.audit_logs),
+            # audit_logs não é carregado: cresce a cada request e não faz parte do ClientResponse
             selectinload(Client.credentials),
         )
     )
@@ -36,8 +37,14 @@ async def find_by_site_key(site_key: str, db: AsyncSession = Depends(get_async_s
 
         if not clients:
             return None
-        
-        return ClientResponse.model_validate(clients)
+
+        try:
+            return ClientResponse.model_validate(clients)
+        except ValidationError as e:
+            # Registro inconsistente (ex.: allowed_origins NULL) é uma chave
+            # inutilizável, não falha do banco: 403 em vez de 503
+            logger.warning(f"Cliente {clients.id} com dados inválidos ignorado: {e}")
+            return None
     except Exception as e:
         logger.error(f"Error in find_by_site_key: {e}")
         return []
\ No newline at end of file
@@ -0,0 +1,145 @@
+# app/core/cache.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+MISSING = object()
+BATCH_LOADER_MAX_BATCH = 100
+
+
+class TTLCache:
+    """
+    Cache LRU em memória com expiração por entrada. `get` retorna `MISSING`
+    quando a chave não existe ou expirou, permitindo armazenar `None`
+    (útil para cache negativo).
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class BatchLoader:
+    """
+    Agrupa as chaves solicitadas no mesmo ciclo do event loop e resolve todas
+    com uma única chamada a `batch_fn`. Chamadas concorrentes pela mesma chave
+    compartilham o mesmo future; resultados (inclusive ausências) ficam em
+    cache com TTL. `prime`/`clear` durante uma busca em andamento avançam a
+    versão da chave e o resultado (já antigo) dessa busca não é cacheado.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, dict]]],
+        ttl: float,
+        negative_ttl: float,
+        maxsize: int,
+        max_batch: int = BATCH_LOADER_MAX_BATCH,
+    ):
+        self.batch_fn = batch_fn
+        self.negative_ttl = negative_ttl
+        self.max_batch = max_batch
+        self.cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._versions: Dict[Hashable, int] = {}   # só chaves pendentes
+        self._queue: List[Hashable] = []
+        self._scheduled = False
+
+    async def load(self, key: Hashable) -> Optional[dict]:
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return cached
+
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            self._versions[key] = 0
+            self._queue.append(key)
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+
+        # shield: o cancelamento de um chamador não cancela os demais
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[dict]]:
+        return list(await asyncio.gather(*[self.load(k) for k in keys]))
+
+    def prime(self, key: Hashable, value: Optional[dict]):
+        self._bump(key)
+        self._store(key, value)
+
+    def clear(self, key: Hashable = None):
+        self._bump(key)
+        if key is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(key)
+
+    def _bump(self, key: Hashable = None):
+        for k in (self._versions if key is None else (key,)):
+            if k in self._versions:
+                self._versions[k] += 1
+
+    def _store(self, key: Hashable, value: Optional[dict]):
+        self.cache.set(key, value, None if value is not None else self.negative_ttl)
+
+    def _dispatch(self):
+        self._scheduled = False
+        queue, self._queue = self._queue, []
+        for i in range(0, len(queue), self.max_batch):
+            asyncio.ensure_future(self._resolve(queue[i:i + self.max_batch]))
+
+    async def _resolve(self, keys: List[Hashable]):
+        try:
+            found = await self.batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                self._versions.pop(key, None)
+                future = self._pending.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        for key in keys:
+            value = found.get(key)
+            if self._versions.pop(key, 0) == 0:
+                self._store(key, value)
+            else:
+                # Escrita local durante a busca: o cache já tem o valor novo (ou foi limpo)
+                cached = self.cache.get(key)
+                if cached is not MISSING:
+                    value = cached
+            future = self._pending.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(value)
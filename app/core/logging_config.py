@@ -1,15 +1,121 @@
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
 _loggers_cache = {}
+_listeners = []
 
+# ID da requisição corrente; preenchido pelo LoggingMiddleware
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
 
-def setup_logging(logger_name: str, log_file: str = None) -> logging.Logger:
+# Atributos padrão do LogRecord; o restante veio de `extra=` e vai para o JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sample_rate"}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Amostragem por nível (ex.: {"DEBUG": 0.01, "INFO": 0.5}). Um registro pode
+    definir a própria taxa com `extra={"sample_rate": 0.01}`. WARNING e acima
+    nunca são descartados.
+    """
+
+    def __init__(self, rates: dict = None):
+        super().__init__()
+        self.rates = {logging.getLevelName(k) if isinstance(k, str) else k: v for k, v in (rates or {}).items()}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = getattr(record, "sample_rate", None)
+        if rate is None:
+            rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    Resolve a mensagem e o traceback antes de enfileirar (o registro não
+    pode carregar objetos da requisição para outra thread), mas mantém os
+    campos separados para a formatação no listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogRateLimiter:
+    """ Permite no máximo `limit` eventos por chave a cada `interval` segundos. """
+
+    def __init__(self, limit: int = 1, interval: float = 10.0):
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str):
+        """ Retorna (permitido, quantos foram suprimidos desde o último permitido). """
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            if count < self.limit:
+                self._windows[key] = (start, count + 1, 0)
+                return True, suppressed
+            self._windows[key] = (start, count, suppressed + 1)
+            return False, suppressed + 1
+
+
+def setup_logging(logger_name: str, log_file: str = None, json_format: bool = True, sample_rates: dict = None) -> logging.Logger:
+    """
+    Configura o logger com um QueueHandler: a requisição apenas enfileira o
+    registro e um QueueListener em thread própria faz a escrita em arquivo e
+    console (incluindo o rollover).
+    """
     if logger_name in _loggers_cache:
         return _loggers_cache[logger_name]
-    
+
     try:
         if log_file:
             try:
@@ -18,19 +124,23 @@ def setup_logging(logger_name: str, log_file: str = None) -> logging.Logger:
             except Exception as e:
                 print(f"⚠️  Aviso: Não foi possível criar diretório de logs: {e}")
                 log_file = None
-        
+
         # 2. Formato do Log
-        log_formatter = logging.Formatter(
-            '%(asctime)s - %(process)d - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        if json_format:
+            log_formatter = JsonFormatter()
+        else:
+            log_formatter = logging.Formatter(
+                '%(asctime)s - %(process)d - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
 
         logger = logging.getLogger(logger_name)
         logger.setLevel(logging.INFO)
-        
+
         # Limpar handlers anteriores para evitar duplicação
         logger.handlers.clear()
-        
+
+        handlers = []
         if log_file:
             try:
                 file_handler = RotatingFileHandler(
@@ -41,7 +151,7 @@ def setup_logging(logger_name: str, log_file: str = None) -> logging.Logger:
                     encoding='utf-8'
                 )
                 file_handler.setFormatter(log_formatter)
-                logger.addHandler(file_handler)
+                handlers.append(file_handler)
                 print(f"✅ Logger configurado com arquivo: {log_file}")
             except Exception as e:
                 print(f"⚠️  Aviso: Não foi possível configurar arquivo de log: {e}")
@@ -50,10 +160,21 @@ def setup_logging(logger_name: str, log_file: str = None) -> logging.Logger:
         try:
             console_handler = logging.StreamHandler(sys.stdout)
             console_handler.setFormatter(log_formatter)
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
         except Exception as e:
             print(f"⚠️  Aviso: Não foi possível configurar console handler: {e}")
 
+        # 6. Fila: os filtros rodam no contexto de quem loga (request_id, amostragem)
+        log_queue = queue.SimpleQueue()
+        queue_handler = StructuredQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+        queue_handler.addFilter(RequestIdFilter())
+        logger.addHandler(queue_handler)
+
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+
         def handle_uncaught_exception(exc_type, exc_value, exc_traceback):
             if issubclass(exc_type, KeyboardInterrupt):
                 sys.__excepthook__(exc_type, exc_value, exc_traceback)
@@ -67,11 +188,11 @@ def setup_logging(logger_name: str, log_file: str = None) -> logging.Logger:
                 sys.__excepthook__(exc_type, exc_value, exc_traceback)
 
         sys.excepthook = handle_uncaught_exception
-        
+
         _loggers_cache[logger_name] = logger
-        
+
         return logger
-        
+
     except Exception as e:
         print(f"❌ Erro crítico ao configurar logger: {e}")
         logger = logging.getLogger(logger_name)
@@ -86,7 +207,29 @@ def setup_logging(logger_name: str, log_file: str = None) -> logging.Logger:
         return logger
 
 
+def shutdown_logging():
+    """
+    Esvazia as filas, encerra as threads de escrita e desfaz a configuração:
+    um `setup_logging` posterior (ex.: novo lifespan nos testes) começa do zero
+    em vez de devolver um logger cujo QueueHandler não tem mais listener.
+    """
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    for logger in _loggers_cache.values():
+        for handler in list(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                logger.removeHandler(handler)
+                handler.close()
+    _loggers_cache.clear()
+
+
+atexit.register(shutdown_logging)
+
+
 def get_logger(logger_name: str) -> logging.Logger:
     if logger_name in _loggers_cache:
         return _loggers_cache[logger_name]
-    return logging.getLogger(logger_name)
\ No newline at end of file
+    return logging.getLogger(logger_name)
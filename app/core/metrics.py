@@ -0,0 +1,175 @@
+# app/core/metrics.py
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Buckets padrão em segundos (1ms .. 10s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Limite de séries por métrica; combinações excedentes vão para "__other__"
+MAX_SERIES = 1000
+OTHER = "__other__"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), max_series: int = MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Tuple[str, ...]) -> Tuple[str, ...]:
+        # Sem locks: o event loop roda em uma única thread e as operações
+        # sobre dict/list/int são atômicas sob o GIL.
+        if labels in self._series or len(self._series) < self.max_series:
+            return labels
+        return (OTHER,) * len(self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels)
+        self._series[key] = self._series.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self._series.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS, max_series: int = MAX_SERIES):
+        super().__init__(name, help, labels, max_series)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # [contagens por bucket (não cumulativas)..., +Inf, soma]
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = (), **kwargs) -> Counter:
+        metric = Counter(name, help, labels, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, help, labels, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        """ Coletor chamado na renderização; retorna linhas no formato texto do Prometheus. """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "Requisições HTTP atendidas.", ("method", "route", "status", "tenant"))
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Duração total das requisições HTTP.", ("method", "route"))
+security_stage_seconds = registry.histogram(
+    "security_stage_duration_seconds", "Duração de cada etapa do SecurityMiddleware.", ("stage",))
+wms_request_seconds = registry.histogram(
+    "wms_request_duration_seconds", "Duração das chamadas ao WMS (api_request).", ("endpoint", "outcome"))
+
+
+# --- Tempos por requisição (Server-Timing) ---
+class RequestTimings:
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str, histogram: Histogram = security_stage_seconds):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, histogram)
+
+    def add(self, name: str, elapsed: float, histogram: Optional[Histogram] = security_stage_seconds):
+        self.stages.append((name, elapsed))
+        if histogram is not None:
+            histogram.observe(elapsed, name)
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in self.stages)
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+class BoundedLabel:
+    """ Mantém no máximo `limit` valores distintos; os demais viram "other". """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._seen = set()
+
+    def __call__(self, value: Optional[str]) -> str:
+        if value is None:
+            return "none"
+        if value in self._seen:
+            return value
+        if len(self._seen) < self.limit:
+            self._seen.add(value)
+            return value
+        return "other"
+
+
+tenant_label = BoundedLabel(limit=200)
@@ -0,0 +1,165 @@
+# app/core/profiling.py
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from typing import Optional
+
+from app.core.logging_config import LogRateLimiter
+from app.core.metrics import registry
+
+logger = logging.getLogger("fastapi_app")
+
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+event_loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "Atraso do event loop em relação ao agendamento.", buckets=LOOP_LAG_BUCKETS)
+event_loop_blocks_total = registry.counter(
+    "event_loop_blocks_total", "Bloqueios do event loop acima do limite configurado.")
+
+
+def _format_stack(frame, limit: int = 40) -> str:
+    lines = []
+    while frame is not None and len(lines) < limit:
+        code = frame.f_code
+        lines.append(f'  File "{code.co_filename}", line {frame.f_lineno}, in {code.co_name}')
+        frame = frame.f_back
+    return "\n".join(reversed(lines))
+
+
+class LoopLagMonitor:
+    """
+    Mede o atraso do event loop: uma task dorme `interval` segundos e registra
+    quanto acordou depois do previsto. Um watchdog em thread separada verifica
+    o último batimento; se o loop ficar parado mais que `threshold`, a pilha
+    atual da thread do loop é capturada e registrada no log.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.last_block_stack: Optional[str] = None
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._reported_block = False
+        self._log_limiter = LogRateLimiter(limit=1, interval=30.0)
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.ensure_future(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self._reported_block = False
+            event_loop_lag_seconds.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for < self.threshold or self._reported_block:
+                continue
+            # Um relatório por bloqueio; o próximo batimento rearma o watchdog
+            self._reported_block = True
+            event_loop_blocks_total.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self.last_block_stack = _format_stack(frame)
+            allowed, suppressed = self._log_limiter.allow("loop-block")
+            if allowed:
+                logger.warning(
+                    f"Event loop bloqueado há {blocked_for * 1000:.0f}ms:\n{self.last_block_stack}",
+                    extra={"blocked_ms": round(blocked_for * 1000, 1), "suppressed": suppressed}
+                )
+
+    def stats(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "last_block_stack": self.last_block_stack,
+        }
+
+
+# Frames-folha de espera ociosa, por (arquivo da stdlib, função): uma função
+# `get`/`wait` da aplicação não é confundida com thread parada
+IDLE_FRAMES = frozenset({
+    ("selectors.py", "select"),
+    ("asyncio/base_events.py", "_run_once"),
+    ("asyncio/queues.py", "get"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("concurrent/futures/thread.py", "_worker"),
+})
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    filename = code.co_filename.replace("\\", "/")
+    return any(code.co_name == name and filename.endswith("/" + suffix) for suffix, name in IDLE_FRAMES)
+
+
+def _frame_key(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(duration: float, interval: float = 0.005, include_idle: bool = False) -> str:
+    """
+    Profiler por amostragem: lê `sys._current_frames()` a cada `interval`
+    segundos durante `duration` e retorna as pilhas no formato "collapsed"
+    (frame;frame;frame contagem), aceito pelo flamegraph.pl e speedscope.
+    Deve rodar fora do event loop (ex.: asyncio.to_thread).
+    """
+    own_id = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    counts = _Counter()
+    deadline = time.monotonic() + duration
+
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            # Threads ociosas (esperando em lock/select) poluem o gráfico
+            if not include_idle and _is_idle(frame):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_key(frame))
+                frame = frame.f_back
+            thread_name = names.get(thread_id, str(thread_id))
+            counts[";".join([thread_name] + list(reversed(stack)))] += 1
+        time.sleep(interval)
+
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+
+
+loop_lag_monitor = LoopLagMonitor()
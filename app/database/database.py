@@ -1,34 +1,191 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-import os
-import sys
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import time
 from ..core.config import settings
-from ..core.logging_config import setup_logging
+from ..core.metrics import registry
 from typing import AsyncGenerator, Dict
-import asyncio
-
-setup_logging("fastapi_app", settings.LOG_FILE_PATH) 
 
 DATABASE_URL = settings.DATABASE_URL_CON
 
 DATABASE_GENERAL_URL = settings.DATABASE_GENERAL_URL
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Réplica de leitura opcional; sem ela as leituras vão para o primário
+DATABASE_REPLICA_URL = getattr(settings, "DATABASE_REPLICA_URL", None)
+
+DB_POOL_SIZE = getattr(settings, "DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = getattr(settings, "DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = getattr(settings, "DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = getattr(settings, "DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = getattr(settings, "DB_POOL_PRE_PING", True)
+DB_STATEMENT_CACHE_SIZE = getattr(settings, "DB_STATEMENT_CACHE_SIZE", 500)
+
+
+class EngineStats:
+    """ Contadores de um engine: espera no checkout do pool e latência das queries. """
+
+    __slots__ = ("checkouts", "checkout_wait_total", "checkout_wait_max", "queries", "query_time_total", "query_time_max")
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.queries = 0
+        self.query_time_total = 0.0
+        self.query_time_max = 0.0
+
+    def record_checkout(self, elapsed: float):
+        self.checkouts += 1
+        self.checkout_wait_total += elapsed
+        if elapsed > self.checkout_wait_max:
+            self.checkout_wait_max = elapsed
+
+    def record_query(self, elapsed: float):
+        self.queries += 1
+        self.query_time_total += elapsed
+        if elapsed > self.query_time_max:
+            self.query_time_max = elapsed
+
+
+_engines: Dict[str, AsyncEngine] = {}
+_engine_stats: Dict[str, EngineStats] = {}
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Sessionmakers sem bind; os engines são associados em init_engines()
 SessionLocal = sessionmaker(
-    engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
-
-engineGeneral = create_async_engine(DATABASE_GENERAL_URL, echo=False)
+ReplicaSessionLocal = sessionmaker(
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
 GeneralSessionLocal = sessionmaker(
-    engineGeneral,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
+
+def _instrumented_pool_class(stats: EngineStats):
+    # Atributo de classe: sobrevive ao pool.recreate() feito por engine.dispose()
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return AsyncAdaptedQueuePool._do_get(self)
+        finally:
+            stats.record_checkout(time.perf_counter() - start)
+
+    return type("InstrumentedAsyncPool", (AsyncAdaptedQueuePool,), {"_do_get": _do_get})
+
+
+def _create_engine(name: str, url: str) -> AsyncEngine:
+    stats = _engine_stats.setdefault(name, EngineStats())
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        connect_args = {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        }
+
+    engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=_instrumented_pool_class(stats),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        stats.record_query(time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _on_error(exception_context):
+        # Sem after_cursor_execute em caso de erro: descarta o início pendente
+        conn = exception_context.connection
+        if conn is not None and not conn.closed and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+    return engine
+
+
+def get_engine(name: str = "primary") -> AsyncEngine:
+    """ Cria o engine sob demanda: `primary`, `replica` ou `general`. """
+    engine = _engines.get(name)
+    if engine is None:
+        if name == "replica" and not DATABASE_REPLICA_URL:
+            return get_engine("primary")
+        url = {
+            "primary": DATABASE_URL,
+            "replica": DATABASE_REPLICA_URL,
+            "general": DATABASE_GENERAL_URL,
+        }[name]
+        engine = _engines[name] = _create_engine(name, url)
+    return engine
+
+
+def init_engines():
+    """ Associa os sessionmakers aos engines. Chamado no lifespan da aplicação. """
+    SessionLocal.configure(bind=get_engine("primary"))
+    ReplicaSessionLocal.configure(bind=get_engine("replica"))
+    GeneralSessionLocal.configure(bind=get_engine("general"))
+
+
+async def dispose_engines():
+    for engine in _engines.values():
+        await engine.dispose()
+    _engines.clear()
+
+
+def db_pool_stats() -> Dict[str, dict]:
+    stats = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        engine_stats = _engine_stats[name]
+        stats[name] = {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": engine_stats.checkouts,
+            "checkout_wait_avg_ms": round(engine_stats.checkout_wait_total / engine_stats.checkouts * 1000, 3) if engine_stats.checkouts else 0.0,
+            "checkout_wait_max_ms": round(engine_stats.checkout_wait_max * 1000, 3),
+            "queries": engine_stats.queries,
+            "query_avg_ms": round(engine_stats.query_time_total / engine_stats.queries * 1000, 3) if engine_stats.queries else 0.0,
+            "query_max_ms": round(engine_stats.query_time_max * 1000, 3),
+        }
+    return stats
+
+
+def _render_db_metrics():
+    lines = [
+        "# HELP db_pool_checked_out Conexões em uso no pool.",
+        "# TYPE db_pool_checked_out gauge",
+    ]
+    stats = db_pool_stats()
+    lines += [f'db_pool_checked_out{{engine="{name}"}} {s["checked_out"]}' for name, s in stats.items()]
+    lines += ["# HELP db_pool_checkout_wait_seconds_total Tempo total de espera no checkout do pool.",
+              "# TYPE db_pool_checkout_wait_seconds_total counter"]
+    lines += [f'db_pool_checkout_wait_seconds_total{{engine="{name}"}} {_engine_stats[name].checkout_wait_total}' for name in stats]
+    lines += ["# HELP db_queries_total Queries executadas.",
+              "# TYPE db_queries_total counter"]
+    lines += [f'db_queries_total{{engine="{name}"}} {_engine_stats[name].queries}' for name in stats]
+    lines += ["# HELP db_query_seconds_total Tempo total gasto em queries.",
+              "# TYPE db_query_seconds_total counter"]
+    lines += [f'db_query_seconds_total{{engine="{name}"}} {_engine_stats[name].query_time_total}' for name in stats]
+    return lines
+
+
+registry.register_collector(_render_db_metrics)
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session:
         try:
@@ -1,56 +1,77 @@
-import hashlib
-import hmac
 import json
-import redis.asyncio as redis
+import logging
 import uuid
-from app.api.utils.auth_client import find_by_site_key
 from app.core.config import settings as config
-from app.core.logging_config import setup_logging
-from app.database.database import get_async_session, SessionLocal
+from app.core.logging_config import LogRateLimiter, request_id_var
+from app.core.metrics import RequestTimings, current_timings, http_request_seconds, http_requests_total, tenant_label
+from app.database.database import SessionLocal, ReplicaSessionLocal
 from app.models.client import Client, AuditLog
 from app.schemas.client import AuthModeEnum
+from app.services.batch_service import BATCH_PATH, BATCH_MAX_REQUESTS
+from app.services.client_context import ClientContext, client_contexts
+from app.services.cors_policy import apply_cors_headers, cors_registry, is_preflight
+from app.services.site_key_filter import site_key_filter
+from app.services.credential_service import credential_engine
+from app.services.pdf_queue import PDF_EVENTS_PATH
+from app.services.quota_service import quota_engine
 from datetime import datetime, timezone
-from fastapi import Request, HTTPException, Request, Depends
+from fastapi import Request, HTTPException, Request
 from fastapi.security import HTTPBearer
-from firebase_admin import auth as firebase_auth
-from jose import jwt
-from starlette.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import insert
 
-logger = setup_logging("fastapi_app", config.LOG_FILE_PATH) 
+logger = logging.getLogger("fastapi_app")
 
 NONCE_CACHE = {}
 
-async def bloquear_sql_injection(request: Request, call_next):
+# Assets do frontend e imagens são buscados pelo navegador sem os headers de Site Key;
+# /metrics e /api/v1/admin têm autenticação própria (METRICS_TOKEN / ADMIN_TOKEN) e o
+# stream de PDF (EventSource) usa o token assinado da query string
+PUBLIC_PATH_PREFIXES = ("/api/v1/products/app/", "/api/v1/images/", "/api/v1/admin/")
+PUBLIC_PATHS = frozenset({"/metrics", PDF_EVENTS_PATH})
 
-    corpo = await request.body()
-    conteudo = corpo.decode(errors="ignore").lower()
-    if any(palavra in conteudo for palavra in ["drop table", "insert into", "delete from", "<script>"]):
-        return JSONResponse(status_code=400, content={"erro": "Conteúdo potencialmente malicioso detectado."})
-    
-    if request.method == "POST":
-        body = await request.form()
-        for key, value in body.items():
-            if isinstance(value, str):
-                if len(value) > 5000:
-                    return JSONResponse(status_code=400, content={"erro": f"Campo {key} muito longo."})
-    return await call_next(request)
+async def read_scanned_body(request: Request, context: ClientContext) -> bytes:
+    """
+    Lê o corpo chunk a chunk passando pelo scanner de conteúdo do cliente
+    (padrões bloqueados + limite por campo) e para no primeiro problema, sem
+    receber o resto do upload. O corpo fica em cache no request, como em
+    `request.body()`, para a autenticação, a rota e a auditoria.
+    """
+    scanner = context.content_policy.scanner(request.headers.get("content-type"))
+    if scanner is None:
+        return await request.body()
+    chunks = []
+    async for chunk in request.stream():
+        chunks.append(chunk)
+        violation = scanner.feed(chunk)
+        if violation:
+            # Auditoria grava o trecho recebido até a violação
+            request._body = b"".join(chunks)
+            raise HTTPException(status_code=400, detail=violation)
+    # `request._body` é atributo interno do Starlette. A partir da 0.28 o
+    # `_CachedRequest` do BaseHTTPMiddleware repassa `_body` à rota
+    # (`wrapped_receive`); em versões anteriores o corpo lido aqui não chega à
+    # rota. Exige starlette>=0.28 (fastapi>=0.100); revisar ao atualizar.
+    request._body = b"".join(chunks)
+    violation = scanner.finish()
+    if violation:
+        raise HTTPException(status_code=400, detail=violation)
+    return request._body
 
 def verificar_autenticacao(request: Request):
 
     try:
         auth_header = request.headers.get('Authorization')
         if not auth_header:
-           print("Acesso não autorizado. Efetuar login 0001.")
+           logger.info("Acesso não autorizado. Efetuar login 0001.")
            return False, "Acesso não autorizado. Efetuar login. 0001"
 
         if not auth_header.startswith('Bearer '):
             return False, "Acesso não autorizado. Efetuar login. 0002."
 
         id_token = auth_header.split("Bearer ")[1]
-        
+
+        from firebase_admin import auth as firebase_auth
         decoded_token = firebase_auth.verify_id_token(id_token)
 
         uid = decoded_token['uid']
@@ -72,12 +93,31 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         self.blocked_ips = set()
         
     async def dispatch(self, request: Request, call_next):
-        try:
-            if request.method == "OPTIONS":
-                return await call_next(request)
+        # Preflight respondido aqui, do cache, sem chegar às rotas
+        if is_preflight(request.method, request.headers):
+            return await cors_registry.preflight(request.headers)
+
+        if request.method == "OPTIONS":
+            return await call_next(request)
+
+        origin = request.headers.get("origin")
+        path = request.url.path
+        if path in PUBLIC_PATHS or path.startswith(PUBLIC_PATH_PREFIXES):
+            response = await call_next(request)
+            if origin and await cors_registry.allows(origin):
+                apply_cors_headers(response, origin)
+            return response
 
+        timings = RequestTimings()
+        timings_token = current_timings.set(timings)
+        context = None
+        body_bytes = b""
+        audited = False
+        try:
             client_ip = request.client.host
-            if await self.is_ip_blocked(client_ip):
+            with timings.stage("ip_block"):
+                blocked = await self.is_ip_blocked(client_ip)
+            if blocked:
                 raise HTTPException(
                     status_code=403,
                     detail="IP bloqueado por atividade suspeita"
@@ -90,29 +130,48 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                     detail="Site Key é obrigatória"
                 )
             
-            async with SessionLocal() as db_session:
-                client = await find_by_site_key(site_key, db_session)
-                if not client:
-                    raise HTTPException(
-                        status_code=403,
-                        detail="Site Key inválida"
-                    )
-            
+            # Leitura na réplica (com cache do contexto); a escrita do audit vai para o primário.
+            # Chaves fora do filtro de Bloom ou rejeitadas há pouco nem chegam ao banco.
+            with timings.stage("client_lookup"):
+                context = None
+                if site_key_filter.might_exist(site_key):
+                    context = await client_contexts.get(site_key, ReplicaSessionLocal)
+                    if not context:
+                        site_key_filter.reject(site_key)
+            if not context:
+                raise HTTPException(
+                    status_code=403,
+                    detail="Site Key inválida"
+                )
+            client = context.client
+
+            # Antes da autenticação: o HMAC e a rota usam o corpo já verificado
+            with timings.stage("content_scan"):
+                body_bytes = await read_scanned_body(request, context)
+
+            with timings.stage("auth"):
                 if client.auth_mode == AuthModeEnum.OPEN:
-                    await self.validate_google_auth(request, client)
+                    await self.validate_google_auth(request, context)
                 else:
                     await self.validate_enterprise_auth(request, client)
-                
+            
+            with timings.stage("rate_limit"):
                 await self.check_rate_limit(client)
-                
-                await self.check_quota(client)
-                
-                # ADICIONA CLIENTE NO REQUEST
-                request.state.client = client
-                
-                await self.audit_log(request, client, db_session)
             
-            response = await call_next(request)
+            # Lotes consomem uma unidade de quota por sub-requisição
+            with timings.stage("quota"):
+                await self.check_quota(client, await self.request_weight(request))
+            
+            # ADICIONA CLIENTE NO REQUEST
+            request.state.client = client
+            
+            with timings.stage("app"):
+                response = await call_next(request)
+            
+            # Auditoria depois da resposta: a política amostra sucessos e sempre grava falhas
+            with timings.stage("audit"):
+                await self.audit_log(request, context, body_bytes, response.status_code)
+            audited = True
             
             # HEADERS DE SEGURANÇA
             response.headers["X-App-ID"] = str(config.API_APP_ID)
@@ -121,20 +180,38 @@ class SecurityMiddleware(BaseHTTPMiddleware):
             response.headers["X-RateLimit-Remaining"] = str(
                 await self.get_remaining_quota(client)
             )
+            response.headers["Server-Timing"] = timings.server_timing()
+            if origin and self.cors_allowed(context, origin):
+                # Cliente com "*" responde sem credenciais, como no preflight
+                apply_cors_headers(response, origin, credentials=not context.origins.allow_all)
             
             return response
             
-        except HTTPException:
+        except HTTPException as e:
+            if context is not None:
+                await self.audit_log(request, context, await request.body(), e.status_code, str(e.detail))
             raise
         except Exception as e:
+            # Erro inesperado também é auditado (falhas nunca são amostradas)
+            if context is not None and not audited:
+                await self.audit_log(request, context, body_bytes, 500, f"Erro interno: {e!r}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Erro interno: {str(e)}"
             )
+        finally:
+            current_timings.reset(timings_token)
     
-    async def validate_google_auth(self, request: Request, client: Client):
+    @staticmethod
+    def cors_allowed(context: ClientContext, origin: str) -> bool:
+        # Cliente sem allowed_origins: vale a lista global (ALLOWED_HOSTS)
+        if context.origins.empty:
+            return cors_registry.static.matches(origin)
+        return context.origins.matches(origin)
+    
+    async def validate_google_auth(self, request: Request, context: ClientContext):
         origin = request.headers.get("origin")
-        if client.allowed_origins and origin not in client.allowed_origins:
+        if not context.origin_allowed(origin):
             raise HTTPException(
                 status_code=403,
                 detail=f"Invalid Req"
@@ -155,25 +232,23 @@ class SecurityMiddleware(BaseHTTPMiddleware):
             )
     
     async def validate_enterprise_auth(self, request: Request, client: Client):
-        # 1. Valida API Key
+        # 1. Headers obrigatórios
         api_key = request.headers.get("X-API-Key")
-        if not api_key or api_key != client.api_key:
+        signature = request.headers.get("X-Signature")
+        timestamp = request.headers.get("X-Timestamp")
+        
+        if not api_key:
             raise HTTPException(
                 status_code=401,
                 detail="API Key inválida"
             )
-        
-        # 2. Valida HMAC Signature
-        signature = request.headers.get("X-Signature")
-        timestamp = request.headers.get("X-Timestamp")
-        
         if not signature or not timestamp:
             raise HTTPException(
                 status_code=401,
                 detail="Assinatura HMAC obrigatória"
             )
         
-        # 3. Anti-replay attack
+        # 2. Anti-replay attack
         now = int(datetime.now(timezone.utc).timestamp())
         if abs(now - int(timestamp)) > config.HMAC_EXPIRY_SECONDS:
             raise HTTPException(
@@ -181,25 +256,15 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 detail="Request expirado ou replay attack detectado"
             )
         
-        # 4. Pega body
+        # 3. Pega body
         body = await request.body()
         payload = body.decode() if body else "{}"
         
-        # 5. Verifica HMAC
-        message = f"{timestamp}:{payload}"
-        expected_signature = hmac.new(
-            client.api_secret.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        if not hmac.compare_digest(expected_signature, signature):
-            raise HTTPException(
-                status_code=403,
-                detail="Assinatura HMAC inválida"
-            )
+        # 4. Credencial (client_credentials ou chave legada do cliente) + HMAC
+        # com a chave de assinatura derivada de api_secret_hash + pepper do servidor
+        await credential_engine.authenticate(client, api_key, timestamp, payload, signature)
         
-        # 6. Valida JWT token (se enviado)
+        # 5. Valida JWT token (se enviado)
         auth_header = request.headers.get('Authorization')
         if not auth_header:
             raise HTTPException(
@@ -215,6 +280,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
 
         token = auth_header.split("Bearer ")[1]
 
+        from jose import jwt
         try:
             payload = jwt.decode(
                 token,
@@ -234,9 +300,15 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                     detail="Acesso não autorizado. 0003."
                 )
     
-    async def check_rate_limit(self, client: Client):
+    async def get_redis(self):
+        # Import tardio: redis.asyncio só é carregado na primeira requisição
         if not self.redis:
+            import redis.asyncio as redis
             self.redis = await redis.from_url(config.REDIS_URL)
+        return self.redis
+    
+    async def check_rate_limit(self, client: Client):
+        await self.get_redis()
         
         key = f"ratelimit:{client.id}:{datetime.now(timezone.utc).timestamp()}"
         current = await self.redis.incr(key)
@@ -255,91 +327,110 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 }
             )
     
-    async def check_quota(self, client: Client):
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        key = f"quota:{client.id}:{today}"
-        
-        if not self.redis:
-            self.redis = await redis.from_url(config.REDIS_URL)
-        
-        current = await self.redis.get(key) or 0
-        current = int(current)
-        
-        if current >= client.daily_quota:
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "error": "Quota diária excedida",
-                    "limit": client.daily_quota,
-                    "reset": "amanhã",
-                    "upgrade": "https://akirafn.com.br/contact"
-                }
-            )
-        
-        await self.redis.incr(key)
-        await self.redis.expire(key, 86400)
+    async def request_weight(self, request: Request) -> int:
+        if request.method != "POST" or request.url.path.rstrip("/") != BATCH_PATH:
+            return 1
+        try:
+            data = json.loads(await request.body() or b"{}")
+            return max(1, min(len(data.get("requests", [])), BATCH_MAX_REQUESTS))
+        except Exception:
+            return 1
     
-    async def get_remaining_quota(self, client: dict) -> int:
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        key = f"quota:{client.id}:{today}"
-        
-        current = await self.redis.get(key) or 0
-        quota = client.daily_quota
-        
-        return max(0, quota - int(current))
+    async def check_quota(self, client: Client, weight: int = 1):
+        # Consome de um bloco reservado localmente; o Redis só é tocado a cada bloco
+        await quota_engine.consume(client, weight)
+    
+    async def get_remaining_quota(self, client: Client) -> int:
+        return quota_engine.remaining(client)
     
     async def is_ip_blocked(self, ip: str) -> bool:
         return await self.redis.sismember("blocked_ips", ip)
     
-    async def audit_log(self, request: Request, client: Client, db_session: AsyncSession = Depends(get_async_session)):
-        headers_dict = dict(request.headers)
-        headers_dict.pop("authorization", None)
-        headers_dict.pop("cookie", None)
-
-        body_bytes = await request.body()
-        body_str = body_bytes.decode("utf-8") if body_bytes else None
+    async def audit_log(self, request: Request, context: ClientContext, body_bytes: bytes, status_code: int, error_message: str = None):
+        client = context.client
+        success = status_code < 400
+        policy = context.audit_policy
+        if not policy.should_record(success):
+            return
 
+        body, body_size, body_sha256, body_encoding = policy.reduce_body(body_bytes)
         log_entry = {
-            "created_at": datetime.now(),
+            # UTC: os limites das partições mensais de audit_logs são em UTC
+            "created_at": datetime.utcnow(),
+            "request_id": request.headers.get("X-Request-ID") or str(uuid.uuid4()),
             "client_id": client.id,
             "site_key_used": client.site_key,
-            "request_headers": headers_dict,
-            "request_body": body_str,
+            "request_headers": policy.filter_headers(request.headers),
+            "request_body": body,
+            "request_body_size": body_size,
+            "request_body_sha256": body_sha256,
+            "request_body_encoding": body_encoding,
+            "response_status": status_code,
             "ip_address": request.client.host,
             "request_method": request.method,
             "request_path": request.url.path,
             "user_agent": request.headers.get("user-agent"),
             "origin": request.headers.get("origin"),
-            "success": True,
+            "success": success,
+            "error_message": error_message,
             "auth_mode": client.auth_mode.value
         }
         
-        if self.redis:
-            redis_payload = json.dumps(log_entry, default=str)
-            key = f"audit:{client.id}"
-            await self.redis.lpush(key, redis_payload)
-            await self.redis.ltrim(key, 0, 999)
-        
-        stmt = insert(AuditLog).values(**log_entry)
-        await db_session.execute(stmt)
-        await db_session.commit()
+        try:
+            if self.redis and policy.redis:
+                redis_payload = json.dumps(log_entry, default=str)
+                key = f"audit:{client.id}"
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.lpush(key, redis_payload)
+                pipe.ltrim(key, 0, 999)
+                await pipe.execute()
+            
+            async with SessionLocal() as db_session:
+                await db_session.execute(insert(AuditLog).values(**log_entry))
+                await db_session.commit()
+        except Exception as e:
+            # Falha na auditoria não derruba a requisição já atendida
+            logger.error(f"Falha ao gravar audit log: {e}", exc_info=True)
     
     async def is_ip_blocked(self, ip: str) -> bool:
-        if not self.redis:
-            self.redis = await redis.from_url(config.REDIS_URL)
+        await self.get_redis()
         
         return await self.redis.sismember("blocked_ips", ip)
 
 
+SLOW_REQUEST_MS = 1000
+# No máximo um aviso de request lento por rota a cada 10s
+slow_request_limiter = LogRateLimiter(limit=1, interval=10.0)
+
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         start_time = datetime.now(timezone.utc)
         request_id = request.headers.get("X-Request-ID", str(uuid.uuid4()))
-        response = await call_next(request)
-        process_time = (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
-        response.headers["X-Request-ID"] = request_id
-        response.headers["X-Process-Time"] = str(round(process_time, 2))
-        if process_time > 1000:
-            print(f"⚠️ Request lento: {request.url.path} - {process_time}ms")
-        
-        return response
\ No newline at end of file
+        token = request_id_var.set(request_id)
+        try:
+            response = await call_next(request)
+            process_time = (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
+            self.record_metrics(request, response.status_code, process_time / 1000)
+            response.headers["X-Request-ID"] = request_id
+            response.headers["X-Process-Time"] = str(round(process_time, 2))
+            if process_time > SLOW_REQUEST_MS:
+                allowed, suppressed = slow_request_limiter.allow(request.url.path)
+                if allowed:
+                    logger.warning(
+                        f"Request lento: {request.url.path} - {round(process_time, 2)}ms",
+                        extra={"path": request.url.path, "duration_ms": round(process_time, 2), "suppressed": suppressed}
+                    )
+
+            return response
+        finally:
+            request_id_var.reset(token)
+
+    @staticmethod
+    def record_metrics(request: Request, status_code: int, elapsed: float):
+        # Template da rota (ex.: /api/v1/products/{product_id}) para não explodir a cardinalidade
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        client = getattr(request.state, "client", None)
+        tenant = tenant_label(getattr(client, "client_id", None))
+        http_requests_total.inc(request.method, route_path, str(status_code), tenant)
+        http_request_seconds.observe(elapsed, request.method, route_path)
\ No newline at end of file
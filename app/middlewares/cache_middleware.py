@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings as config
+from app.services.image_proxy import PUBLIC_BASE_URL
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só servimos gzip/identity
+    brotli = None
+
+logger = logging.getLogger("fastapi_app")
+
+# Rotas de conteúdo "quase estático" e o TTL (segundos) de cada uma
+CACHEABLE_PATHS: Dict[str, int] = getattr(config, "RESPONSE_CACHE_PATHS", {
+    "/api/v1/products/featured": 300,
+    "/api/v1/products/categories": 300,
+    "/api/v1/products/main-page/content": 300,
+})
+RESPONSE_CACHE_SIZE = 256
+MIN_COMPRESS_SIZE = 512
+
+
+class CachedResponse:
+    """ Corpo serializado de uma versão da resposta e suas variantes comprimidas. """
+
+    __slots__ = ("etag", "media_type", "variants")
+
+    def __init__(self, body: bytes, media_type: Optional[str]):
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.media_type = media_type
+        self.variants = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=5)
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    accepted = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(entry: CachedResponse, header: Optional[str]) -> str:
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ("br", "gzip"):
+        if encoding in entry.variants and accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, paths: Dict[str, int] = None):
+        super().__init__(app)
+        self.paths = paths if paths is not None else CACHEABLE_PATHS
+        self.cache = TTLCache(ttl=max(self.paths.values(), default=300), maxsize=RESPONSE_CACHE_SIZE)
+
+    async def dispatch(self, request: Request, call_next):
+        ttl = self.paths.get(request.url.path.rstrip("/"))
+        if request.method != "GET" or ttl is None:
+            return await call_next(request)
+
+        # Sem PUBLIC_BASE_URL, URLs absolutas (ex.: imagens do /featured) usam o
+        # host da requisição: o primeiro Host não pode decidir a resposta de todos
+        base = "" if PUBLIC_BASE_URL else str(request.base_url)
+        key = (base, request.url.path, str(sorted(request.query_params.multi_items())))
+        entry = self.cache.get(key)
+
+        if entry is MISSING:
+            response = await call_next(request)
+            if response.status_code != 200:
+                return response
+
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            entry = CachedResponse(body, response.headers.get("content-type"))
+            self.cache.set(key, entry, ttl)
+
+        return self.render(request, entry)
+
+    def render(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {
+            "ETag": entry.etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "no-cache",
+        }
+        if etag_matches(entry.etag, request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+
+        encoding = choose_encoding(entry, request.headers.get("accept-encoding"))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=entry.variants[encoding], headers=headers, media_type=entry.media_type)
@@ -91,6 +91,10 @@ class AuditLog(Base):
     request_path = Column(Text, nullable=False)
     request_headers = Column(JSON, nullable=False)
     request_body = Column(Text, nullable=False)
+    # Redução do payload (app/services/audit_policy.py)
+    request_body_size = Column(Integer)
+    request_body_sha256 = Column(String(64))
+    request_body_encoding = Column(String(16))
     response_status = Column(Integer, nullable=False)
     ip_address = Column(INET)
     user_agent = Column(Text)
@@ -100,12 +104,16 @@ class AuditLog(Base):
     site_key_used = Column(String(100), nullable=False)
     success = Column(Boolean, default=False)
     error_message = Column(Text)
-    created_at = Column(DateTime)
+    # Chave de particionamento: precisa fazer parte da PK
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
 
+    # Particionada por mês (ver app/services/audit_partitions.py). BRIN em created_at
+    # é minúsculo e barato de manter em tabela append-only; o B-tree composto atende
+    # a consulta por cliente + período com paginação keyset.
     __table_args__ = (
-        Index('idx_audit_logs_client_created', client_id),
-        Index('idx_audit_logs_ip_created', created_at),
-        Index('idx_audit_logs_requested_id', request_id),
+        Index('idx_audit_logs_created_brin', created_at, postgresql_using='brin'),
+        Index('idx_audit_logs_client_created', client_id, created_at),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
 
     client = relationship("Client", back_populates="audit_logs")
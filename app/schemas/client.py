@@ -114,6 +114,7 @@ class CredentialResponse(BaseModel):
     id: UUID
     api_key: str
     api_secret: str  # SÓ APARECE UMA VEZ!
+    signing_key: Optional[str] = None  # hex, chave do X-Signature: também só aparece uma vez
     label: str
     expires_at: Optional[datetime]
     created_at: datetime
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr, HttpUrl, field_validator
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from decimal import Decimal
 class CatalogoRequest(BaseModel):
@@ -19,6 +19,7 @@ class PDFRequest(BaseModel):
     requester_name: str
     download_url: str = None
     progress: int = 0
+    client_id: Optional[str] = None  # cliente dono do job: eventos e fila são filtrados por ele
 
 # Base models
 class CategoryBase(BaseModel):
@@ -153,3 +154,49 @@ class TrabalheConoscoRequest(BaseModel):
     mensagem: str
     curriculo_nome: Optional[str] = None
     curriculo_base64: Optional[str] = None
+
+class ShippingItem(BaseModel):
+    sku: Optional[str] = None
+    quantity: int = Field(default=1, ge=1)
+    weight_kg: float = Field(..., gt=0)
+    height_cm: float = Field(..., gt=0)
+    width_cm: float = Field(..., gt=0)
+    length_cm: float = Field(..., gt=0)
+
+class ShippingQuoteRequest(BaseModel):
+    origin_cep: Optional[str] = None
+    destinations: List[str] = Field(..., min_length=1, max_length=50)
+    items: List[ShippingItem] = Field(..., min_length=1, max_length=200)
+    carriers: Optional[List[str]] = None
+
+class ShippingService(BaseModel):
+    service: str
+    price: float
+    delivery_days: int
+
+class ShippingQuote(BaseModel):
+    destination_cep: str
+    carrier: str
+    services: List[ShippingService] = []
+    error: Optional[str] = None
+
+class ShippingQuoteResponse(BaseModel):
+    quotes: List[ShippingQuote]
+
+class BatchSubRequest(BaseModel):
+    id: str
+    method: str = Field(default="GET", pattern="^(GET|POST)$")
+    path: str
+    query: Optional[Dict[str, Any]] = None
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1, max_length=20)
+
+class BatchSubResponse(BaseModel):
+    id: str
+    status: int
+    body: Optional[Any] = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
@@ -0,0 +1,292 @@
+# app/services/audit_partitions.py
+import asyncio
+import base64
+import logging
+import re
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.config import settings as config
+from app.models.client import AuditLog
+from app.services.audit_policy import decode_body
+
+logger = logging.getLogger("fastapi_app")
+
+AUDIT_TABLE = AuditLog.__tablename__
+AUDIT_LEGACY_TABLE = f"{AUDIT_TABLE}_legacy"
+# Recebe linhas fora das partições mensais (relógio adiantado, manutenção atrasada)
+AUDIT_DEFAULT_PARTITION = f"{AUDIT_TABLE}_default"
+AUDIT_RETENTION_MONTHS = getattr(config, "AUDIT_RETENTION_MONTHS", 6)
+AUDIT_PARTITIONS_AHEAD = getattr(config, "AUDIT_PARTITIONS_AHEAD", 2)
+AUDIT_MAINTENANCE_INTERVAL = getattr(config, "AUDIT_MAINTENANCE_INTERVAL", 6 * 3600)
+# Chave fixa do advisory lock: só um worker executa DDL por vez
+AUDIT_MAINTENANCE_LOCK = 0x41554449
+
+AUDIT_ADDED_COLUMNS = (
+    ("request_body_size", "INTEGER"),
+    ("request_body_sha256", "VARCHAR(64)"),
+    ("request_body_encoding", "VARCHAR(16)"),
+)
+
+PARTITION_NAME = re.compile(rf"^{AUDIT_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+# --- Meses ---
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{AUDIT_TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+# --- DDL ---
+async def _relkind(conn: AsyncConnection, name: str) -> Optional[str]:
+    result = await conn.execute(
+        text("SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+             "WHERE c.relname = :name AND n.nspname = current_schema()"),
+        {"name": name}
+    )
+    kind = result.scalar()
+    return kind.decode() if isinstance(kind, bytes) else kind
+
+
+async def list_partitions(conn: AsyncConnection) -> List[Tuple[str, datetime]]:
+    result = await conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = CAST(:parent AS regclass) ORDER BY c.relname"),
+        {"parent": AUDIT_TABLE}
+    )
+    partitions = []
+    for (name,) in result:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+    return partitions
+
+
+async def _convert_legacy_table(conn: AsyncConnection):
+    """
+    Tabela antiga (não particionada): renomeia para `audit_logs_legacy`, junto
+    com seus índices, e cria a tabela particionada no lugar. Só metadados; os
+    dados antigos continuam consultáveis na tabela legacy até saírem da
+    retenção (`drop_expired_legacy`).
+    """
+    await conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} RENAME TO {AUDIT_LEGACY_TABLE}"))
+    result = await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table AND schemaname = current_schema()"),
+        {"table": AUDIT_LEGACY_TABLE}
+    )
+    for (index_name,) in result.all():
+        await conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"'))
+    await conn.run_sync(lambda sync_conn: AuditLog.__table__.create(sync_conn))
+    logger.warning(f"{AUDIT_TABLE} convertida para particionada; dados anteriores em {AUDIT_LEGACY_TABLE}")
+
+
+async def _ensure_columns(conn: AsyncConnection):
+    # Colunas adicionadas depois da criação da tabela; ADD na tabela pai propaga para as partições
+    for name, ddl in AUDIT_ADDED_COLUMNS:
+        await conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} ADD COLUMN IF NOT EXISTS {name} {ddl}"))
+
+
+async def ensure_default_partition(conn: AsyncConnection):
+    # Sem DEFAULT, um insert fora das partições criadas falha e a auditoria se perde
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {AUDIT_DEFAULT_PARTITION} PARTITION OF {AUDIT_TABLE} DEFAULT"))
+
+
+async def _create_partition(conn: AsyncConnection, name: str, month: datetime):
+    start, end = f"{month:%Y-%m-%d}", f"{add_months(month, 1):%Y-%m-%d}"
+    in_range = f"created_at >= '{start}' AND created_at < '{end}'"
+    stranded = (await conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {AUDIT_DEFAULT_PARTITION} WHERE {in_range})"))).scalar()
+    if stranded:
+        # O Postgres recusa a partição nova enquanto a DEFAULT tiver linhas do
+        # intervalo: desanexa, cria, move as linhas e reanexa (tudo na transação)
+        await conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {AUDIT_DEFAULT_PARTITION}"))
+    # Índices da tabela pai (BRIN + cliente/data) são herdados automaticamente
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {AUDIT_TABLE} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    if stranded:
+        await conn.execute(text(f"INSERT INTO {name} SELECT * FROM {AUDIT_DEFAULT_PARTITION} WHERE {in_range}"))
+        await conn.execute(text(f"DELETE FROM {AUDIT_DEFAULT_PARTITION} WHERE {in_range}"))
+        await conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} ATTACH PARTITION {AUDIT_DEFAULT_PARTITION} DEFAULT"))
+        logger.warning(f"Linhas de {AUDIT_DEFAULT_PARTITION} movidas para {name}")
+
+
+async def ensure_partitions(conn: AsyncConnection, now: Optional[datetime] = None, ahead: int = AUDIT_PARTITIONS_AHEAD) -> List[str]:
+    """ Cria a partição DEFAULT e as do mês corrente e dos `ahead` meses seguintes. """
+    await ensure_default_partition(conn)
+    current = month_start(now or datetime.utcnow())
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if await _relkind(conn, name) is not None:
+            continue
+        await _create_partition(conn, name, month)
+        created.append(name)
+    return created
+
+
+async def drop_expired_partitions(conn: AsyncConnection, now: Optional[datetime] = None, retention_months: int = AUDIT_RETENTION_MONTHS) -> List[str]:
+    """ Remove partições inteiras fora da retenção: DROP em vez de DELETE, sem bloat nem vacuum. """
+    cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months)
+    dropped = []
+    for name, month in await list_partitions(conn):
+        if month < cutoff:
+            await conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    # A DEFAULT não tem mês: só as linhas antigas saem
+    await conn.execute(text(f"DELETE FROM {AUDIT_DEFAULT_PARTITION} WHERE created_at < :cutoff"), {"cutoff": cutoff})
+    if await drop_expired_legacy(conn, cutoff):
+        dropped.append(AUDIT_LEGACY_TABLE)
+    return dropped
+
+
+async def drop_expired_legacy(conn: AsyncConnection, cutoff: datetime) -> bool:
+    """ Remove a tabela pré-particionamento quando todas as suas linhas estão fora da retenção. """
+    if await _relkind(conn, AUDIT_LEGACY_TABLE) is None:
+        return False
+    newest = (await conn.execute(text(f"SELECT max(created_at) FROM {AUDIT_LEGACY_TABLE}"))).scalar()
+    if newest is not None and newest >= cutoff:
+        return False
+    await conn.execute(text(f"DROP TABLE {AUDIT_LEGACY_TABLE}"))
+    logger.warning(f"{AUDIT_LEGACY_TABLE} removida: todas as linhas fora da retenção")
+    return True
+
+
+async def maintain_audit_storage(conn: AsyncConnection, now: Optional[datetime] = None) -> dict:
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": AUDIT_MAINTENANCE_LOCK})
+    kind = await _relkind(conn, AUDIT_TABLE)
+    if kind is None:
+        await conn.run_sync(lambda sync_conn: AuditLog.__table__.create(sync_conn))
+    elif kind == "r":
+        await _convert_legacy_table(conn)
+    else:
+        await _ensure_columns(conn)
+    created = await ensure_partitions(conn, now)
+    dropped = await drop_expired_partitions(conn, now)
+    return {"created": created, "dropped": dropped}
+
+
+class AuditPartitionMaintainer:
+    """ Executa a manutenção no startup e depois a cada `interval` segundos. """
+
+    def __init__(self, interval: float = AUDIT_MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self.engine = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, engine):
+        self.engine = engine
+        await self.run_once()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> dict:
+        try:
+            async with self.engine.begin() as conn:
+                result = await maintain_audit_storage(conn)
+        except Exception as e:
+            logger.error(f"Falha na manutenção das partições de {AUDIT_TABLE}: {e}", exc_info=True)
+            return {"created": [], "dropped": [], "error": str(e)}
+        if result["created"] or result["dropped"]:
+            logger.info(f"Partições de {AUDIT_TABLE}: criadas={result['created']} removidas={result['dropped']}")
+        return result
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+
+# --- Consulta keyset ---
+def encode_audit_cursor(created_at: datetime, log_id) -> str:
+    raw = f"{created_at.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_audit_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, log_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(log_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de auditoria inválido")
+
+
+async def query_audit_logs(
+    session,
+    since: datetime,
+    until: datetime,
+    client_id: Optional[uuid.UUID] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    include_payload: bool = False
+) -> dict:
+    """
+    Página de audit logs do mais recente para o mais antigo. O filtro por
+    período permite ao Postgres podar partições; o cursor (created_at, id)
+    evita OFFSET, então cada página custa o mesmo independentemente da posição.
+    """
+    columns = [
+        AuditLog.id, AuditLog.created_at, AuditLog.client_id, AuditLog.request_id,
+        AuditLog.request_method, AuditLog.request_path, AuditLog.response_status,
+        AuditLog.ip_address, AuditLog.site_key_used, AuditLog.success, AuditLog.error_message
+    ]
+    if include_payload:
+        columns += [AuditLog.request_headers, AuditLog.request_body, AuditLog.request_body_encoding,
+                    AuditLog.request_body_size, AuditLog.request_body_sha256]
+
+    conditions = [AuditLog.created_at >= since, AuditLog.created_at < until]
+    if client_id is not None:
+        conditions.append(AuditLog.client_id == client_id)
+    if cursor:
+        cursor_at, cursor_id = decode_audit_cursor(cursor)
+        conditions.append(or_(
+            AuditLog.created_at < cursor_at,
+            and_(AuditLog.created_at == cursor_at, AuditLog.id < cursor_id)
+        ))
+
+    stmt = (
+        select(*columns)
+        .where(*conditions)
+        .order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+        .limit(limit + 1)
+    )
+    rows = (await session.execute(stmt)).mappings().all()
+
+    items = [dict(row) for row in rows[:limit]]
+    for item in items:
+        if item.get("ip_address") is not None:
+            item["ip_address"] = str(item["ip_address"])
+        if include_payload:
+            item["request_body"] = decode_body(item["request_body"], item.pop("request_body_encoding"))
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_audit_cursor(last["created_at"], last["id"])
+    return {"items": items, "next_cursor": next_cursor}
+
+
+audit_partitions = AuditPartitionMaintainer()
@@ -0,0 +1,95 @@
+# app/services/audit_policy.py
+import base64
+import hashlib
+import random
+import zlib
+from typing import Iterable, Mapping, Optional, Tuple
+
+from app.core.config import settings as config
+
+# Headers úteis para forense; os demais (cookies, tokens, credenciais como
+# X-API-Key, cabeçalhos de proxy) não são gravados
+DEFAULT_AUDIT_HEADERS = (
+    "user-agent", "origin", "referer", "content-type", "content-length",
+    "x-request-id", "x-site-key", "x-timestamp", "x-forwarded-for",
+)
+AUDIT_MAX_BODY_BYTES = getattr(config, "AUDIT_MAX_BODY_BYTES", 4096)
+AUDIT_SUCCESS_SAMPLE_RATE = getattr(config, "AUDIT_SUCCESS_SAMPLE_RATE", 1.0)
+AUDIT_COMPRESS_MIN_BYTES = 256
+ENCODING_IDENTITY = "identity"
+ENCODING_ZLIB = "zlib+b64"
+
+
+class AuditPolicy:
+    """
+    Política de auditoria do cliente, lida de `Client.settings["audit"]`:
+
+        {"headers": ["user-agent", ...], "max_body_bytes": 4096,
+         "success_sample_rate": 0.1, "compress": true, "redis": true}
+
+    Falhas são sempre gravadas; a amostragem vale só para requisições bem-sucedidas.
+    """
+    __slots__ = ("headers", "max_body_bytes", "success_sample_rate", "compress", "redis")
+
+    def __init__(
+        self,
+        headers: Iterable[str] = DEFAULT_AUDIT_HEADERS,
+        max_body_bytes: int = AUDIT_MAX_BODY_BYTES,
+        success_sample_rate: float = AUDIT_SUCCESS_SAMPLE_RATE,
+        compress: bool = True,
+        redis: bool = True
+    ):
+        self.headers = frozenset(h.lower() for h in headers)
+        self.max_body_bytes = max(0, int(max_body_bytes))
+        self.success_sample_rate = min(1.0, max(0.0, float(success_sample_rate)))
+        self.compress = bool(compress)
+        self.redis = bool(redis)
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Mapping]) -> "AuditPolicy":
+        audit = (settings or {}).get("audit") or {}
+        if not audit:
+            return DEFAULT_POLICY
+        return cls(
+            headers=audit.get("headers", DEFAULT_AUDIT_HEADERS),
+            max_body_bytes=audit.get("max_body_bytes", AUDIT_MAX_BODY_BYTES),
+            success_sample_rate=audit.get("success_sample_rate", AUDIT_SUCCESS_SAMPLE_RATE),
+            compress=audit.get("compress", True),
+            redis=audit.get("redis", True),
+        )
+
+    def should_record(self, success: bool) -> bool:
+        if not success or self.success_sample_rate >= 1.0:
+            return True
+        return random.random() < self.success_sample_rate
+
+    def filter_headers(self, headers: Mapping[str, str]) -> dict:
+        return {k: v for k, v in headers.items() if k.lower() in self.headers}
+
+    def reduce_body(self, body: Optional[bytes]) -> Tuple[str, int, Optional[str], str]:
+        """
+        Retorna (corpo armazenado, tamanho original, sha256 do trecho descartado, encoding).
+        O hash do restante permite provar o conteúdo completo sem armazená-lo.
+        """
+        body = body or b""
+        size = len(body)
+        tail_hash = None
+        if size > self.max_body_bytes:
+            tail_hash = hashlib.sha256(body[self.max_body_bytes:]).hexdigest()
+            body = body[:self.max_body_bytes]
+
+        if self.compress and len(body) >= AUDIT_COMPRESS_MIN_BYTES:
+            packed = base64.b64encode(zlib.compress(body, 6)).decode("ascii")
+            if len(packed) < len(body):
+                return packed, size, tail_hash, ENCODING_ZLIB
+        return body.decode("utf-8", errors="replace"), size, tail_hash, ENCODING_IDENTITY
+
+
+def decode_body(stored: Optional[str], encoding: Optional[str]) -> Optional[str]:
+    """ Inverso de `reduce_body` para leitura (consulta admin, replay). """
+    if not stored or encoding != ENCODING_ZLIB:
+        return stored
+    return zlib.decompress(base64.b64decode(stored)).decode("utf-8", errors="replace")
+
+
+DEFAULT_POLICY = AuditPolicy()
@@ -0,0 +1,111 @@
+# app/services/batch_service.py
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+logger = logging.getLogger("fastapi_app")
+
+BATCH_PATH = "/api/v1/batch"
+BATCH_MAX_REQUESTS = 20
+BATCH_ALLOWED_PREFIX = "/api/v1/products"
+# Rotas de streaming não fazem sentido dentro de uma resposta combinada
+BATCH_BLOCKED_PATHS = ("/api/v1/products/export",)
+
+
+def validate_sub_path(path: str) -> str:
+    path = "/" + path.lstrip("/")
+    if ".." in path or "?" in path:
+        raise HTTPException(status_code=400, detail=f"Caminho inválido no lote: {path}")
+    if path != BATCH_ALLOWED_PREFIX and not path.startswith(BATCH_ALLOWED_PREFIX + "/"):
+        raise HTTPException(status_code=400, detail=f"Rota não permitida no lote: {path}")
+    if path.rstrip("/") in BATCH_BLOCKED_PATHS:
+        raise HTTPException(status_code=400, detail=f"Rota não permitida no lote: {path}")
+    return path
+
+
+async def dispatch_sub_request(request: Request, method: str, path: str, query: Optional[Dict] = None, body=None) -> Dict:
+    """
+    Executa uma sub-requisição diretamente no roteador da aplicação, sem
+    passar novamente pela pilha de middlewares. O cliente já autenticado é
+    repassado via `request.state`.
+    """
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    for name in (b"origin", b"user-agent", b"accept-language", b"x-request-id"):
+        value = request.headers.get(name.decode())
+        if value is not None:
+            headers.append((name, value.encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": request.url.scheme,
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(query or {}, doseq=True).encode(),
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "app": request.app,
+        "state": {"client": getattr(request.state, "client", None)},
+    }
+    # Reaproveita os exception handlers registrados (ex.: validação -> 422)
+    if "starlette.exception_handlers" in request.scope:
+        scope["starlette.exception_handlers"] = request.scope["starlette.exception_handlers"]
+
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    status = 500
+    response_headers = {}
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await request.app.router(scope, receive, send)
+    except StarletteHTTPException as e:
+        return {"status": e.status_code, "body": {"detail": e.detail}}
+    except Exception as e:
+        logger.error(f"Erro na sub-requisição {method} {path}: {e}", exc_info=True)
+        return {"status": 500, "body": {"detail": "Erro interno"}}
+
+    raw = b"".join(chunks)
+    if "application/json" in response_headers.get("content-type", ""):
+        try:
+            return {"status": status, "body": json.loads(raw) if raw else None}
+        except ValueError:
+            pass
+    return {"status": status, "body": raw.decode("utf-8", errors="replace")}
+
+
+async def run_batch(request: Request, sub_requests) -> List[Dict]:
+    paths = [validate_sub_path(sub.path) for sub in sub_requests]
+    results = await asyncio.gather(*[
+        dispatch_sub_request(request, sub.method, path, sub.query, sub.body)
+        for sub, path in zip(sub_requests, paths)
+    ])
+    return [
+        {"id": sub.id, **result}
+        for sub, result in zip(sub_requests, results)
+    ]
@@ -0,0 +1,154 @@
+# app/services/catalog_export.py
+import asyncio
+import base64
+import csv
+import io
+import json
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from app.api.utils.api_caller import api_request
+from app.core.config import settings
+
+logger = logging.getLogger("fastapi_app")
+
+EXPORT_PAGE_SIZE = 100  # limite do WMS por página
+EXPORT_CONCURRENCY = getattr(settings, "EXPORT_CONCURRENCY", 4)
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+# Colunas fixas do CSV (campos do WMS); o que não estiver aqui vai, em JSON,
+# para a coluna `extra`: nenhum campo é descartado e o cabeçalho não depende
+# da primeira página
+EXPORT_CSV_COLUMNS = (
+    "id_produto", "nome_comercial", "descricao", "categoria_nome",
+    "preco_venda", "ativo", "imagem_principal", "data_criacao",
+)
+EXPORT_CSV_EXTRA = "extra"
+
+
+# --- Cursor ---
+def encode_cursor(page: int) -> str:
+    return base64.urlsafe_b64encode(f"p:{page}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 1
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, page = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        page = int(page)
+        if prefix != "p" or page < 1:
+            raise ValueError(cursor)
+        return page
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de exportação inválido")
+
+
+# --- Páginas do WMS ---
+def extract_page(response) -> Tuple[List[dict], Optional[int]]:
+    """ Normaliza a resposta paginada do WMS em (itens, total de páginas). """
+    if isinstance(response, list):
+        return response, None
+    if not isinstance(response, dict):
+        return [], None
+
+    items = response.get("products")
+    if items is None:
+        items = response.get("items", response.get("data", []))
+
+    pages = response.get("pages")
+    if pages is None and response.get("total") is not None:
+        per_page = response.get("per_page") or EXPORT_PAGE_SIZE
+        pages = -(-int(response["total"]) // int(per_page))
+    return items or [], (int(pages) if pages is not None else None)
+
+
+async def iter_catalog_pages(endpoint: str, params: Dict, start_page: int = 1, concurrency: int = EXPORT_CONCURRENCY) -> AsyncIterator[Tuple[int, List[dict]]]:
+    """
+    Percorre o catálogo do WMS mantendo até `concurrency` páginas em voo e
+    entregando-as em ordem. Apenas a janela atual fica em memória.
+    """
+    async with httpx.AsyncClient(timeout=30.0) as http_client:
+        async def fetch(page: int):
+            page_params = {**params, "page": page, "per_page": EXPORT_PAGE_SIZE}
+            return extract_page(await api_request(endpoint=endpoint, method="GET", params=page_params, http_client=http_client))
+
+        items, total_pages = await fetch(start_page)
+        yield start_page, items
+        if not items:
+            return
+
+        window: List[Tuple[int, asyncio.Future]] = []
+        next_page = start_page + 1
+        exhausted = False
+        try:
+            while True:
+                # Sem total conhecido, avança até encontrar uma página vazia
+                while not exhausted and len(window) < concurrency:
+                    if total_pages is not None and next_page > total_pages:
+                        exhausted = True
+                        break
+                    window.append((next_page, asyncio.ensure_future(fetch(next_page))))
+                    next_page += 1
+
+                if not window:
+                    return
+
+                page, task = window.pop(0)
+                items, _ = await task
+                if not items:
+                    return
+                yield page, items
+        finally:
+            for _, task in window:
+                task.cancel()
+
+
+# --- Serialização ---
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+def _csv_row(item: dict) -> list:
+    extra = {k: v for k, v in item.items() if k not in EXPORT_CSV_COLUMNS}
+    row = [_csv_value(item.get(c)) for c in EXPORT_CSV_COLUMNS]
+    row.append(json.dumps(extra, ensure_ascii=False, default=str) if extra else "")
+    return row
+
+
+async def stream_catalog(endpoint: str, params: Dict, fmt: str = "ndjson", start_page: int = 1) -> AsyncIterator[bytes]:
+    """
+    Gera o catálogo em NDJSON ou CSV conforme as páginas chegam. No NDJSON,
+    após cada página é emitida uma linha {"_cursor": ...} que permite retomar
+    a exportação a partir da página seguinte. O CSV não tem onde carregar o
+    cursor sem quebrar o formato: é sempre exportado do início (a rota
+    rejeita `cursor` com format=csv).
+    """
+    if fmt == "csv" and start_page != 1:
+        raise ValueError("Exportação CSV não pode ser retomada")
+    header_written = False
+
+    async for page, items in iter_catalog_pages(endpoint, params, start_page):
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if not header_written:
+                writer.writerow(EXPORT_CSV_COLUMNS + (EXPORT_CSV_EXTRA,))
+                header_written = True
+            for item in items:
+                writer.writerow(_csv_row(item))
+            chunk = buffer.getvalue()
+        else:
+            lines = [json.dumps(item, ensure_ascii=False, default=str) for item in items]
+            lines.append(json.dumps({"_cursor": encode_cursor(page + 1)}))
+            chunk = "\n".join(lines) + "\n"
+
+        if chunk:
+            yield chunk.encode("utf-8")
@@ -0,0 +1,97 @@
+# app/services/client_context.py
+import asyncio
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from app.api.utils.auth_client import find_by_site_key
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings as config
+from app.schemas.client import ClientResponse
+from app.services.audit_policy import AuditPolicy
+from app.services.client_snapshot import SECRET_FIELDS, client_snapshot
+from app.services.content_scanner import ContentPolicy
+from app.services.cors_policy import OriginMatcher
+
+CLIENT_CONTEXT_TTL = getattr(config, "CLIENT_CONTEXT_TTL", 30)
+CLIENT_CONTEXT_SIZE = getattr(config, "CLIENT_CONTEXT_SIZE", 10000)
+
+
+class ClientContext:
+    """ Cliente resolvido pela site key, com as políticas já compiladas. """
+    __slots__ = ("client", "origins", "audit_policy", "content_policy")
+
+    def __init__(self, client):
+        # Mesmo formato venha do snapshot ou do banco: sem api_key/webhook_secret
+        self.client = client.model_copy(update=SECRET_FIELDS)
+        self.origins = OriginMatcher(client.allowed_origins)
+        self.audit_policy = AuditPolicy.from_settings(client.settings)
+        self.content_policy = ContentPolicy.from_settings(client.settings)
+
+    def origin_allowed(self, origin: Optional[str]) -> bool:
+        # Cliente sem allowed_origins aceita qualquer origem (comportamento original)
+        return self.origins.empty or self.origins.matches(origin)
+
+
+class ClientContextCache:
+    """
+    Cache por site key, alimentado pelo snapshot do host (client_snapshot) e,
+    na falta dele, pela réplica. Alterações no cliente (origens, políticas,
+    status) limpam o cache via `site_key_filter.on_change`; até o snapshot
+    ser regerado, as recargas vão direto à réplica.
+    """
+
+    def __init__(self, ttl: float = CLIENT_CONTEXT_TTL, maxsize: int = CLIENT_CONTEXT_SIZE):
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._changed_at = 0.0   # snapshots gerados antes disso estão desatualizados
+
+    async def get(self, site_key: str, session_factory) -> Optional[ClientContext]:
+        context = self._cache.get(site_key)
+        if context is not MISSING:
+            return context
+        pending = self._loading.get(site_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        # Snapshot compartilhado do host: sem rede; o JSON só é lido uma vez por TTL
+        record = client_snapshot.lookup(site_key, newer_than=self._changed_at)
+        if record is not None:
+            context = ClientContext(ClientResponse.model_validate_json(record))
+            self._cache.set(site_key, context)
+            return context
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[site_key] = future
+        try:
+            async with session_factory() as session:
+                client = await find_by_site_key(site_key, session)
+            if client == []:
+                # find_by_site_key devolve [] em erro de banco: não é uma chave inválida
+                raise HTTPException(status_code=503, detail="Serviço de autenticação indisponível")
+            context = ClientContext(client) if client else None
+            if context is not None:
+                self._cache.set(site_key, context)
+            future.set_result(context)
+            return context
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._loading[site_key]
+
+    def invalidate(self, site_key: str):
+        self._cache.delete(site_key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def invalidate_all(self):
+        """ Clientes alterados no banco: descarta o cache e ignora snapshots anteriores. """
+        self._changed_at = time.time()
+        self._cache.clear()
+
+
+client_contexts = ClientContextCache()
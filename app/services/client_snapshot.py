@@ -0,0 +1,263 @@
+# app/services/client_snapshot.py
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from app.core.config import settings as config
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem snapshot compartilhado, cada worker consulta o banco
+    fcntl = None
+
+logger = logging.getLogger("fastapi_app")
+
+CLIENT_SNAPSHOT_PATH = getattr(
+    config, "CLIENT_SNAPSHOT_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "akira-clients.snap")
+)
+CLIENT_SNAPSHOT_INTERVAL = getattr(config, "CLIENT_SNAPSHOT_INTERVAL", 15)
+CLIENT_SNAPSHOT_MAX_AGE = getattr(config, "CLIENT_SNAPSHOT_MAX_AGE", 120)
+
+# Layout (little-endian):
+#   header  magic[8] generation:u64 built_at:f64 slots:u32 records:u32 data_offset:u64
+#   índice  `slots` entradas de (hash:u64, offset:u32, length:u32), endereçamento aberto
+#   dados   registros: site_key_len:u16 site_key json
+MAGIC = b"CLSNAP01"
+HEADER = struct.Struct("<8sQdIIQ")
+SLOT = struct.Struct("<QII")
+RECORD_PREFIX = struct.Struct("<H")
+# Segredos ficam fora do snapshot (arquivo legível no host) e do contexto em
+# memória: quem precisa deles consulta o banco (CredentialEngine, webhooks)
+SECRET_FIELDS = {"api_key": None, "webhook_secret": None}
+
+
+def key_hash(site_key: str) -> int:
+    value = int.from_bytes(hashlib.blake2b(site_key.encode(), digest_size=8).digest(), "little")
+    return value or 1  # 0 marca slot vazio
+
+
+def build_snapshot(records: Iterable[Tuple[str, bytes]], generation: int) -> bytes:
+    """ Serializa (site_key, json) em um arquivo com índice de tamanho fixo. """
+    records = list(records)
+    slots = 8
+    while slots < len(records) * 2:
+        slots *= 2
+    mask = slots - 1
+
+    index = bytearray(SLOT.size * slots)
+    data = bytearray()
+    data_offset = HEADER.size + len(index)
+    for site_key, payload in records:
+        key = site_key.encode()
+        offset = data_offset + len(data)
+        data += RECORD_PREFIX.pack(len(key)) + key + payload
+        h = key_hash(site_key)
+        slot = h & mask
+        while SLOT.unpack_from(index, slot * SLOT.size)[0] != 0:
+            slot = (slot + 1) & mask
+        SLOT.pack_into(index, slot * SLOT.size, h, offset, len(data) + data_offset - offset)
+
+    header = HEADER.pack(MAGIC, generation, time.time(), slots, len(records), data_offset)
+    return header + bytes(index) + bytes(data)
+
+
+class SnapshotReader:
+    """ Leitura sem locks de um snapshot mapeado em memória (somente leitura). """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.inode = (stat.st_dev, stat.st_ino)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, self.built_at, self.slots, self.records, self.data_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"Snapshot inválido: {path}")
+        self._mask = self.slots - 1
+
+    def get(self, site_key: str) -> Optional[bytes]:
+        h = key_hash(site_key)
+        slot = h & self._mask
+        key = site_key.encode()
+        for _ in range(self.slots):
+            stored, offset, length = SLOT.unpack_from(self._map, HEADER.size + slot * SLOT.size)
+            if stored == 0:
+                return None
+            if stored == h:
+                (key_len,) = RECORD_PREFIX.unpack_from(self._map, offset)
+                start = offset + RECORD_PREFIX.size
+                # Confirma a chave: colisões de hash de 64 bits são raras, não impossíveis
+                if self._map[start:start + key_len] == key:
+                    return self._map[start + key_len:offset + length]
+            slot = (slot + 1) & self._mask
+        return None
+
+    def close(self):
+        self._map.close()
+
+
+class ClientSnapshot:
+    """
+    Snapshot de clientes ativos compartilhado entre os workers do host.
+
+    Um único worker (quem obtém o flock de `<path>.lock`) recarrega os
+    clientes a cada `interval` segundos, grava um arquivo novo e o publica
+    com `os.replace` (troca atômica). Os demais só leem: verificam o inode a
+    cada consulta (no máximo uma vez por segundo) e remapeiam quando muda.
+    Se o refresher morre, o lock é liberado e outro worker assume.
+    """
+
+    def __init__(self, path: str = CLIENT_SNAPSHOT_PATH, interval: float = CLIENT_SNAPSHOT_INTERVAL, max_age: float = CLIENT_SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.enabled = fcntl is not None
+        self.session_factory = None
+        self.is_refresher = False
+        self._reader: Optional[SnapshotReader] = None
+        self._checked_at = 0.0
+        self._lock_file = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Ciclo de vida ---
+    async def start(self, session_factory):
+        if not self.enabled or self._task is not None:
+            return
+        self.session_factory = session_factory
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()  # libera o flock
+            self._lock_file = None
+            self.is_refresher = False
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _try_become_refresher(self) -> bool:
+        if self.is_refresher:
+            return True
+        lock_file = open(self.path + ".lock", "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.is_refresher = True
+        logger.info(f"Worker {os.getpid()} é o refresher do snapshot de clientes ({self.path})")
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                if self._try_become_refresher():
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Falha ao atualizar snapshot de clientes: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    # --- Escrita ---
+    async def _load_records(self) -> List[Tuple[str, bytes]]:
+        from pydantic import ValidationError
+        from sqlalchemy import select
+        from app.models.client import Client
+        from app.schemas.client import ClientResponse, ClientStatusEnum
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Client).where(Client.status.in_([ClientStatusEnum.ACTIVE.value, ClientStatusEnum.TRIAL.value]))
+            )
+            records = []
+            for c in result.scalars().all():
+                # Um registro inválido não derruba o snapshot dos demais; fica de
+                # fora e a consulta ao banco o trata como chave inválida
+                try:
+                    client = ClientResponse.model_validate(c).model_copy(update=SECRET_FIELDS)
+                    records.append((c.site_key, client.model_dump_json().encode()))
+                except ValidationError as e:
+                    logger.warning(f"Cliente {c.id} com dados inválidos fora do snapshot: {e}")
+            return records
+
+    async def refresh(self):
+        records = await self._load_records()
+        current = self._current_reader()
+        generation = (current.generation + 1) if current else 1
+        payload = build_snapshot(records, generation)
+        await asyncio.to_thread(self._publish, payload)
+        self._checked_at = 0.0
+
+    def _publish(self, payload: bytes):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".clients-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    # --- Leitura ---
+    def _current_reader(self) -> Optional[SnapshotReader]:
+        now = time.monotonic()
+        if now - self._checked_at < 1.0:
+            return self._reader
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._reader
+        if self._reader is None or self._reader.inode != (stat.st_dev, stat.st_ino):
+            try:
+                reader = SnapshotReader(self.path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Snapshot de clientes ilegível: {e}")
+                return self._reader
+            old, self._reader = self._reader, reader
+            if old is not None:
+                old.close()
+        return self._reader
+
+    def lookup(self, site_key: str, newer_than: float = 0.0) -> Optional[bytes]:
+        """
+        JSON do ClientResponse para a site key, ou None se não houver snapshot
+        recente (gerado depois de `newer_than`) ou a chave não estiver nele (o
+        chamador consulta o banco).
+        """
+        if not self.enabled:
+            return None
+        reader = self._current_reader()
+        if reader is None or time.time() - reader.built_at > self.max_age or reader.built_at < newer_than:
+            return None
+        return reader.get(site_key)
+
+    def stats(self) -> dict:
+        reader = self._reader
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "refresher": self.is_refresher,
+            "generation": reader.generation if reader else None,
+            "records": reader.records if reader else 0,
+            "age_s": round(time.time() - reader.built_at, 1) if reader else None,
+        }
+
+
+client_snapshot = ClientSnapshot()
@@ -0,0 +1,468 @@
+# app/services/content_scanner.py
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, Mapping, Optional, Tuple
+from urllib.parse import unquote_plus
+
+from app.core.config import settings as config
+from app.core.metrics import registry
+
+DEFAULT_BLOCKED_PATTERNS = ("drop table", "insert into", "delete from", "<script>")
+CONTENT_MAX_FIELD_LENGTH = getattr(config, "CONTENT_MAX_FIELD_LENGTH", 5000)
+CONTENT_SCAN_MAX_PATTERNS = getattr(config, "CONTENT_SCAN_MAX_PATTERNS", 1000)
+# Até aqui, um `find` em C por padrão sobre o chunk normalizado vence o laço
+# byte a byte do autômato em Python; acima, o custo do Aho-Corasick não cresce
+LITERAL_MAX_PATTERNS = getattr(config, "CONTENT_SCAN_LITERAL_MAX_PATTERNS", 64)
+FIELD_NAME_CAPTURE = 64          # bytes do nome do campo guardados para a mensagem de erro
+MULTIPART_MAX_HEADER_BYTES = 16384
+
+MALICIOUS_CONTENT = "Conteúdo potencialmente malicioso detectado."
+
+content_scan_rejections_total = registry.counter(
+    "content_scan_rejections_total", "Requisições recusadas pelo scanner de conteúdo.", ("reason",))
+
+
+def _encode_patterns(patterns: Iterable[str]) -> list:
+    encoded = []
+    for pattern in patterns:
+        data = (pattern or "").lower().encode()
+        if data and data not in encoded:
+            encoded.append(data)
+    return encoded
+
+
+class LiteralMatcher:
+    """
+    Poucos padrões: cada chunk é normalizado uma vez (`bytes.lower`, ASCII) e
+    cada padrão é procurado com `find`. O estado entre chunks são os últimos
+    `maior padrão - 1` bytes, para achar ocorrências que cruzam a fronteira.
+    """
+    __slots__ = ("patterns", "encoded", "_keep")
+    initial = b""
+
+    def __init__(self, encoded: list):
+        self.encoded = encoded
+        self.patterns: Tuple[str, ...] = tuple(p.decode() for p in encoded)
+        self._keep = max(map(len, encoded), default=1) - 1
+
+    @property
+    def empty(self) -> bool:
+        return not self.encoded
+
+    def scan(self, data: bytes, state: bytes = b"") -> Tuple[bytes, Optional[str]]:
+        """ Continua o scan com o sufixo anterior em `state`; retorna (sufixo, padrão encontrado ou None). """
+        if not self.encoded or not data:
+            return state, None
+        lowered = data.lower()
+        if state:
+            boundary = state + lowered[:self._keep]
+            for index, pattern in enumerate(self.encoded):
+                position = boundary.find(pattern)
+                if position != -1 and position + len(pattern) > len(state):
+                    return b"", self.patterns[index]
+        for index, pattern in enumerate(self.encoded):
+            if pattern in lowered:
+                return b"", self.patterns[index]
+        if not self._keep:
+            return b"", None
+        return (state + lowered)[-self._keep:] if len(lowered) < self._keep else lowered[-self._keep:], None
+
+
+class PatternAutomaton:
+    """
+    Aho-Corasick sobre bytes, sem diferenciar maiúsculas (ASCII).
+
+    Os bytes que aparecem nos padrões viram classes (maiúscula e minúscula na
+    mesma classe); os demais caem na classe 0, que sempre volta à raiz. A
+    tabela de transições é densa (estados x classes) e guarda o deslocamento
+    da linha do próximo estado, então cada byte custa duas indexações. Estados
+    que completam um padrão são gravados como `-1 - índice`: o scan para no
+    primeiro achado. Na raiz, o próximo byte que inicia algum padrão é
+    localizado por regex, sem copiar nem normalizar o chunk.
+    """
+    __slots__ = ("patterns", "classes", "delta", "width", "_first")
+    initial = 0
+
+    def __init__(self, encoded: list):
+        self.patterns: Tuple[str, ...] = tuple(p.decode() for p in encoded)
+
+        classes = [0] * 256
+        width = 1
+        for byte in sorted({b for p in encoded for b in p}):
+            if classes[byte]:
+                continue
+            classes[byte] = width
+            upper = bytes([byte]).upper()[0]
+            classes[upper] = width
+            width += 1
+        self.classes = classes
+        self.width = width
+
+        # Trie + links de falha (BFS)
+        goto = [{}]
+        output = [-1]
+        for index, pattern in enumerate(encoded):
+            state = 0
+            for byte in pattern:
+                cls = classes[byte]
+                nxt = goto[state].get(cls)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][cls] = nxt
+                    goto.append({})
+                    output.append(-1)
+                state = nxt
+            if output[state] < 0:
+                output[state] = index
+
+        rows = [[0] * width for _ in goto]
+        fail = [0] * len(goto)
+        queue = deque()
+        for cls, nxt in goto[0].items():
+            rows[0][cls] = nxt
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            if output[state] < 0:
+                output[state] = output[fail[state]]
+            row, fallback = rows[state], rows[fail[state]]
+            for cls in range(width):
+                nxt = goto[state].get(cls)
+                if nxt is None:
+                    row[cls] = fallback[cls]
+                else:
+                    fail[nxt] = fallback[cls]
+                    row[cls] = nxt
+                    queue.append(nxt)
+
+        delta = []
+        for row in rows:
+            delta.extend(-1 - output[nxt] if output[nxt] >= 0 else nxt * width for nxt in row)
+        self.delta = delta
+
+        first = bytes(sorted(b for b in range(256) if classes[b] and rows[0][classes[b]]))
+        self._first = re.compile(b"[" + re.escape(first) + b"]") if first else None
+
+    @property
+    def empty(self) -> bool:
+        return not self.patterns
+
+    def scan(self, data: bytes, state: int = 0) -> Tuple[int, Optional[str]]:
+        """ Continua o scan a partir de `state`; retorna (estado, padrão encontrado ou None). """
+        if self._first is None:
+            return 0, None
+        delta, classes, search = self.delta, self.classes, self._first.search
+        i, n = 0, len(data)
+        while i < n:
+            if state == 0:
+                match = search(data, i)
+                if match is None:
+                    return 0, None
+                i = match.start()
+            state = delta[state + classes[data[i]]]
+            if state < 0:
+                return 0, self.patterns[-1 - state]
+            i += 1
+        return state, None
+
+
+@lru_cache(maxsize=256)
+def compile_patterns(patterns: Tuple[str, ...]):
+    # Clientes com o mesmo conjunto de padrões compartilham o matcher
+    encoded = _encode_patterns(patterns)
+    if len(encoded) <= LITERAL_MAX_PATTERNS:
+        return LiteralMatcher(encoded)
+    return PatternAutomaton(encoded)
+
+
+def _field_name(raw: bytes) -> str:
+    return unquote_plus(raw.decode("utf-8", errors="replace")) or "(sem nome)"
+
+
+class FormFieldLimiter:
+    """ application/x-www-form-urlencoded: tamanho decodificado (em bytes) de cada valor. """
+    __slots__ = ("limit", "in_value", "length", "name")
+    _separators = re.compile(rb"[&=]")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_value = False
+        self.length = 0
+        self.name = bytearray()
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        i, n = 0, len(chunk)
+        while True:
+            match = self._separators.search(chunk, i)
+            end = match.start() if match else n
+            if self.in_value:
+                # "%2F" ocupa 3 bytes e decodifica para 1
+                self.length += (end - i) - 2 * chunk.count(b"%", i, end)
+                if self.length > self.limit:
+                    return _field_name(bytes(self.name))
+            elif len(self.name) < FIELD_NAME_CAPTURE:
+                self.name += chunk[i:min(end, i + FIELD_NAME_CAPTURE - len(self.name))]
+            if match is None:
+                return None
+            i = end + 1
+            if chunk[end] == 0x26:  # &
+                self.in_value = False
+                self.name.clear()
+            elif self.in_value:     # "=" dentro do valor
+                self.length += 1
+            else:
+                self.in_value = True
+                self.length = 0
+
+
+class JsonFieldLimiter:
+    """
+    JSON: tamanho (em caracteres, escapes contam 1) de cada string usada como
+    valor; chaves não entram no limite. O campo reportado é a última chave
+    vista antes de ":".
+
+    Uma string logo após ":" é valor e é rejeitada assim que passa do limite.
+    Nos demais casos (ex.: itens de array) só se sabe ao fim da string: é
+    chave se o próximo caractere não-branco for ":".
+    """
+    __slots__ = (
+        "limit", "in_string", "escape", "skip", "length", "current", "last_string", "key",
+        "value_next", "is_value", "over", "pending",
+    )
+    _outside = re.compile(rb'[":]')
+    _inside = re.compile(rb'["\\]')
+    _non_space = re.compile(rb"[^ \t\r\n]")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_string = False
+        self.escape = False
+        self.skip = 0
+        self.length = 0
+        self.current = bytearray()
+        self.last_string = b""
+        self.key = b""
+        self.value_next = False     # só brancos desde o último ":"
+        self.is_value = False       # string atual com certeza é valor
+        self.over = False           # string atual passou do limite, papel ainda indefinido
+        self.pending = False        # string longa fechada, aguardando o próximo caractere
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        i, n = 0, len(chunk)
+        while i < n:
+            if self.escape:
+                # \uXXXX: pula os 4 dígitos (podem estar no próximo chunk)
+                self.escape = False
+                self.skip = 5 if chunk[i] == 0x75 else 1
+            if self.skip:
+                step = min(self.skip, n - i)
+                self.skip -= step
+                i += step
+                continue
+            if not self.in_string:
+                if self.pending:
+                    match = self._non_space.search(chunk, i)
+                    if match is None:
+                        return None
+                    self.pending = False
+                    if chunk[match.start()] != 0x3A:  # não é chave: valor acima do limite
+                        return _field_name(self.key)
+                    i = match.start()
+                    continue
+                match = self._outside.search(chunk, i)
+                stop = match.start() if match else n
+                if self.value_next and chunk[i:stop].strip():
+                    self.value_next = False
+                if match is None:
+                    return None
+                i = match.end()
+                if chunk[stop] == 0x3A:  # :
+                    self.key = self.last_string
+                    self.value_next = True
+                else:
+                    self.in_string = True
+                    self.is_value = self.value_next
+                    self.value_next = False
+                    self.over = False
+                    self.length = 0
+                    self.current.clear()
+                continue
+            match = self._inside.search(chunk, i)
+            end = match.start() if match else n
+            if len(self.current) < FIELD_NAME_CAPTURE:
+                self.current += chunk[i:min(end, i + FIELD_NAME_CAPTURE - len(self.current))]
+            self.length += end - i
+            if self.length > self.limit:
+                if self.is_value:
+                    return _field_name(self.key)
+                self.over = True
+            if match is None:
+                return None
+            i = end + 1
+            if chunk[end] == 0x5C:  # \
+                self.length += 1
+                self.escape = True
+            else:
+                self.in_string = False
+                self.last_string = bytes(self.current)
+                self.pending = self.over
+        return None
+
+    def finish(self) -> Optional[str]:
+        # Fim do corpo logo após uma string longa: não era chave
+        return _field_name(self.key) if self.pending else None
+
+
+class MultipartFieldLimiter:
+    """
+    multipart/form-data: tamanho de cada parte que não é arquivo (mesma regra
+    do antigo `request.form()`, que só checava valores str). Só o sufixo que
+    pode conter o início de um delimitador fica retido entre chunks.
+    """
+    __slots__ = ("limit", "delimiter", "buffer", "state", "length", "name", "is_file")
+    PREAMBLE, HEADERS, DATA, DONE = range(4)
+    _name = re.compile(rb'[;\s]name="([^"]*)"', re.IGNORECASE)
+    _filename = re.compile(rb"filename\*?=", re.IGNORECASE)
+
+    def __init__(self, boundary: bytes, limit: int):
+        self.limit = limit
+        self.delimiter = b"\r\n--" + boundary
+        self.buffer = bytearray(b"\r\n")  # o primeiro delimitador não tem CRLF antes
+        self.state = self.PREAMBLE
+        self.length = 0
+        self.name = b""
+        self.is_file = False
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        buffer = self.buffer
+        buffer += chunk
+        while True:
+            if self.state == self.DONE:
+                buffer.clear()
+                return None
+            if self.state == self.HEADERS:
+                if len(buffer) >= 2 and buffer[:2] == b"--":
+                    self.state = self.DONE
+                    continue
+                end = buffer.find(b"\r\n\r\n")
+                if end == -1:
+                    if len(buffer) > MULTIPART_MAX_HEADER_BYTES:
+                        return "(cabeçalho multipart)"
+                    return None
+                headers = bytes(buffer[:end])
+                del buffer[:end + 4]
+                match = self._name.search(headers)
+                self.name = match.group(1)[:FIELD_NAME_CAPTURE] if match else b""
+                self.is_file = self._filename.search(headers) is not None
+                self.length = 0
+                self.state = self.DATA
+                continue
+
+            index = buffer.find(self.delimiter)
+            consumed = index if index != -1 else max(0, len(buffer) - len(self.delimiter) + 1)
+            if self.state == self.DATA and not self.is_file:
+                self.length += consumed
+                if self.length > self.limit:
+                    return _field_name(self.name)
+            if index == -1:
+                del buffer[:consumed]
+                return None
+            del buffer[:index + len(self.delimiter)]
+            self.state = self.HEADERS
+
+
+def _boundary(content_type: str) -> Optional[bytes]:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary" and value:
+            return value.strip('"').encode("latin-1")
+    return None
+
+
+class ContentScanner:
+    """ Estado do scan de um corpo: alimentado chunk a chunk, para na primeira violação. """
+    __slots__ = ("matcher", "state", "fields")
+
+    def __init__(self, matcher, fields=None):
+        self.matcher = matcher
+        self.state = matcher.initial
+        self.fields = fields
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """ Mensagem de erro da primeira violação, ou None. """
+        self.state, pattern = self.matcher.scan(chunk, self.state)
+        if pattern is not None:
+            content_scan_rejections_total.inc("pattern")
+            return MALICIOUS_CONTENT
+        if self.fields is not None:
+            field = self.fields.feed(chunk)
+            if field is not None:
+                content_scan_rejections_total.inc("field_length")
+                return f"Campo {field} muito longo."
+        return None
+
+    def finish(self) -> Optional[str]:
+        """ Chamado ao fim do corpo: violações que dependiam do próximo byte. """
+        finish = getattr(self.fields, "finish", None)
+        field = finish() if finish is not None else None
+        if field is not None:
+            content_scan_rejections_total.inc("field_length")
+            return f"Campo {field} muito longo."
+        return None
+
+
+class ContentPolicy:
+    """
+    Política de conteúdo do cliente, lida de `Client.settings["content_scan"]`:
+
+        {"enabled": true, "patterns": ["drop table", ...],
+         "extra_patterns": ["union select"], "max_field_length": 5000}
+
+    `patterns` substitui a lista padrão; `extra_patterns` acrescenta a ela.
+    """
+    __slots__ = ("enabled", "matcher", "max_field_length")
+
+    def __init__(
+        self,
+        patterns: Iterable[str] = DEFAULT_BLOCKED_PATTERNS,
+        max_field_length: int = CONTENT_MAX_FIELD_LENGTH,
+        enabled: bool = True
+    ):
+        self.enabled = bool(enabled)
+        self.matcher = compile_patterns(tuple(patterns)[:CONTENT_SCAN_MAX_PATTERNS])
+        self.max_field_length = max(0, int(max_field_length))
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Mapping]) -> "ContentPolicy":
+        scan = (settings or {}).get("content_scan") or {}
+        if not scan:
+            return DEFAULT_CONTENT_POLICY
+        patterns = list(scan.get("patterns", DEFAULT_BLOCKED_PATTERNS)) + list(scan.get("extra_patterns", ()))
+        return cls(
+            patterns=patterns,
+            max_field_length=scan.get("max_field_length", CONTENT_MAX_FIELD_LENGTH),
+            enabled=scan.get("enabled", True),
+        )
+
+    def scanner(self, content_type: Optional[str]) -> Optional[ContentScanner]:
+        """ Scanner para um corpo com esse Content-Type, ou None se não há o que verificar. """
+        if not self.enabled:
+            return None
+        media_type = (content_type or "").split(";", 1)[0].strip().lower()
+        fields = None
+        if self.max_field_length:
+            if media_type == "application/x-www-form-urlencoded":
+                fields = FormFieldLimiter(self.max_field_length)
+            elif media_type == "multipart/form-data":
+                boundary = _boundary(content_type)
+                if boundary:
+                    fields = MultipartFieldLimiter(boundary, self.max_field_length)
+            elif media_type == "application/json" or media_type.endswith("+json"):
+                fields = JsonFieldLimiter(self.max_field_length)
+        if fields is None and self.matcher.empty:
+            return None
+        return ContentScanner(self.matcher, fields)
+
+
+DEFAULT_CONTENT_POLICY = ContentPolicy()
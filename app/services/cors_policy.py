@@ -0,0 +1,217 @@
+# app/services/cors_policy.py
+import asyncio
+import logging
+import time
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+from starlette.responses import PlainTextResponse, Response
+
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings as config
+
+logger = logging.getLogger("fastapi_app")
+
+CORS_MAX_AGE = getattr(config, "CORS_MAX_AGE", 7200)   # limite do Chromium; Firefox aceita até 24h
+CORS_INDEX_TTL = getattr(config, "CORS_INDEX_TTL", 60)
+CORS_ALLOW_METHODS = "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+CORS_EXPOSE_HEADERS = "X-Request-ID, X-Process-Time, X-RateLimit-Limit, X-RateLimit-Remaining, X-App-ID, X-API-Version"
+
+
+def split_origin(origin: str) -> Optional[Tuple[str, str, str]]:
+    """ "https://App.Example.com:8443" -> ("https", "app.example.com", ":8443") """
+    scheme, sep, netloc = origin.strip().rstrip("/").lower().partition("://")
+    if not sep or not netloc or "/" in netloc:
+        return None
+    host, colon, port = netloc.rpartition(":")
+    if not colon or not port.isdigit():
+        host, port = netloc, ""
+    else:
+        port = ":" + port
+    return scheme, host, port
+
+
+class OriginMatcher:
+    """
+    Conjunto de origens compilado para consultas O(1):
+
+        "https://app.example.com"   origem exata
+        "https://*.example.com"     qualquer subdomínio (não inclui example.com)
+        "*.example.com"             qualquer subdomínio, qualquer esquema
+        "*"                         qualquer origem
+
+    Curingas viram entradas (esquema, ".sufixo", porta); a verificação testa
+    um sufixo por nível do host, sem percorrer a lista de padrões.
+    """
+    __slots__ = ("allow_all", "exact", "wildcards", "empty")
+
+    def __init__(self, patterns: Optional[Iterable[str]]):
+        exact = set()
+        wildcards = set()
+        self.allow_all = False
+        for pattern in patterns or ():
+            pattern = (pattern or "").strip()
+            if not pattern:
+                continue
+            if pattern == "*":
+                self.allow_all = True
+                continue
+            if "://" not in pattern:
+                pattern = "*://" + pattern
+            parts = split_origin(pattern)
+            if parts is None:
+                logger.warning(f"Padrão de origem inválido ignorado: {pattern}")
+                continue
+            scheme, host, port = parts
+            scheme = "" if scheme == "*" else scheme
+            if host.startswith("*."):
+                wildcards.add((scheme, host[1:], port))
+            elif scheme:
+                exact.add((scheme, host, port))
+            else:
+                exact.add(("http", host, port))
+                exact.add(("https", host, port))
+        self.exact: FrozenSet[tuple] = frozenset(exact)
+        self.wildcards: FrozenSet[tuple] = frozenset(wildcards)
+        self.empty = not (self.allow_all or exact or wildcards)
+
+    def matches(self, origin: Optional[str]) -> bool:
+        if self.allow_all:
+            return True
+        if not origin:
+            return False
+        parts = split_origin(origin)
+        if parts is None:
+            return False
+        if parts in self.exact:
+            return True
+        if not self.wildcards:
+            return False
+        scheme, host, port = parts
+        index = host.find(".")
+        while index != -1:
+            suffix = host[index:]
+            if (scheme, suffix, port) in self.wildcards or ("", suffix, port) in self.wildcards:
+                return True
+            index = host.find(".", index + 1)
+        return False
+
+
+def apply_cors_headers(response: Response, origin: str, credentials: bool = True):
+    # Sem credenciais ("*"): o navegador não envia cookies/Authorization e nada é ecoado
+    if credentials:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+    else:
+        response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Expose-Headers"] = CORS_EXPOSE_HEADERS
+    vary = response.headers.get("Vary")
+    if not vary:
+        response.headers["Vary"] = "Origin"
+    elif "origin" not in vary.lower():
+        response.headers["Vary"] = f"{vary}, Origin"
+
+
+def is_preflight(method: str, headers) -> bool:
+    return method == "OPTIONS" and "origin" in headers and "access-control-request-method" in headers
+
+
+class CorsRegistry:
+    """
+    Preflights não trazem X-Site-Key, então são respondidos contra a união de
+    `ALLOWED_HOSTS` com os `allowed_origins` de todos os clientes ativos
+    (recarregada a cada `CORS_INDEX_TTL`). A requisição real ainda passa pela
+    verificação da origem do próprio cliente. Os headers de cada preflight
+    ficam em cache por (origem, método, headers solicitados).
+
+    Um "*" em `allowed_origins` de um cliente não entra na união: senão toda
+    origem seria ecoada com credenciais para todos os clientes. Se algum
+    cliente usa "*", origens fora da união recebem um preflight sem
+    credenciais (`Access-Control-Allow-Origin: *`).
+    """
+
+    def __init__(self, index_ttl: float = CORS_INDEX_TTL, max_age: int = CORS_MAX_AGE):
+        self.index_ttl = index_ttl
+        self.max_age = max_age
+        self.static = OriginMatcher(getattr(config, "ALLOWED_HOSTS", None) or [])
+        self.matcher = self.static
+        self.any_origin_tenants = False
+        self.session_factory = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._preflights = TTLCache(ttl=index_ttl, maxsize=4096)
+
+    async def _load_patterns(self) -> list:
+        from sqlalchemy import select
+        from app.models.client import Client
+        from app.schemas.client import ClientStatusEnum
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Client.allowed_origins)
+                .where(Client.status.in_([ClientStatusEnum.ACTIVE.value, ClientStatusEnum.TRIAL.value]))
+            )
+            patterns = set()
+            for (origins,) in result:
+                patterns.update(origins or ())
+        return list(patterns)
+
+    async def refresh(self, force: bool = False):
+        if self.session_factory is None or (not force and time.monotonic() - self._loaded_at < self.index_ttl):
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._loaded_at < self.index_ttl:
+                return
+            try:
+                patterns = await self._load_patterns()
+            except Exception as e:
+                logger.warning(f"Falha ao recarregar origens CORS; mantendo índice anterior: {e}")
+                self._loaded_at = time.monotonic()
+                return
+            self.any_origin_tenants = "*" in patterns
+            patterns = [p for p in patterns if p and p.strip() != "*"]
+            self.matcher = OriginMatcher(list(getattr(config, "ALLOWED_HOSTS", None) or []) + patterns)
+            self._loaded_at = time.monotonic()
+            self._preflights.clear()
+
+    def invalidate(self):
+        """ Força a recarga do índice na próxima consulta (cliente alterado). """
+        self._loaded_at = 0.0
+        self._preflights.clear()
+
+    async def allows(self, origin: Optional[str]) -> bool:
+        await self.refresh()
+        return self.matcher.matches(origin)
+
+    async def preflight(self, headers) -> Response:
+        origin = headers.get("origin")
+        method = headers.get("access-control-request-method", "")
+        requested = headers.get("access-control-request-headers", "")
+        await self.refresh()
+
+        key = (origin, method, requested)
+        cached = self._preflights.get(key)
+        if cached is MISSING:
+            cached = None
+            if self.matcher.matches(origin):
+                cached = {
+                    "Access-Control-Allow-Origin": origin,
+                    "Access-Control-Allow-Credentials": "true",
+                }
+            elif self.any_origin_tenants and origin:
+                cached = {"Access-Control-Allow-Origin": "*"}
+            if cached is not None:
+                cached.update({
+                    "Access-Control-Allow-Methods": CORS_ALLOW_METHODS,
+                    "Access-Control-Max-Age": str(self.max_age),
+                    "Vary": "Origin, Access-Control-Request-Method, Access-Control-Request-Headers",
+                })
+                if requested:
+                    cached["Access-Control-Allow-Headers"] = requested
+            self._preflights.set(key, cached)
+
+        if cached is None:
+            return PlainTextResponse("Origem CORS não permitida", status_code=400)
+        return Response(status_code=204, headers=cached)
+
+
+cors_registry = CorsRegistry()
@@ -0,0 +1,291 @@
+# app/services/credential_service.py
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, column, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings as config
+
+logger = logging.getLogger("fastapi_app")
+
+KDF_ALGORITHM = "sha256"
+KDF_ITERATIONS = 100_000
+CREDENTIAL_CACHE_TTL = getattr(config, "CREDENTIAL_CACHE_TTL", 60)  # também é o atraso máximo de uma revogação
+CREDENTIAL_CACHE_SIZE = getattr(config, "CREDENTIAL_CACHE_SIZE", 10000)
+CREDENTIAL_TOUCH_INTERVAL = getattr(config, "CREDENTIAL_TOUCH_INTERVAL", 30)
+# Segredo do servidor (fora do banco) que entra na chave de assinatura. Obrigatório
+# e dedicado: trocá-lo invalida todas as chaves emitidas, então não pode
+# acompanhar a rotação de outro segredo (ex.: JWT_SECRET_KEY)
+CREDENTIAL_SIGNING_PEPPER = getattr(config, "CREDENTIAL_SIGNING_PEPPER", None)
+SIGNING_KEY_INFO = b"akira/request-signing/v1"
+CREDENTIAL_API_KEY_PREFIX = "ak_"
+
+
+# --- Derivação de chave ---
+def derive_secret_hash(secret: str, salt_hex: str) -> bytes:
+    """ PBKDF2-HMAC-SHA256(secret, salt): o verificador gravado em `api_secret_hash`. """
+    return hashlib.pbkdf2_hmac(KDF_ALGORITHM, secret.encode(), bytes.fromhex(salt_hex), KDF_ITERATIONS)
+
+
+def hash_secret(secret: str, salt_hex: Optional[str] = None) -> Tuple[str, str]:
+    """ Retorna (salt, hash) em hex para gravar em api_secret_salt / api_secret_hash. """
+    salt_hex = salt_hex or secrets.token_hex(16)
+    return salt_hex, derive_secret_hash(secret, salt_hex).hex()
+
+
+def signing_key_for(hash_hex: str, pepper: Optional[str] = None) -> bytes:
+    """
+    Chave de assinatura (X-Signature) da credencial: HKDF-SHA256 com o pepper
+    do servidor como salt e o `api_secret_hash` como material. É entregue ao
+    cliente na emissão da credencial (`CredentialEngine.issue`); quem só tem o
+    banco (réplica, backup, snapshot) não consegue reproduzi-la. O servidor a
+    calcula uma vez por credencial e a mantém no cache do CredentialEngine.
+    """
+    pepper = pepper or CREDENTIAL_SIGNING_PEPPER
+    if not pepper:
+        raise RuntimeError("CREDENTIAL_SIGNING_PEPPER não configurado")
+    pepper = pepper.encode()
+    prk = hmac.new(pepper, bytes.fromhex(hash_hex), hashlib.sha256).digest()
+    return hmac.new(prk, SIGNING_KEY_INFO + b"\x01", hashlib.sha256).digest()
+
+
+def sign_request(signing_key: bytes, timestamp: str, payload: str) -> str:
+    return hmac.new(signing_key, f"{timestamp}:{payload}".encode(), hashlib.sha256).hexdigest()
+
+
+def api_key_digest(api_key: str) -> str:
+    # A chave em texto não fica como chave de dicionário em memória
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class CredentialEntry:
+    __slots__ = ("credential_id", "client_id", "signing_key", "expires_at", "is_active", "revoked_at")
+
+    def __init__(self, credential_id, client_id, signing_key: bytes, expires_at=None, is_active=True, revoked_at=None):
+        self.credential_id = credential_id  # None para a chave legada em `clients`
+        self.client_id = client_id
+        self.signing_key = signing_key
+        self.expires_at = expires_at
+        self.is_active = is_active
+        self.revoked_at = revoked_at
+
+
+class CredentialEngine:
+    """
+    Autenticação enterprise (X-API-Key + X-Signature).
+
+    A credencial é buscada pelo api_key em `client_credentials` (índice único),
+    com fallback para o par legado api_key/api_secret_hash de `clients`. A
+    entrada resolvida, com a chave de assinatura já derivada, fica num
+    cache LRU com TTL indexado pelo sha256 do api_key; chaves inexistentes
+    também são cacheadas. `last_used_at` é acumulado em memória e gravado em
+    lote a cada `touch_interval` segundos.
+
+    Credenciais são emitidas por `issue` (rota administrativa): é o único
+    momento em que api_secret e a chave de assinatura saem do servidor.
+    Clientes só com a chave legada precisam receber uma credencial nova.
+    """
+
+    def __init__(self, ttl: float = CREDENTIAL_CACHE_TTL, maxsize: int = CREDENTIAL_CACHE_SIZE, touch_interval: float = CREDENTIAL_TOUCH_INTERVAL):
+        self.touch_interval = touch_interval
+        self.read_session_factory = None
+        self.write_session_factory = None
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._last_used: Dict[object, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Ciclo de vida ---
+    async def start(self, read_session_factory, write_session_factory):
+        self.read_session_factory = read_session_factory
+        self.write_session_factory = write_session_factory
+        if not CREDENTIAL_SIGNING_PEPPER:
+            logger.error("CREDENTIAL_SIGNING_PEPPER não configurado: autenticação enterprise indisponível")
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._touch_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_last_used()
+
+    # --- Resolução ---
+    async def _load(self, api_key: str) -> Optional[CredentialEntry]:
+        from app.models.client import Client, ClientCredential
+
+        async with self.read_session_factory() as session:
+            row = (await session.execute(
+                select(ClientCredential.id, ClientCredential.client_id, ClientCredential.api_secret_hash,
+                       ClientCredential.expires_at, ClientCredential.is_active, ClientCredential.revoked_at)
+                .where(ClientCredential.api_key == api_key)
+                .limit(1)
+            )).first()
+            if row is not None:
+                if not row.api_secret_hash:
+                    return None
+                return CredentialEntry(row.id, row.client_id, signing_key_for(row.api_secret_hash),
+                                       row.expires_at, row.is_active, row.revoked_at)
+
+            row = (await session.execute(
+                select(Client.id, Client.api_secret_hash).where(Client.api_key == api_key).limit(1)
+            )).first()
+            if row is None or not row.api_secret_hash:
+                return None
+            return CredentialEntry(None, row.id, signing_key_for(row.api_secret_hash))
+
+    async def resolve(self, api_key: str) -> Optional[CredentialEntry]:
+        digest = api_key_digest(api_key)
+        entry = self._cache.get(digest)
+        if entry is not MISSING:
+            return entry
+        # Requisições simultâneas com a mesma chave compartilham a consulta
+        pending = self._loading.get(digest)
+        if pending is not None:
+            return await pending
+        future = asyncio.get_running_loop().create_future()
+        self._loading[digest] = future
+        try:
+            entry = await self._load(api_key)
+            self._cache.set(digest, entry)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            # Evita "Future exception was never retrieved" quando não há outros aguardando
+            future.exception()
+            raise
+        finally:
+            del self._loading[digest]
+
+    def invalidate(self, api_key: str):
+        self._cache.delete(api_key_digest(api_key))
+
+    # --- Emissão ---
+    @staticmethod
+    def _require_pepper():
+        if not CREDENTIAL_SIGNING_PEPPER:
+            raise HTTPException(status_code=503, detail="Autenticação enterprise indisponível")
+
+    async def issue(self, client_id, label: str, expires_in_days: Optional[int] = 365) -> dict:
+        """
+        Cria uma credencial para o cliente. Retorna api_key, api_secret e
+        signing_key (hex), que não podem ser recuperados depois.
+        """
+        from sqlalchemy.exc import IntegrityError
+        from app.models.client import ClientCredential
+
+        self._require_pepper()
+        api_key = CREDENTIAL_API_KEY_PREFIX + secrets.token_urlsafe(24)
+        api_secret = secrets.token_urlsafe(32)
+        # PBKDF2 é caro: fora do event loop
+        salt_hex, hash_hex = await asyncio.to_thread(hash_secret, api_secret)
+        now = datetime.utcnow()
+        credential = ClientCredential(
+            client_id=client_id,
+            api_key=api_key,
+            api_secret_hash=hash_hex,
+            api_secret_salt=salt_hex,
+            label=label,
+            expires_at=now + timedelta(days=expires_in_days) if expires_in_days else None,
+            is_active=True,
+            created_at=now,
+        )
+        try:
+            async with self.write_session_factory() as session:
+                session.add(credential)
+                await session.commit()
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Cliente inexistente ou label já utilizado")
+        # Uma tentativa anterior com essa chave pode estar no cache negativo
+        self.invalidate(api_key)
+        return {
+            "id": credential.id,
+            "api_key": api_key,
+            "api_secret": api_secret,
+            "signing_key": signing_key_for(hash_hex).hex(),
+            "label": label,
+            "expires_at": credential.expires_at,
+            "created_at": now,
+        }
+
+    async def revoke(self, credential_id) -> bool:
+        from app.models.client import ClientCredential
+
+        async with self.write_session_factory() as session:
+            api_key = (await session.execute(
+                update(ClientCredential)
+                .where(ClientCredential.id == credential_id, ClientCredential.revoked_at.is_(None))
+                .values(revoked_at=datetime.utcnow(), is_active=False)
+                .returning(ClientCredential.api_key)
+            )).scalar_one_or_none()
+            await session.commit()
+        if api_key is None:
+            return False
+        self.invalidate(api_key)
+        return True
+
+    # --- Verificação ---
+    async def authenticate(self, client, api_key: Optional[str], timestamp: str, payload: str, signature: str) -> CredentialEntry:
+        self._require_pepper()
+        entry = await self.resolve(api_key) if api_key else None
+        if entry is None or entry.client_id != client.id:
+            raise HTTPException(status_code=401, detail="API Key inválida")
+        if not entry.is_active or entry.revoked_at is not None:
+            raise HTTPException(status_code=401, detail="Credencial revogada ou inativa")
+        if entry.expires_at is not None and entry.expires_at <= datetime.utcnow():
+            raise HTTPException(status_code=401, detail="Credencial expirada")
+
+        expected = sign_request(entry.signing_key, timestamp, payload)
+        if not hmac.compare_digest(expected, signature):
+            raise HTTPException(status_code=403, detail="Assinatura HMAC inválida")
+
+        if entry.credential_id is not None:
+            self._last_used[entry.credential_id] = datetime.utcnow()
+        return entry
+
+    # --- last_used_at em lote ---
+    async def _touch_loop(self):
+        while True:
+            await asyncio.sleep(self.touch_interval)
+            try:
+                await self.flush_last_used()
+            except Exception as e:
+                logger.error(f"Falha ao gravar last_used_at das credenciais: {e}", exc_info=True)
+
+    async def flush_last_used(self):
+        if not self._last_used or self.write_session_factory is None:
+            return
+        from app.models.client import ClientCredential
+
+        used, self._last_used = self._last_used, {}
+        v = values(column("id", PG_UUID(as_uuid=True)), column("used_at", DateTime), name="used").data(list(used.items()))
+        stmt = (
+            update(ClientCredential)
+            .where(ClientCredential.id == v.c.id)
+            .values(last_used_at=v.c.used_at)
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            async with self.write_session_factory() as session:
+                await session.execute(stmt)
+                await session.commit()
+        except Exception:
+            for credential_id, used_at in used.items():
+                self._last_used.setdefault(credential_id, used_at)
+            raise
+
+
+credential_engine = CredentialEngine()
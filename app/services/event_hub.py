@@ -0,0 +1,94 @@
+# app/services/event_hub.py
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger("fastapi_app")
+
+EVENT_HUB_QUEUE_SIZE = 256
+EVENT_HUB_HISTORY = 100
+SSE_HEARTBEAT_SECONDS = 15
+
+
+class Subscription:
+    """ Fila de um assinante. Recebe os mesmos objetos `bytes` publicados no hub. """
+
+    def __init__(self, hub: "EventHub", topic: str, maxsize: int):
+        self.hub = hub
+        self.topic = topic
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, frame: bytes):
+        # Assinante lento: descarta o evento mais antigo em vez de travar o publicador
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Pub/sub em processo. Cada evento é serializado uma única vez como frame
+    SSE e o mesmo objeto é entregue a todos os assinantes do tópico.
+    """
+
+    def __init__(self, queue_size: int = EVENT_HUB_QUEUE_SIZE, history: int = EVENT_HUB_HISTORY):
+        self.queue_size = queue_size
+        self.history_size = history
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._history: Dict[str, Deque[Tuple[int, bytes]]] = {}
+        self._last_id = 0
+
+    def publish(self, topic: str, event: str, data: dict) -> int:
+        self._last_id += 1
+        event_id = self._last_id
+        payload = json.dumps(data, default=str, separators=(",", ":"))
+        frame = f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+        history = self._history.setdefault(topic, deque(maxlen=self.history_size))
+        history.append((event_id, frame))
+        for subscription in self._subscribers.get(topic, ()):
+            subscription.push(frame)
+        return event_id
+
+    def subscribe(self, topic: str, last_event_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(self, topic, self.queue_size)
+        self._subscribers.setdefault(topic, set()).add(subscription)
+        # Reenvia o que o cliente perdeu durante a reconexão
+        if last_event_id is not None:
+            for event_id, frame in self._history.get(topic, ()):
+                if event_id > last_event_id:
+                    subscription.push(frame)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.topic]
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+
+async def sse_stream(hub: EventHub, topic: str, last_event_id: Optional[int] = None, heartbeat: float = SSE_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+    subscription = hub.subscribe(topic, last_event_id)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                yield await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+    finally:
+        subscription.close()
+
+
+event_hub = EventHub()
@@ -1,7 +1,5 @@
 # app/services/firebase_service.py
 import logging
-import firebase_admin
-from firebase_admin import credentials, firestore
 from app.core.config import settings
 
 logger = logging.getLogger("fastapi_app")
@@ -10,6 +8,9 @@ def initialize_firebase():
     """
     Inicializa o Firebase Admin SDK de forma segura, se ainda não foi inicializado.
     """
+    import firebase_admin
+    from firebase_admin import credentials
+
     if not firebase_admin._apps:
         try:
             cred_path = settings.FIREBASE_API_SDK_PATH
@@ -33,7 +34,9 @@ def initialize_firebase():
         logger.info("Firebase Admin SDK já estava inicializado.")
 
 def get_db():
-    """ Retorna uma instância do cliente Firestore. """
-    if not firebase_admin._apps:
-        initialize_firebase()
-    return firestore.client()
+    """
+    Retorna a fachada assíncrona do Firestore (app/services/firestore_service.py).
+    O cliente síncrono bloqueava o event loop nas chamadas gRPC.
+    """
+    from app.services.firestore_service import firestore_db
+    return firestore_db
@@ -0,0 +1,276 @@
+# app/services/firestore_service.py
+import asyncio
+import copy
+import inspect
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.cache import BatchLoader
+from app.core.config import settings
+
+logger = logging.getLogger("fastapi_app")
+
+FIRESTORE_CACHE_TTL = getattr(settings, "FIRESTORE_CACHE_TTL", 5)
+FIRESTORE_CACHE_SIZE = getattr(settings, "FIRESTORE_CACHE_SIZE", 10000)
+FIRESTORE_FLUSH_INTERVAL = getattr(settings, "FIRESTORE_FLUSH_INTERVAL", 0.5)
+FIRESTORE_WRITE_BATCH = 500          # limite de operações por batch do Firestore
+FIRESTORE_MAX_READ_BATCH = 300
+FIRESTORE_MAX_BUFFER = 10000
+FIRESTORE_MAX_RETRIES = 3
+
+# (operação, caminho do documento, dados, merge)
+Write = Tuple[str, str, Optional[dict], bool]
+
+
+class GoogleFirestoreBackend:
+    """ Firestore real (ou emulador, via FIRESTORE_EMULATOR_HOST) com o AsyncClient. """
+
+    def __init__(self, app=None):
+        from firebase_admin import firestore_async
+
+        self.app = app
+        self.client = firestore_async.client(app)
+        self._watch_client = None
+
+    async def get_all(self, paths: List[str]) -> Dict[str, Optional[dict]]:
+        refs = [self.client.document(path) for path in paths]
+        found = {}
+        async for snapshot in self.client.get_all(refs):
+            found[snapshot.reference.path] = snapshot.to_dict() if snapshot.exists else None
+        return found
+
+    async def commit(self, writes: List[Write]):
+        for i in range(0, len(writes), FIRESTORE_WRITE_BATCH):
+            batch = self.client.batch()
+            for op, path, data, merge in writes[i:i + FIRESTORE_WRITE_BATCH]:
+                ref = self.client.document(path)
+                if op == "set":
+                    batch.set(ref, data, merge=merge)
+                elif op == "update":
+                    batch.update(ref, data)
+                else:
+                    batch.delete(ref)
+            await batch.commit()
+
+    def watch(self, collection: str, on_change: Callable[[str], None]) -> Callable[[], None]:
+        # Listeners só existem no cliente síncrono; o callback roda numa thread do SDK
+        from firebase_admin import firestore
+
+        if self._watch_client is None:
+            self._watch_client = firestore.client(self.app)
+
+        def callback(docs, changes, read_time):
+            for change in changes:
+                on_change(change.document.reference.path)
+
+        watch = self._watch_client.collection(collection).on_snapshot(callback)
+        return watch.unsubscribe
+
+    async def close(self):
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+
+
+class InMemoryFirestore:
+    """ Backend falso para testes e benchmarks: mesmo contrato, sem rede. """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.docs: Dict[str, dict] = {}
+        self.read_calls = 0
+        self.commit_calls = 0
+        self._watchers: Dict[str, List[Callable[[str], None]]] = {}
+
+    async def get_all(self, paths: List[str]) -> Dict[str, Optional[dict]]:
+        self.read_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return {path: copy.deepcopy(self.docs.get(path)) for path in paths}
+
+    async def commit(self, writes: List[Write]):
+        self.commit_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for op, path, data, merge in writes:
+            if op == "set":
+                if merge and path in self.docs:
+                    self.docs[path].update(copy.deepcopy(data))
+                else:
+                    self.docs[path] = copy.deepcopy(data)
+            elif op == "update":
+                if path not in self.docs:
+                    raise KeyError(f"Documento não encontrado: {path}")
+                self.docs[path].update(copy.deepcopy(data))
+            else:
+                self.docs.pop(path, None)
+        for op, path, data, merge in writes:
+            for on_change in self._watchers.get(path.rsplit("/", 1)[0], ()):
+                on_change(path)
+
+    def watch(self, collection: str, on_change: Callable[[str], None]) -> Callable[[], None]:
+        self._watchers.setdefault(collection, []).append(on_change)
+        return lambda: self._watchers[collection].remove(on_change)
+
+    async def close(self):
+        pass
+
+
+class FirestoreFacade:
+    """
+    Acesso assíncrono ao Firestore.
+
+    - Leituras: `get` agrupa os documentos pedidos no mesmo ciclo do event loop
+      em um único `get_all` e mantém um cache curto (inclusive de ausências).
+    - Escritas: `set`/`update`/`delete` só enfileiram; o buffer é gravado em
+      batches quando atinge `write_batch` operações ou a cada `flush_interval`.
+      O cache local é atualizado na hora (read-your-writes no mesmo worker).
+    - `watch(colecao)` registra um listener que invalida o cache quando outro
+      processo altera documentos da coleção.
+
+    `start()` inicializa o Firebase Admin SDK (substitui a chamada direta a
+    `initialize_firebase` no startup); `stop()` grava o buffer e libera tudo.
+    """
+
+    def __init__(
+        self,
+        cache_ttl: float = FIRESTORE_CACHE_TTL,
+        cache_size: int = FIRESTORE_CACHE_SIZE,
+        flush_interval: float = FIRESTORE_FLUSH_INTERVAL,
+        write_batch: int = FIRESTORE_WRITE_BATCH
+    ):
+        self.flush_interval = flush_interval
+        self.write_batch = write_batch
+        self.backend = None
+        self.loader = BatchLoader(
+            self._fetch, ttl=cache_ttl, negative_ttl=cache_ttl, maxsize=cache_size, max_batch=FIRESTORE_MAX_READ_BATCH
+        )
+        self._writes: List[Write] = []
+        self._flush_lock = asyncio.Lock()
+        self._failures = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._unsubscribers: List[Callable[[], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._owns_firebase_app = False
+
+    # --- Ciclo de vida ---
+    async def start(self, backend=None):
+        self._loop = asyncio.get_running_loop()
+        if backend is None:
+            import firebase_admin
+            from app.services.firebase_service import initialize_firebase
+
+            self._owns_firebase_app = not firebase_admin._apps
+            initialize_firebase()
+            if not firebase_admin._apps:
+                logger.error("Firestore indisponível: Firebase Admin SDK não inicializado")
+                return
+            backend = GoogleFirestoreBackend()
+        self.backend = backend
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self.backend is not None:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Falha ao gravar buffer do Firestore no shutdown ({len(self._writes)} operações): {e}")
+            for unsubscribe in self._unsubscribers:
+                unsubscribe()
+            self._unsubscribers = []
+            await self.backend.close()
+            self.backend = None
+        if self._owns_firebase_app:
+            import firebase_admin
+            firebase_admin.delete_app(firebase_admin.get_app())
+            self._owns_firebase_app = False
+
+    def _require_backend(self):
+        if self.backend is None:
+            raise RuntimeError("Firestore não inicializado (FirestoreFacade.start)")
+        return self.backend
+
+    # --- Leitura ---
+    async def _fetch(self, paths: List[str]) -> Dict[str, Optional[dict]]:
+        return await self._require_backend().get_all(paths)
+
+    # Cópias: o chamador pode alterar o dict sem corromper o cache compartilhado
+    async def get(self, path: str) -> Optional[dict]:
+        return copy.deepcopy(await self.loader.load(path))
+
+    async def get_many(self, paths: Iterable[str]) -> Dict[str, Optional[dict]]:
+        paths = list(paths)
+        return dict(zip(paths, copy.deepcopy(await self.loader.load_many(paths))))
+
+    def watch(self, collection: str):
+        on_change = lambda path: self._loop.call_soon_threadsafe(self.loader.clear, path)
+        self._unsubscribers.append(self._require_backend().watch(collection, on_change))
+
+    # --- Escrita ---
+    def set(self, path: str, data: dict, merge: bool = False):
+        if merge:
+            self.loader.clear(path)
+        else:
+            self.loader.prime(path, copy.deepcopy(data))
+        self._enqueue(("set", path, data, merge))
+
+    def update(self, path: str, data: dict):
+        self.loader.clear(path)
+        self._enqueue(("update", path, data, False))
+
+    def delete(self, path: str):
+        self.loader.prime(path, None)
+        self._enqueue(("delete", path, None, False))
+
+    def _enqueue(self, write: Write):
+        self._require_backend()
+        if len(self._writes) >= FIRESTORE_MAX_BUFFER:
+            dropped = self._writes.pop(0)
+            logger.error(f"Buffer de escrita do Firestore cheio; operação descartada: {dropped[0]} {dropped[1]}")
+        self._writes.append(write)
+        if len(self._writes) >= self.write_batch and not self._flush_lock.locked():
+            asyncio.ensure_future(self._safe_flush())
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._writes:
+                writes, self._writes = self._writes[:self.write_batch], self._writes[self.write_batch:]
+                try:
+                    await self._require_backend().commit(writes)
+                    self._failures = 0
+                except Exception:
+                    for op, path, data, merge in writes:
+                        self.loader.clear(path)
+                    self._failures += 1
+                    if self._failures >= FIRESTORE_MAX_RETRIES:
+                        # Batch rejeitado repetidamente (ex.: update em documento inexistente): descarta
+                        self._failures = 0
+                        logger.error(f"Batch do Firestore descartado após {FIRESTORE_MAX_RETRIES} falhas: {[w[:2] for w in writes]}")
+                    else:
+                        # Volta para o início do buffer; a próxima rodada tenta de novo
+                        self._writes[:0] = writes
+                    raise
+
+    async def _safe_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Falha ao gravar batch no Firestore: {e}", exc_info=True)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._safe_flush()
+
+
+firestore_db = FirestoreFacade()
@@ -0,0 +1,307 @@
+# app/services/image_proxy.py
+import asyncio
+import base64
+import bisect
+import hashlib
+import hmac
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from fastapi import HTTPException
+from app.core.config import settings
+from app.services.image_resize import FORMAT_MEDIA_TYPES, PILLOW_AVAILABLE, resize_image
+
+logger = logging.getLogger("fastapi_app")
+
+IMAGE_CACHE_DIR = getattr(settings, "IMAGE_CACHE_DIR", "cache/images")
+IMAGE_CACHE_MAX_BYTES = getattr(settings, "IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+IMAGE_MAX_UPSTREAM_BYTES = 10 * 1024 * 1024
+IMAGE_RESIZE_WORKERS = getattr(settings, "IMAGE_RESIZE_WORKERS", 2)
+# Larguras permitidas: limita o número de variantes em disco
+IMAGE_WIDTHS = (64, 128, 256, 320, 480, 640, 800, 1024, 1280, 1920)
+IMAGE_PROXY_PATH = "/api/v1/images"
+# URL pública da API (ex.: "https://api.akirafn.com.br"); sem ela, usa a base da requisição
+PUBLIC_BASE_URL = getattr(settings, "PUBLIC_BASE_URL", None)
+
+
+# --- Tokens assinados ---
+def _sign(data: bytes) -> str:
+    digest = hmac.new(str(settings.API_APP_SECRET).encode(), data, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode().rstrip("=")
+
+
+def proxy_url(upstream_url: Optional[str], base_url: Optional[str] = None) -> Optional[str]:
+    """
+    Converte a URL de origem em uma URL absoluta do proxy (lojas em outra
+    origem resolveriam um caminho relativo contra o próprio host). O token é
+    assinado para que o proxy só busque imagens que a própria API expôs.
+    """
+    if not upstream_url:
+        return upstream_url
+    encoded = base64.urlsafe_b64encode(upstream_url.encode()).decode().rstrip("=")
+    base = (PUBLIC_BASE_URL or base_url or "").rstrip("/")
+    return f"{base}{IMAGE_PROXY_PATH}/{_sign(encoded.encode())}.{encoded}"
+
+
+def decode_token(token: str) -> str:
+    signature, _, encoded = token.partition(".")
+    if not encoded or not hmac.compare_digest(signature, _sign(encoded.encode())):
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    url = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+    if urlparse(url).scheme not in ("http", "https"):
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    return url
+
+
+def normalize_width(width: Optional[int]) -> Optional[int]:
+    if not width:
+        return None
+    index = bisect.bisect_left(IMAGE_WIDTHS, width)
+    return IMAGE_WIDTHS[min(index, len(IMAGE_WIDTHS) - 1)]
+
+
+# --- Cache em disco ---
+class DiskImageCache:
+    """
+    Cache endereçado por conteúdo: o original fica em `objects/<sha256>` e as
+    variantes em `variants/<sha256>-w<largura>.<formato>`; `refs/<sha256 da
+    URL>` aponta para o conteúdo. A ordem LRU usa o mtime, atualizado a cada
+    acesso, e a eviction roda quando o total passa de `max_bytes`.
+
+    Chamado de várias threads (asyncio.to_thread): cada escrita usa um
+    temporário com nome único e a contabilidade de tamanho fica sob lock.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+        for sub in ("objects", "variants", "refs"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    def _ref_path(self, url: str) -> Path:
+        return self.root / "refs" / hashlib.sha256(url.encode()).hexdigest()
+
+    def object_path(self, content_hash: str) -> Path:
+        return self.root / "objects" / content_hash
+
+    def variant_path(self, content_hash: str, width: int, fmt: str) -> Path:
+        return self.root / "variants" / f"{content_hash}-w{width}.{fmt.lower()}"
+
+    def lookup(self, url: str) -> Optional[str]:
+        ref = self._ref_path(url)
+        try:
+            content_hash = ref.read_text().strip()
+        except FileNotFoundError:
+            return None
+        return content_hash if self.object_path(content_hash).is_file() else None
+
+    def read(self, path: Path) -> Optional[bytes]:
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def store_object(self, url: str, data: bytes) -> str:
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.object_path(content_hash)
+        if not path.is_file():
+            self._write(path, data)
+        self._ref_path(url).write_text(content_hash)
+        return content_hash
+
+    def store_variant(self, path: Path, data: bytes):
+        self._write(path, data)
+
+    def _write(self, path: Path, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            self._size = (self._current_size() if self._size is None else self._size) + len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        # Temporários pertencem a escritas em andamento: fora da contagem e da eviction
+        for sub in ("objects", "variants"):
+            for p in (self.root / sub).iterdir():
+                if p.suffix == ".tmp":
+                    continue
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, p
+
+    def _current_size(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self):
+        """ Remove os arquivos menos acessados até ficar em 90% do limite. """
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        files = list(self._files())
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+
+# --- Proxy ---
+class ImageProxy:
+    def __init__(self, cache_dir: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._cache: Optional[DiskImageCache] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._building: Dict[str, asyncio.Future] = {}
+
+    @property
+    def cache(self) -> DiskImageCache:
+        if self._cache is None:
+            self._cache = DiskImageCache(self.cache_dir, self.max_bytes)
+        return self._cache
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=IMAGE_RESIZE_WORKERS)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _fetch_upstream(self, url: str) -> str:
+        async with httpx.AsyncClient(timeout=15.0, follow_redirects=True) as client:
+            async with client.stream("GET", url) as response:
+                if response.status_code != 200:
+                    raise HTTPException(status_code=502, detail="Falha ao obter imagem de origem")
+                chunks, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > IMAGE_MAX_UPSTREAM_BYTES:
+                        raise HTTPException(status_code=502, detail="Imagem de origem muito grande")
+                    chunks.append(chunk)
+        return await asyncio.to_thread(self.cache.store_object, url, b"".join(chunks))
+
+    async def original(self, url: str) -> str:
+        """ Retorna o hash do conteúdo original, buscando a origem uma única vez. """
+        content_hash = await asyncio.to_thread(self.cache.lookup, url)
+        if content_hash:
+            return content_hash
+
+        # Requisições concorrentes pela mesma URL compartilham o download
+        future = self._inflight.get(url)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_upstream(url))
+            self._inflight[url] = future
+            future.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _variant(content_hash: str, width: Optional[int], accept: str) -> Tuple[Optional[str], str]:
+        """ (formato, etag) da variante; formato None = original sem redimensionar. """
+        if width is None or not PILLOW_AVAILABLE:
+            return None, f'"{content_hash[:32]}"'
+        fmt = "WEBP" if "image/webp" in (accept or "") else "orig"
+        return fmt, f'"{content_hash[:32]}-w{width}-{fmt.lower()}"'
+
+    async def cached_etag(self, url: str, width: Optional[int], accept: str = "") -> Optional[str]:
+        """ ETag da variante se o original já está em cache; não busca a origem nem lê a imagem. """
+        content_hash = await asyncio.to_thread(self.cache.lookup, url)
+        if not content_hash:
+            return None
+        return self._variant(content_hash, width, accept)[1]
+
+    async def get(self, url: str, width: Optional[int], accept: str = "") -> Tuple[bytes, str, str]:
+        """ Retorna (conteúdo, media type, etag) da variante solicitada. """
+        content_hash = await self.original(url)
+        original_path = self.cache.object_path(content_hash)
+        variant, etag = self._variant(content_hash, width, accept)
+
+        if variant is None:
+            data = await asyncio.to_thread(self.cache.read, original_path)
+            if data is None:
+                raise HTTPException(status_code=404, detail="Imagem não encontrada")
+            return data, _sniff_media_type(data), etag
+
+        fmt = "WEBP" if variant == "WEBP" else None
+        variant_path = self.cache.variant_path(content_hash, width, variant)
+
+        data = await asyncio.to_thread(self.cache.read, variant_path)
+        if data is None:
+            # Primeiras requisições simultâneas pela mesma variante compartilham o resize
+            key = str(variant_path)
+            future = self._building.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self._build_variant(original_path, variant_path, width, fmt))
+                self._building[key] = future
+                future.add_done_callback(lambda _: self._building.pop(key, None))
+            try:
+                data = await asyncio.shield(future)
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.warning(f"Falha ao redimensionar imagem {url}: {e}")
+                original = await asyncio.to_thread(self.cache.read, original_path)
+                if original is None:
+                    raise HTTPException(status_code=404, detail="Imagem não encontrada")
+                return original, _sniff_media_type(original), f'"{content_hash[:32]}"'
+
+        return data, _sniff_media_type(data), etag
+
+    async def _build_variant(self, original_path: Path, variant_path: Path, width: int, fmt: Optional[str]) -> bytes:
+        original = await asyncio.to_thread(self.cache.read, original_path)
+        if original is None:
+            raise HTTPException(status_code=404, detail="Imagem não encontrada")
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.pool, resize_image, original, width, fmt)
+        await asyncio.to_thread(self.cache.store_variant, variant_path, data)
+        return data
+
+
+def _sniff_media_type(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return FORMAT_MEDIA_TYPES["JPEG"]
+    if data.startswith(b"\x89PNG"):
+        return FORMAT_MEDIA_TYPES["PNG"]
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return FORMAT_MEDIA_TYPES["WEBP"]
+    if data.startswith(b"GIF8"):
+        return FORMAT_MEDIA_TYPES["GIF"]
+    return "application/octet-stream"
+
+
+image_proxy = ImageProxy()
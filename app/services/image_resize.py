@@ -0,0 +1,32 @@
+# app/services/image_resize.py
+# Mantido sem dependências da aplicação: é importado pelos processos do pool.
+import importlib.util
+import io
+
+# Pillow é opcional; sem ele as imagens são servidas no tamanho original.
+# O import real fica em resize_image, executado apenas nos processos do pool.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+FORMAT_MEDIA_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+
+
+def resize_image(data: bytes, width: int, output_format: str = None) -> bytes:
+    """ Redimensiona mantendo a proporção; nunca amplia a imagem. """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        fmt = output_format or image.format or "JPEG"
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, quality=82, optimize=True)
+        return buffer.getvalue()
@@ -0,0 +1,158 @@
+# app/services/pdf_queue.py
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings as config
+from app.schemas.schemas import PDFRequest
+from app.services.event_hub import event_hub
+
+logger = logging.getLogger("fastapi_app")
+
+PDF_EVENTS_TOPIC = "pdf-queue:{}"     # um tópico por cliente
+# Fora do SecurityMiddleware (o EventSource não envia X-Site-Key): autenticado pelo token da query
+PDF_EVENTS_PATH = "/api/v1/pdf/pdf-events"
+PDF_QUEUE_WORKERS = getattr(config, "PDF_QUEUE_WORKERS", 2)
+PDF_EVENTS_TOKEN_TTL = getattr(config, "PDF_EVENTS_TOKEN_TTL", 3600)
+PDF_QUEUE_HISTORY = 1000        # jobs concluídos mantidos para consulta
+
+# render(job, progress) -> download_url; `progress(0..100)` publica o andamento
+ProgressCallback = Callable[[int], None]
+Renderer = Callable[[PDFRequest, ProgressCallback], Awaitable[str]]
+
+
+def pdf_events_topic(client_id) -> str:
+    return PDF_EVENTS_TOPIC.format(client_id)
+
+
+def publish_pdf_update(pdf_request: PDFRequest, event: str = "pdf.progress"):
+    """ Publica a mudança de estado/progresso de um job para os assinantes de /pdf-events do seu cliente. """
+    return event_hub.publish(pdf_events_topic(pdf_request.client_id), event, pdf_request.model_dump(mode="json"))
+
+
+# --- Token do EventSource ---
+# O navegador não envia headers customizados no EventSource: o acesso ao
+# stream usa um token assinado na query string, emitido por uma rota autenticada.
+def _sign(data: str) -> str:
+    digest = hmac.new(str(config.API_APP_SECRET).encode(), data.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode().rstrip("=")
+
+
+def issue_events_token(client_id, ttl: int = PDF_EVENTS_TOKEN_TTL) -> Tuple[str, int]:
+    expires = int(time.time()) + ttl
+    payload = f"{client_id}.{expires}"
+    return f"{payload}.{_sign('pdf-events:' + payload)}", expires
+
+
+def verify_events_token(token: Optional[str]) -> Optional[str]:
+    """ client_id do token, ou None se inválido/expirado. """
+    payload, _, signature = (token or "").rpartition(".")
+    client_id, _, expires = payload.rpartition(".")
+    if not client_id or not expires.isdigit():
+        return None
+    if not hmac.compare_digest(signature, _sign("pdf-events:" + payload)):
+        return None
+    if int(expires) < time.time():
+        return None
+    return client_id
+
+
+class PdfQueue:
+    """
+    Fila de geração de PDF em processo. Cada transição do job (queued,
+    processing, progresso, done/failed) é publicada no event hub, no tópico
+    do cliente dono do job, de onde /pdf-events repassa aos navegadores.
+    """
+
+    def __init__(self, workers: int = PDF_QUEUE_WORKERS):
+        self.workers = workers
+        self.jobs: Dict[str, PDFRequest] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # --- Ciclo de vida ---
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    # --- Jobs ---
+    def submit(self, job: PDFRequest, render: Renderer) -> PDFRequest:
+        if self._queue is None:
+            raise RuntimeError("Fila de PDF não inicializada (PdfQueue.start)")
+        if not job.client_id:
+            raise ValueError("Job de PDF sem client_id")
+        job.status = "queued"
+        job.progress = 0
+        self._prune()
+        self.jobs[job.id] = job
+        self._queue.put_nowait((job, render))
+        publish_pdf_update(job, "pdf.queued")
+        return job
+
+    def _prune(self):
+        excess = len(self.jobs) - PDF_QUEUE_HISTORY
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:excess]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str, client_id) -> Optional[PDFRequest]:
+        job = self.jobs.get(job_id)
+        return job if job is not None and job.client_id == str(client_id) else None
+
+    def pending(self, client_id) -> List[PDFRequest]:
+        client_id = str(client_id)
+        return [job for job in self.jobs.values() if job.client_id == client_id and job.status in ("queued", "processing")]
+
+    async def _worker(self):
+        while True:
+            job, render = await self._queue.get()
+            try:
+                await self._run(job, render)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: PDFRequest, render: Renderer):
+        job.status = "processing"
+        publish_pdf_update(job, "pdf.processing")
+
+        def progress(percent: int):
+            percent = max(0, min(100, int(percent)))
+            if percent != job.progress:
+                job.progress = percent
+                publish_pdf_update(job)
+
+        try:
+            job.download_url = await render(job, progress)
+        except asyncio.CancelledError:
+            job.status = "failed"
+            publish_pdf_update(job, "pdf.failed")
+            raise
+        except Exception as e:
+            logger.error(f"Falha ao gerar PDF {job.id}: {e}", exc_info=True)
+            job.status = "failed"
+            publish_pdf_update(job, "pdf.failed")
+            return
+        job.status = "done"
+        job.progress = 100
+        publish_pdf_update(job, "pdf.done")
+
+
+pdf_queue = PdfQueue()
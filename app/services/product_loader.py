@@ -0,0 +1,51 @@
+# app/services/product_loader.py
+import logging
+from typing import Dict, List
+
+from app.api.utils.api_caller import api_request
+from app.core.cache import BatchLoader
+from app.core.config import settings
+
+logger = logging.getLogger("fastapi_app")
+
+PRODUCT_CACHE_TTL = getattr(settings, "PRODUCT_CACHE_TTL", 60)
+PRODUCT_NEGATIVE_CACHE_TTL = getattr(settings, "PRODUCT_NEGATIVE_CACHE_TTL", 15)
+PRODUCT_CACHE_SIZE = getattr(settings, "PRODUCT_CACHE_SIZE", 5000)
+PRODUCT_MAX_BATCH = 100
+# Obrigatório: a listagem paginada não filtra por ids e produtos fora da página virariam 404
+ENDPOINT_WMS_PROD_BY_IDS = getattr(settings, "ENDPOINT_WMS_PROD_BY_IDS", None)
+
+
+async def fetch_products_by_ids(ids: List[int]) -> Dict[int, dict]:
+    if not ENDPOINT_WMS_PROD_BY_IDS:
+        raise RuntimeError("ENDPOINT_WMS_PROD_BY_IDS não configurado")
+    params = {
+        "ids": ",".join(str(i) for i in ids),
+        "per_page": len(ids),
+        "app_id": str(settings.API_APP_ID),
+    }
+    response = await api_request(endpoint=ENDPOINT_WMS_PROD_BY_IDS, method="GET", params=params)
+    if isinstance(response, dict):
+        response = response.get("products", response.get("items", []))
+
+    requested = set(ids)
+    products = {}
+    for p in response or []:
+        product_id = p.get("id_produto", p.get("id"))
+        if product_id is None:
+            continue
+        if int(product_id) not in requested:
+            # O endpoint ignorou `ids`: as ausências não são confiáveis e não
+            # podem ir para o cache negativo; falha o lote inteiro
+            raise RuntimeError(f"{ENDPOINT_WMS_PROD_BY_IDS} não filtrou por ids (recebido {product_id})")
+        products[int(product_id)] = p
+    return products
+
+
+product_loader = BatchLoader(
+    fetch_products_by_ids,
+    ttl=PRODUCT_CACHE_TTL,
+    negative_ttl=PRODUCT_NEGATIVE_CACHE_TTL,
+    maxsize=PRODUCT_CACHE_SIZE,
+    max_batch=PRODUCT_MAX_BATCH,
+)
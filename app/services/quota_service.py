@@ -0,0 +1,324 @@
+# app/services/quota_service.py
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, case, column, func, or_, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from app.core.config import settings as config
+from app.models.client import Client
+from app.services.webhook_service import webhook_dispatcher
+
+logger = logging.getLogger("fastapi_app")
+
+QUOTA_LEASE_BLOCK = getattr(config, "QUOTA_LEASE_BLOCK", 50)
+QUOTA_FLUSH_INTERVAL = getattr(config, "QUOTA_FLUSH_INTERVAL", 10)
+QUOTA_UPGRADE_URL = "https://akirafn.com.br/contact"
+
+
+def lease_block(quota: int) -> int:
+    # Blocos menores para quotas pequenas: cada worker retém no máximo ~1% da quota
+    return max(1, min(QUOTA_LEASE_BLOCK, quota // 100))
+
+
+class _ClientQuota:
+    __slots__ = ("day", "month", "lease", "day_total", "month_total", "unflushed", "notified", "lock")
+
+    def __init__(self, day: str, month: str):
+        self.day = day
+        self.month = month
+        self.lease = 0          # unidades já reservadas no Redis e ainda não consumidas
+        self.day_total = 0      # último total diário visto no Redis (inclui leases de todos os workers)
+        self.month_total = 0
+        self.unflushed = 0      # consumo real ainda não gravado no Postgres
+        self.notified = False   # webhook de quota excedida já emitido neste período
+        self.lock = asyncio.Lock()
+
+
+class QuotaEngine:
+    """
+    Contabilidade de quota com reserva em blocos. Cada worker reserva
+    (INCRBY) um bloco das quotas diária e mensal no Redis e consome o bloco
+    localmente, sem tocar no Redis por requisição. O Redis conta unidades
+    reservadas, nunca ultrapassando a quota; a diferença para o uso real é
+    limitada aos blocos ainda não consumidos (devolvidos no shutdown).
+
+    O consumo real é somado em memória e gravado em `clients.daily_used` /
+    `monthly_used` com um único UPDATE multi-linha a cada intervalo. Cada
+    contagem leva o dia/mês em que foi consumida: o que sobrou do período
+    anterior na virada não é creditado ao novo.
+    """
+
+    def __init__(self, flush_interval: float = QUOTA_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.redis = None
+        self.session_factory = None
+        self._state: Dict[str, _ClientQuota] = {}
+        self._refunds: List[Tuple[str, int]] = []   # (chave, unidades) a devolver ao Redis
+        self._carry: Dict[Tuple[str, str, str], int] = {}  # (cliente, dia, mês) -> consumo de períodos encerrados
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # --- Ciclo de vida ---
+    async def start(self, session_factory):
+        self.session_factory = session_factory
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Falha ao gravar uso de quota no shutdown: {e}", exc_info=True)
+        finally:
+            await self.release_leases()
+
+    async def get_redis(self):
+        if self.redis is None:
+            import redis.asyncio as redis
+            self.redis = await redis.from_url(config.REDIS_URL)
+        return self.redis
+
+    # --- Chaves ---
+    @staticmethod
+    def _periods(now: datetime):
+        return now.strftime("%Y-%m-%d"), now.strftime("%Y-%m")
+
+    @staticmethod
+    def _day_key(client_id, day: str) -> str:
+        return f"quota:{client_id}:{day}"
+
+    @staticmethod
+    def _month_key(client_id, month: str) -> str:
+        return f"quota:{client_id}:m:{month}"
+
+    def _get_state(self, client_id: str) -> _ClientQuota:
+        day, month = self._periods(datetime.now(timezone.utc))
+        state = self._state.get(client_id)
+        if state is None:
+            state = self._state[client_id] = _ClientQuota(day, month)
+        elif state.day != day or state.month != month:
+            # Virada de período: a reserva antiga pertence a outra chave. Devolve a
+            # sobra (no próximo pipeline) para o mês não contar unidades nunca usadas
+            self._queue_refund(client_id, state.day, state.month, state.lease)
+            state.lease = 0
+            # O consumo ainda não gravado continua marcado com o período antigo
+            self._carry_usage(client_id, state.day, state.month, state.unflushed)
+            state.unflushed = 0
+            state.notified = False
+            if state.day != day:
+                state.day_total = 0
+            if state.month != month:
+                state.month_total = 0
+            state.day, state.month = day, month
+        return state
+
+    def _carry_usage(self, client_id: str, day: str, month: str, used: int):
+        if used > 0:
+            key = (client_id, day, month)
+            self._carry[key] = self._carry.get(key, 0) + used
+
+    def _queue_refund(self, client_id, day: str, month: str, units: int):
+        if units > 0:
+            self._refunds.append((self._day_key(client_id, day), units))
+            self._refunds.append((self._month_key(client_id, month), units))
+
+    def _take_refunds(self, pipe) -> List[Tuple[str, int]]:
+        refunds, self._refunds = self._refunds, []
+        for key, units in refunds:
+            pipe.decrby(key, units)
+        return refunds
+
+    # --- Reserva ---
+    async def _acquire_lease(self, client, state: _ClientQuota, needed: int):
+        redis = await self.get_redis()
+        block = max(needed, lease_block(client.daily_quota))
+        day, month = state.day, state.month
+        day_key = self._day_key(client.id, day)
+        month_key = self._month_key(client.id, month)
+
+        pipe = redis.pipeline(transaction=False)
+        refunds = self._take_refunds(pipe)
+        pipe.incrby(day_key, block)
+        pipe.expire(day_key, 2 * 86400)
+        pipe.incrby(month_key, block)
+        pipe.expire(month_key, 32 * 86400)
+        try:
+            results = await pipe.execute()
+        except Exception:
+            self._refunds[:0] = refunds
+            raise
+        day_total, _, month_total, _ = results[-4:]
+
+        day_room = client.daily_quota - (day_total - block)
+        month_room = client.monthly_quota - (month_total - block)
+        granted = max(0, min(block, day_room, month_room))
+
+        # Devolve o que excedeu a quota para que o Redis nunca passe do limite
+        excess = block - granted
+        if excess:
+            pipe = redis.pipeline(transaction=False)
+            pipe.decrby(day_key, excess)
+            pipe.decrby(month_key, excess)
+            day_total, month_total = await pipe.execute()
+
+        if (state.day, state.month) != (day, month):
+            # O período virou durante a reserva: o bloco é da chave antiga; reserva de novo
+            self._queue_refund(client.id, day, month, granted)
+            return await self._acquire_lease(client, state, needed)
+        state.lease += granted
+        state.day_total = day_total
+        state.month_total = month_total
+        return day_room, month_room
+
+    async def consume(self, client, weight: int = 1):
+        """ Consome `weight` unidades ou levanta 429 se a quota diária/mensal acabou. """
+        state = self._get_state(str(client.id))
+        if state.lease < weight:
+            async with state.lock:
+                if state.lease < weight:
+                    day_room, month_room = await self._acquire_lease(client, state, weight - state.lease)
+                    if state.lease < weight:
+                        monthly = month_room <= day_room
+                        if not state.notified:
+                            state.notified = True
+                            webhook_dispatcher.emit(client, "quota.exceeded", {
+                                "period": "monthly" if monthly else "daily",
+                                "limit": client.monthly_quota if monthly else client.daily_quota,
+                            })
+                        self._raise_exceeded(client, monthly=monthly)
+        state.lease -= weight
+        state.unflushed += weight
+
+    @staticmethod
+    def _raise_exceeded(client, monthly: bool):
+        if monthly:
+            raise HTTPException(
+                status_code=429,
+                detail={
+                    "error": "Quota mensal excedida",
+                    "limit": client.monthly_quota,
+                    "reset": "próximo mês",
+                    "upgrade": QUOTA_UPGRADE_URL
+                }
+            )
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "Quota diária excedida",
+                "limit": client.daily_quota,
+                "reset": "amanhã",
+                "upgrade": QUOTA_UPGRADE_URL
+            }
+        )
+
+    def remaining(self, client) -> int:
+        """ Estimativa local da quota diária restante, sem consultar o Redis. """
+        state = self._state.get(str(client.id))
+        if state is None:
+            return client.daily_quota
+        used = state.day_total - state.lease
+        return max(0, client.daily_quota - used)
+
+    async def release_leases(self):
+        """ Devolve ao Redis as reservas não consumidas (shutdown do worker). """
+        if self.redis is None:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        pending = bool(self._take_refunds(pipe))
+        for client_id, state in self._state.items():
+            if state.lease:
+                pipe.decrby(self._day_key(client_id, state.day), state.lease)
+                pipe.decrby(self._month_key(client_id, state.month), state.lease)
+                state.lease = 0
+                pending = True
+        if pending:
+            try:
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Falha ao devolver reservas de quota: {e}")
+
+    # --- Persistência ---
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Falha ao gravar uso de quota: {e}", exc_info=True)
+
+    async def flush(self):
+        """
+        Grava o consumo acumulado em um UPDATE ... FROM (VALUES ...) por
+        período (normalmente um só; dois logo após a virada do dia).
+        """
+        if self.session_factory is None:
+            return
+        pending, self._carry = self._carry, {}
+        for client_id, state in self._state.items():
+            if state.unflushed:
+                key = (client_id, state.day, state.month)
+                pending[key] = pending.get(key, 0) + state.unflushed
+                state.unflushed = 0
+        if not pending:
+            return
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        by_period: Dict[Tuple[str, str], List[Tuple[str, int]]] = {}
+        for (client_id, day, month), used in pending.items():
+            by_period.setdefault((day, month), []).append((client_id, used))
+        try:
+            async with self.session_factory() as session:
+                # Períodos mais antigos primeiro: o mais novo é quem reinicia os contadores
+                for (day, month), usage in sorted(by_period.items()):
+                    await session.execute(self._usage_update(day, month, usage, now))
+                await session.commit()
+        except Exception:
+            # Devolve os contadores, com seus períodos, para a próxima tentativa
+            for (client_id, day, month), used in pending.items():
+                self._carry_usage(client_id, day, month, used)
+            raise
+
+    @staticmethod
+    def _usage_update(day: str, month: str, usage: List[Tuple[str, int]], now: datetime):
+        """
+        Soma `used` se o período no banco é o mesmo; reinicia se o do consumo é
+        mais novo; descarta (para aquele contador) se o banco já virou para um
+        período posterior.
+        """
+        day_start = datetime.strptime(day, "%Y-%m-%d")
+        month_start = datetime.strptime(month, "%Y-%m")
+        v = values(
+            column("id", PG_UUID(as_uuid=False)), column("used", Integer),
+            column("day", DateTime), column("month", DateTime), name="usage"
+        ).data([(client_id, used, day_start, month_start) for client_id, used in usage])
+        db_day = func.date_trunc("day", Client.last_daily_reset)
+        db_month = func.date_trunc("month", Client.last_monthly_reset)
+        same_day = db_day == v.c.day
+        newer_day = or_(Client.last_daily_reset.is_(None), db_day < v.c.day)
+        same_month = db_month == v.c.month
+        newer_month = or_(Client.last_monthly_reset.is_(None), db_month < v.c.month)
+        return (
+            update(Client)
+            .where(Client.id == v.c.id)
+            .values(
+                daily_used=case((same_day, Client.daily_used + v.c.used), (newer_day, v.c.used), else_=Client.daily_used),
+                last_daily_reset=case((newer_day, v.c.day), else_=Client.last_daily_reset),
+                monthly_used=case((same_month, Client.monthly_used + v.c.used), (newer_month, v.c.used), else_=Client.monthly_used),
+                last_monthly_reset=case((newer_month, v.c.month), else_=Client.last_monthly_reset),
+                last_request_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+quota_engine = QuotaEngine()
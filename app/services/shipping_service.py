@@ -0,0 +1,181 @@
+# app/services/shipping_service.py
+import asyncio
+import logging
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger("fastapi_app")
+
+# --- Configuração ---
+SHIP_ORIGIN_CEP = getattr(settings, "SHIP_ORIGIN_CEP", "01001000")
+SHIP_QUOTE_CACHE_TTL = getattr(settings, "SHIP_QUOTE_CACHE_TTL", 900)  # segundos
+SHIP_QUOTE_CACHE_SIZE = getattr(settings, "SHIP_QUOTE_CACHE_SIZE", 10000)
+SHIP_CARRIER_TIMEOUT = getattr(settings, "SHIP_CARRIER_TIMEOUT", 10.0)
+SHIP_CEP_RANGE_DIGITS = 5      # prefixo do CEP (região/sub-região/setor)
+SHIP_WEIGHT_BUCKET_KG = 0.5
+SHIP_DIMENSION_BUCKET_CM = 5
+
+
+def normalize_cep(cep: str) -> str:
+    digits = "".join(c for c in str(cep) if c.isdigit())
+    if len(digits) != 8:
+        raise HTTPException(status_code=400, detail=f"CEP inválido: {cep}")
+    return digits
+
+
+def cep_range(cep: str) -> str:
+    return cep[:SHIP_CEP_RANGE_DIGITS]
+
+
+def _bucket(value: float, step: float) -> float:
+    if value <= 0:
+        return step
+    return math.ceil(round(value / step, 6)) * step
+
+
+class PackageBucket:
+    """
+    Pacote consolidado do carrinho, arredondado para cima nas faixas de peso e
+    dimensão. A cotação é feita com os limites superiores da faixa, de modo que
+    o valor em cache seja válido para qualquer pacote que caia nela.
+    """
+
+    __slots__ = ("weight_kg", "height_cm", "width_cm", "length_cm")
+
+    def __init__(self, weight_kg: float, height_cm: float, width_cm: float, length_cm: float):
+        self.weight_kg = _bucket(weight_kg, SHIP_WEIGHT_BUCKET_KG)
+        self.height_cm = _bucket(height_cm, SHIP_DIMENSION_BUCKET_CM)
+        self.width_cm = _bucket(width_cm, SHIP_DIMENSION_BUCKET_CM)
+        self.length_cm = _bucket(length_cm, SHIP_DIMENSION_BUCKET_CM)
+
+    @classmethod
+    def from_items(cls, items) -> "PackageBucket":
+        # Empilha os itens: altura somada, largura/comprimento pelo maior item
+        weight = sum(i.weight_kg * i.quantity for i in items)
+        height = sum(i.height_cm * i.quantity for i in items)
+        width = max((i.width_cm for i in items), default=0)
+        length = max((i.length_cm for i in items), default=0)
+        return cls(weight, height, width, length)
+
+    @property
+    def key(self) -> Tuple[float, float, float, float]:
+        return (self.weight_kg, self.height_cm, self.width_cm, self.length_cm)
+
+
+# --- Transportadoras ---
+class ShippingCarrier(ABC):
+    """ Interface das transportadoras. Implementações devem sobrescrever `quote`. """
+
+    name: str = "base"
+
+    @abstractmethod
+    async def quote(self, origin_cep: str, destination_cep: str, package: PackageBucket) -> List[dict]:
+        """
+        Retorna a lista de serviços disponíveis no formato
+        {"service": str, "price": float, "delivery_days": int}.
+        """
+
+
+class StubCarrier(ShippingCarrier):
+    """ Transportadora local e determinística, usada em desenvolvimento e testes. """
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def quote(self, origin_cep: str, destination_cep: str, package: PackageBucket) -> List[dict]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        # Distância aproximada pela diferença das regiões do CEP
+        distance = abs(int(origin_cep[:3]) - int(destination_cep[:3]))
+        volume_kg = package.height_cm * package.width_cm * package.length_cm / 6000
+        billable = max(package.weight_kg, volume_kg)
+
+        base = 12.0 + billable * 4.5 + distance * 0.02
+        days = 2 + distance // 150
+        return [
+            {"service": "standard", "price": round(base, 2), "delivery_days": days + 3},
+            {"service": "express", "price": round(base * 1.8, 2), "delivery_days": days},
+        ]
+
+
+CARRIERS: Dict[str, ShippingCarrier] = {}
+
+
+def register_carrier(carrier: ShippingCarrier):
+    CARRIERS[carrier.name] = carrier
+
+
+register_carrier(StubCarrier())
+
+
+# --- Cache de cotações ---
+quote_cache = TTLCache(ttl=SHIP_QUOTE_CACHE_TTL, maxsize=SHIP_QUOTE_CACHE_SIZE)
+
+
+def quote_cache_key(carrier: str, origin_cep: str, destination_cep: str, package: PackageBucket) -> tuple:
+    return (carrier, cep_range(origin_cep), cep_range(destination_cep), package.key)
+
+
+async def _quote_one(carrier: ShippingCarrier, origin_cep: str, destination_cep: str, package: PackageBucket) -> List[dict]:
+    key = quote_cache_key(carrier.name, origin_cep, destination_cep, package)
+    cached = quote_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    services = await asyncio.wait_for(
+        carrier.quote(origin_cep, destination_cep, package),
+        timeout=SHIP_CARRIER_TIMEOUT
+    )
+    quote_cache.set(key, services)
+    return services
+
+
+async def quote_cart(items, destinations: List[str], origin_cep: Optional[str] = None, carriers: Optional[List[str]] = None) -> List[dict]:
+    """
+    Cota o carrinho para todos os destinos e transportadoras em paralelo.
+    Combinações que caem na mesma chave de cache são cotadas uma única vez.
+    """
+    origin = normalize_cep(origin_cep or SHIP_ORIGIN_CEP)
+    package = PackageBucket.from_items(items)
+
+    if carriers:
+        unknown = [c for c in carriers if c not in CARRIERS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Transportadora desconhecida: {', '.join(unknown)}")
+        selected = [CARRIERS[c] for c in carriers]
+    else:
+        selected = list(CARRIERS.values())
+
+    # Valida todos os CEPs antes de criar tasks: um 400 no meio do laço deixaria cotações órfãs
+    normalized = [normalize_cep(raw_cep) for raw_cep in destinations]
+
+    pending: Dict[tuple, asyncio.Task] = {}
+    jobs = []
+    for destination in normalized:
+        for carrier in selected:
+            key = quote_cache_key(carrier.name, origin, destination, package)
+            if key not in pending:
+                pending[key] = asyncio.ensure_future(_quote_one(carrier, origin, destination, package))
+            jobs.append((destination, carrier.name, pending[key]))
+
+    await asyncio.gather(*pending.values(), return_exceptions=True)
+
+    results = []
+    for destination, carrier_name, task in jobs:
+        entry = {"destination_cep": destination, "carrier": carrier_name, "services": [], "error": None}
+        exc = task.exception()
+        if exc is not None:
+            logger.warning(f"Falha ao cotar frete com {carrier_name} para {destination}: {exc!r}")
+            entry["error"] = "Tempo esgotado" if isinstance(exc, asyncio.TimeoutError) else "Falha na cotação"
+        else:
+            entry["services"] = task.result()
+        results.append(entry)
+    return results
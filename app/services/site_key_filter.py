@@ -0,0 +1,172 @@
+# app/services/site_key_filter.py
+import asyncio
+import hashlib
+import logging
+import math
+from typing import Callable, Iterable, List, Optional
+
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings as config
+from app.core.metrics import registry
+
+logger = logging.getLogger("fastapi_app")
+
+SITE_KEY_FILTER_INTERVAL = getattr(config, "SITE_KEY_FILTER_INTERVAL", 10)
+SITE_KEY_FILTER_ERROR_RATE = getattr(config, "SITE_KEY_FILTER_ERROR_RATE", 0.001)
+SITE_KEY_NEGATIVE_TTL = getattr(config, "SITE_KEY_NEGATIVE_TTL", 60)
+SITE_KEY_NEGATIVE_SIZE = getattr(config, "SITE_KEY_NEGATIVE_SIZE", 100000)
+
+site_key_rejections_total = registry.counter(
+    "site_key_rejections_total", "Site keys rejeitadas antes do banco.", ("reason",))
+
+
+class BloomFilter:
+    """ Filtro de Bloom com hashing duplo sobre um único blake2b de 128 bits. """
+    __slots__ = ("size", "hashes", "bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        bits = self.bits
+        for pos in self._positions(value):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class SiteKeyFilter:
+    """
+    Rejeita site keys inválidas sem consultar o banco.
+
+    - Bloom filter com todas as site keys de clientes ativos: ausência no
+      filtro é definitiva. É reconstruído quando a "impressão" da tabela
+      (quantidade + último updated_at) muda, verificada a cada `interval`.
+      Um cliente recém-criado é aceito após a próxima verificação (ou
+      imediatamente com `add`).
+    - Cache negativo curto para chaves que passaram pelo filtro (falso
+      positivo) mas não existem: o mesmo scanner não gera uma consulta por
+      requisição.
+
+    Enquanto o primeiro build não termina, todas as chaves passam. A mesma
+    impressão detecta clientes alterados (status, origens, políticas): os
+    callbacks de `on_change` invalidam os caches derivados em cada worker.
+    """
+
+    def __init__(self, interval: float = SITE_KEY_FILTER_INTERVAL, error_rate: float = SITE_KEY_FILTER_ERROR_RATE):
+        self.interval = interval
+        self.error_rate = error_rate
+        self.bloom: Optional[BloomFilter] = None
+        self.negative = TTLCache(ttl=SITE_KEY_NEGATIVE_TTL, maxsize=SITE_KEY_NEGATIVE_SIZE)
+        self.session_factory = None
+        self._fingerprint = None
+        self._listeners: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Ciclo de vida ---
+    async def start(self, session_factory):
+        self.session_factory = session_factory
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Falha ao construir o filtro de site keys: {e}", exc_info=True)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Falha ao atualizar o filtro de site keys: {e}")
+
+    # --- Build ---
+    def _active_filter(self, Client):
+        from app.schemas.client import ClientStatusEnum
+        return Client.status.in_([ClientStatusEnum.ACTIVE.value, ClientStatusEnum.TRIAL.value])
+
+    async def refresh(self, force: bool = False):
+        from sqlalchemy import func, select
+        from app.models.client import Client
+
+        async with self.session_factory() as session:
+            # max(updated_at) na tabela toda: suspender um cliente também muda a impressão
+            fingerprint = tuple((await session.execute(
+                select(func.count(Client.id).filter(self._active_filter(Client)), func.max(Client.updated_at))
+            )).one())
+            if not force and fingerprint == self._fingerprint:
+                return
+            result = await session.execute(select(Client.site_key).where(self._active_filter(Client)))
+            site_keys = [row[0] for row in result]
+        self.rebuild(site_keys)
+        changed = self._fingerprint is not None
+        self._fingerprint = fingerprint
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.error(f"Falha ao invalidar cache após alteração de clientes: {e}", exc_info=True)
+
+    def on_change(self, listener: Callable[[], None]):
+        """ Registra um callback chamado quando a tabela de clientes muda. """
+        self._listeners.append(listener)
+
+    def rebuild(self, site_keys: Iterable[str]):
+        site_keys = list(site_keys)
+        # Folga para crescer via `add` sem degradar a taxa de falso positivo
+        bloom = BloomFilter(max(1000, len(site_keys) * 2), self.error_rate)
+        for site_key in site_keys:
+            bloom.add(site_key)
+        self.bloom = bloom
+        # Chaves rejeitadas antes podem ter passado a existir
+        self.negative.clear()
+        logger.info(f"Filtro de site keys reconstruído: {len(site_keys)} chaves, {len(bloom.bits) // 1024}KiB")
+
+    # --- Consulta ---
+    def add(self, site_key: str):
+        if self.bloom is not None:
+            self.bloom.add(site_key)
+        self.negative.delete(site_key)
+
+    def reject(self, site_key: str):
+        """ Registra uma chave confirmada como inválida pelo banco. """
+        self.negative.set(site_key, True)
+
+    def might_exist(self, site_key: str) -> bool:
+        if self.negative.get(site_key) is not MISSING:
+            site_key_rejections_total.inc("negative_cache")
+            return False
+        if self.bloom is not None and site_key not in self.bloom:
+            site_key_rejections_total.inc("bloom")
+            return False
+        return True
+
+
+site_key_filter = SiteKeyFilter()
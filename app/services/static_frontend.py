@@ -0,0 +1,187 @@
+# app/services/static_frontend.py
+import logging
+import mimetypes
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+from app.core.config import settings
+from app.middlewares.cache_middleware import etag_matches, parse_accept_encoding
+
+logger = logging.getLogger("fastapi_app")
+
+FRONTEND_DIST_DIR = getattr(settings, "FRONTEND_DIST_DIR", "frontend/dist")
+SMALL_FILE_LIMIT = 256 * 1024          # arquivos menores ficam em memória
+MEMORY_CACHE_BYTES = 32 * 1024 * 1024  # orçamento total do cache em memória
+RANGE_CHUNK_SIZE = 64 * 1024
+
+# Nomes com hash de build (app.3f9a1c2b.js, index-Bx12ab9Q.css) nunca mudam de conteúdo
+HASHED_NAME = re.compile(r"[.-](?=[A-Za-z0-9_]*\d)[A-Za-z0-9_]{8,}\.[A-Za-z0-9]+$")
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_DEFAULT = "public, max-age=3600"
+CACHE_INDEX = "no-cache"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+class _MemoryCache:
+    """ LRU de conteúdo de arquivos pequenos, limitado pelo total de bytes. """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+
+    def get(self, path: str, mtime_ns: int) -> Optional[bytes]:
+        entry = self._data.get(path)
+        if entry is None or entry[0] != mtime_ns:
+            return None
+        self._data.move_to_end(path)
+        return entry[1]
+
+    def set(self, path: str, mtime_ns: int, content: bytes):
+        old = self._data.pop(path, None)
+        if old is not None:
+            self.size -= len(old[1])
+        self._data[path] = (mtime_ns, content)
+        self.size += len(content)
+        while self.size > self.max_bytes and self._data:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.size -= len(evicted)
+
+
+_memory_cache = _MemoryCache(MEMORY_CACHE_BYTES)
+
+
+def resolve_asset(path: str, root: Path) -> Tuple[Path, bool]:
+    """
+    Resolve o arquivo solicitado dentro de `root`. Caminhos sem extensão que
+    não existem são rotas do SPA e recebem o index.html.
+    """
+    candidate = (root / path.lstrip("/")).resolve()
+    if not candidate.is_relative_to(root):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    if candidate.is_file():
+        return candidate, candidate.name == "index.html"
+
+    if not Path(path).suffix:
+        index = root / "index.html"
+        if index.is_file():
+            return index, True
+    raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """ Retorna (início, fim inclusivo) de um Range único; None para servir o arquivo todo. """
+    # Arquivo vazio não tem intervalo satisfazível: serve o 200 vazio (Range é opcional)
+    if not header or not header.startswith("bytes=") or "," in header or size == 0:
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                raise ValueError(header)
+            return max(0, size - length), size - 1
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        raise HTTPException(status_code=416, detail="Range inválido", headers={"Content-Range": f"bytes */{size}"})
+    return first, min(last, size - 1)
+
+
+async def _iter_file_range(path: Path, start: int, end: int):
+    remaining = end - start + 1
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _pick_precompressed(file_path: Path, accept_encoding: Optional[str]) -> Tuple[Path, Optional[str]]:
+    accepted = parse_accept_encoding(accept_encoding)
+    for encoding, suffix in PRECOMPRESSED:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            sibling = file_path.with_name(file_path.name + suffix)
+            if sibling.is_file():
+                return sibling, encoding
+    return file_path, None
+
+
+def _locate(path: str, root: Optional[str], range_header: Optional[str], accept_encoding: Optional[str]):
+    """ Parte bloqueante (resolve, variantes pré-comprimidas, stat): roda no threadpool. """
+    root_path = Path(root or FRONTEND_DIST_DIR).resolve()
+    file_path, is_index = resolve_asset(path, root_path)
+    # Range é aplicado sobre a representação sem compressão
+    if range_header:
+        send_path, encoding = file_path, None
+    else:
+        send_path, encoding = _pick_precompressed(file_path, accept_encoding)
+    return file_path, is_index, send_path, encoding, os.stat(send_path)
+
+
+async def serve_asset(request: Request, path: str, root: Optional[str] = None) -> Response:
+    range_header = request.headers.get("range")
+    file_path, is_index, send_path, encoding, stat = await run_in_threadpool(
+        _locate, path, root, range_header, request.headers.get("accept-encoding")
+    )
+
+    media_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+    if is_index:
+        cache_control = CACHE_INDEX
+    elif HASHED_NAME.search(file_path.name):
+        cache_control = CACHE_IMMUTABLE
+    else:
+        cache_control = CACHE_DEFAULT
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = parse_range(range_header, stat.st_size)
+    if_range = request.headers.get("if-range")
+    if byte_range and if_range and if_range != etag:
+        byte_range = None
+
+    if stat.st_size <= SMALL_FILE_LIMIT:
+        content = _memory_cache.get(str(send_path), stat.st_mtime_ns)
+        if content is None:
+            content = await anyio.Path(send_path).read_bytes()
+            _memory_cache.set(str(send_path), stat.st_mtime_ns, content)
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            return Response(content=content[start:end + 1], status_code=206, headers=headers, media_type=media_type)
+        return Response(content=content, headers=headers, media_type=media_type)
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_iter_file_range(send_path, start, end), status_code=206, headers=headers, media_type=media_type)
+
+    # FileResponse lê em chunks fora do event loop. Não é zero-copy aqui: a extensão
+    # ASGI "pathsend" não atravessa as camadas BaseHTTPMiddleware, que repassam o corpo
+    return FileResponse(send_path, headers=headers, media_type=media_type, stat_result=stat)
@@ -0,0 +1,357 @@
+# app/services/webhook_service.py
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings as config
+from app.core.metrics import registry
+
+logger = logging.getLogger("fastapi_app")
+
+WEBHOOK_WORKERS = getattr(config, "WEBHOOK_WORKERS", 16)
+WEBHOOK_PER_HOST_CONCURRENCY = getattr(config, "WEBHOOK_PER_HOST_CONCURRENCY", 4)
+WEBHOOK_BATCH_SIZE = getattr(config, "WEBHOOK_BATCH_SIZE", 50)
+WEBHOOK_TIMEOUT = getattr(config, "WEBHOOK_TIMEOUT", 10.0)
+WEBHOOK_MAX_ATTEMPTS = getattr(config, "WEBHOOK_MAX_ATTEMPTS", 8)
+WEBHOOK_BACKOFF_BASE = 2.0      # segundos; dobra a cada tentativa
+WEBHOOK_BACKOFF_MAX = 900.0
+WEBHOOK_BUFFER_MAX = 10000
+WEBHOOK_DEAD_LETTER_MAX = 1000
+WEBHOOK_POLL_INTERVAL = 0.2
+WEBHOOK_PUMP_INTERVAL = 0.05
+
+# Layout no Redis
+QUEUE_KEY = "webhook:queue:{}"      # lista de eventos pendentes por cliente
+DEAD_KEY = "webhook:dead:{}"        # lotes que esgotaram as tentativas
+DUE_KEY = "webhook:due"             # zset cliente -> próxima entrega (ou fim do lease)
+ATTEMPTS_KEY = "webhook:attempts"   # hash cliente -> tentativas do lote atual
+
+# Reivindica o destino se já venceu, estendendo o score até o fim do lease.
+# Um único worker (de qualquer processo) entrega para o mesmo cliente por vez.
+CLAIM_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) <= tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+    return 1
+end
+return 0
+"""
+# Remove o lote entregue e reagenda o cliente se ainda houver eventos
+FINISH_SCRIPT = """
+redis.call('LTRIM', KEYS[1], tonumber(ARGV[1]), -1)
+if redis.call('LLEN', KEYS[1]) > 0 then
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+else
+    redis.call('ZREM', KEYS[2], ARGV[3])
+end
+return 1
+"""
+
+webhook_deliveries_total = registry.counter(
+    "webhook_deliveries_total", "Entregas de webhook por resultado.", ("outcome",))
+webhook_delivery_seconds = registry.histogram(
+    "webhook_delivery_duration_seconds", "Duração das entregas de webhook.", ("outcome",))
+
+Destination = Tuple[str, Optional[str]]
+
+
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def backoff_delay(attempt: int) -> float:
+    delay = min(WEBHOOK_BACKOFF_MAX, WEBHOOK_BACKOFF_BASE * (2 ** (attempt - 1)))
+    # Jitter para que destinos que voltaram ao ar não recebam todos ao mesmo tempo
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def resolve_destination_from_db(client_id: str) -> Optional[Destination]:
+    from sqlalchemy import select
+    from app.database.database import ReplicaSessionLocal
+    from app.models.client import Client
+
+    async with ReplicaSessionLocal() as session:
+        row = (await session.execute(
+            select(Client.webhook_url, Client.webhook_secret).where(Client.id == uuid.UUID(client_id))
+        )).first()
+    if row is None or not row.webhook_url:
+        return None
+    return row.webhook_url, row.webhook_secret
+
+
+class WebhookDispatcher:
+    """
+    Entrega de webhooks fora do caminho da requisição.
+
+    `emit` só anexa o evento a um buffer em memória (não faz I/O); uma task
+    transfere o buffer para filas duráveis no Redis, uma por cliente. Os
+    workers reivindicam destinos vencidos, agrupam até `batch_size` eventos
+    em um único POST assinado (HMAC-SHA256 com `webhook_secret`) e, em caso
+    de falha, reagendam com backoff exponencial. Após `max_attempts` o lote
+    vai para `webhook:dead:{client_id}`.
+    """
+
+    def __init__(
+        self,
+        workers: int = WEBHOOK_WORKERS,
+        per_host_concurrency: int = WEBHOOK_PER_HOST_CONCURRENCY,
+        batch_size: int = WEBHOOK_BATCH_SIZE,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        timeout: float = WEBHOOK_TIMEOUT
+    ):
+        self.workers = workers
+        self.per_host_concurrency = per_host_concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.lease_seconds = timeout * 3
+        self.redis = None
+        self.resolver: Callable[[str], Awaitable[Optional[Destination]]] = resolve_destination_from_db
+        self.dropped = 0
+        self._buffer: Deque[Tuple[str, str]] = deque()
+        self._destinations = TTLCache(ttl=60, maxsize=10000)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: set = set()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._tasks = []
+        self._claim = None
+        self._finish = None
+
+    # --- Ciclo de vida ---
+    async def start(self, redis=None, resolver=None):
+        if self._tasks:
+            return
+        if redis is not None:
+            self.redis = redis
+        if resolver is not None:
+            self.resolver = resolver
+        redis = await self.get_redis()
+        self._claim = redis.register_script(CLAIM_SCRIPT)
+        self._finish = redis.register_script(FINISH_SCRIPT)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._http = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+            headers={"User-Agent": f"{config.PROJECT_NAME}-webhooks"}
+        )
+        self._tasks = [asyncio.ensure_future(self._pump()), asyncio.ensure_future(self._poll())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        # Eventos ainda em memória vão para o Redis; entregas em andamento terminam
+        await self._flush_buffer()
+        if self._in_flight:
+            _, pending = await asyncio.wait(set(self._in_flight), timeout=self.timeout)
+            # Sobras são canceladas e aguardadas antes de fechar o cliente HTTP;
+            # o lease expira e outro worker reenvia o lote (o receptor deduplica pelo id)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def get_redis(self):
+        if self.redis is None:
+            import redis.asyncio as redis
+            self.redis = await redis.from_url(config.REDIS_URL)
+        return self.redis
+
+    # --- Publicação ---
+    def emit(self, client, event_type: str, data: dict):
+        """ Enfileira um evento para o webhook do cliente. Não bloqueia nem faz I/O. """
+        if not getattr(client, "webhook_url", None):
+            return
+        event = {
+            "id": uuid.uuid4().hex,
+            "type": event_type,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "data": data,
+        }
+        if len(self._buffer) >= WEBHOOK_BUFFER_MAX:
+            # Redis indisponível por muito tempo: descarta o mais antigo em vez de crescer sem limite
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append((str(client.id), json.dumps(event, default=str, separators=(",", ":"))))
+
+    async def _flush_buffer(self):
+        if not self._buffer:
+            return
+        batch = list(self._buffer)
+        self._buffer.clear()
+        by_client: Dict[str, list] = {}
+        for client_id, payload in batch:
+            by_client.setdefault(client_id, []).append(payload)
+
+        redis = await self.get_redis()
+        pipe = redis.pipeline(transaction=False)
+        now = time.time()
+        for client_id, payloads in by_client.items():
+            pipe.rpush(QUEUE_KEY.format(client_id), *payloads)
+            # NX: não antecipa um destino em backoff ou com lease ativo
+            pipe.zadd(DUE_KEY, {client_id: now}, nx=True)
+        try:
+            await pipe.execute()
+        except Exception as e:
+            self._buffer.extendleft(reversed(batch))
+            logger.warning(f"Falha ao enfileirar webhooks no Redis: {e}")
+
+    async def _pump(self):
+        while True:
+            await asyncio.sleep(WEBHOOK_PUMP_INTERVAL)
+            await self._flush_buffer()
+
+    # --- Entrega ---
+    async def _poll(self):
+        while True:
+            try:
+                claimed = await self._claim_due()
+            except Exception as e:
+                logger.warning(f"Falha ao buscar webhooks pendentes: {e}")
+                claimed = 0
+            if not claimed:
+                await asyncio.sleep(WEBHOOK_POLL_INTERVAL)
+
+    async def _claim_due(self) -> int:
+        free = self.workers - len(self._in_flight)
+        if free <= 0:
+            return 0
+        now = time.time()
+        due = await self.redis.zrangebyscore(DUE_KEY, "-inf", now, start=0, num=free)
+        claimed = 0
+        for member in due:
+            client_id = member.decode() if isinstance(member, bytes) else member
+            # Slot antes do claim: o lease não corre enquanto a entrega espera vaga
+            await self._slots.acquire()
+            if not await self._claim(keys=[DUE_KEY], args=[client_id, now, time.time() + self.lease_seconds]):
+                self._slots.release()
+                continue
+            task = asyncio.ensure_future(self._deliver(client_id))
+            self._in_flight.add(task)
+            task.add_done_callback(self._delivery_done)
+            claimed += 1
+        return claimed
+
+    def _delivery_done(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._slots.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Erro inesperado na entrega de webhook: {task.exception()}")
+
+    async def _destination(self, client_id: str) -> Optional[Destination]:
+        destination = self._destinations.get(client_id)
+        if destination is MISSING:
+            destination = await self.resolver(client_id)
+            self._destinations.set(client_id, destination)
+        return destination
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = self._host_limits[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return semaphore
+
+    async def _deliver(self, client_id: str):
+        queue_key = QUEUE_KEY.format(client_id)
+        raw = await self.redis.lrange(queue_key, 0, self.batch_size - 1)
+        if not raw:
+            await self._finish(keys=[queue_key, DUE_KEY], args=[0, time.time(), client_id])
+            return
+
+        events = [json.loads(item) for item in raw]
+        # ID estável entre tentativas: o receptor pode deduplicar reenvios
+        batch_id = hashlib.sha256("".join(e["id"] for e in events).encode()).hexdigest()[:32]
+        destination = await self._destination(client_id)
+        if destination is None:
+            await self._dead_letter(client_id, queue_key, batch_id, events, "destino não configurado")
+            return
+
+        url, secret = destination
+        body = json.dumps({"id": batch_id, "events": events}, separators=(",", ":")).encode()
+        timestamp = str(int(time.time()))
+        headers = {"Content-Type": "application/json", "X-Webhook-Id": batch_id, "X-Webhook-Timestamp": timestamp}
+        if secret:
+            headers["X-Webhook-Signature"] = sign_payload(secret, timestamp, body)
+
+        start = time.perf_counter()
+        error = None
+        try:
+            async with self._host_limit(url):
+                # A espera pelo limite por host pode consumir o lease: renova antes do POST
+                await self.redis.zadd(DUE_KEY, {client_id: time.time() + self.lease_seconds}, xx=True)
+                response = await self._http.post(url, content=body, headers=headers)
+            if response.status_code >= 300:
+                error = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+        outcome = "error" if error else "success"
+        webhook_deliveries_total.inc(outcome)
+        webhook_delivery_seconds.observe(time.perf_counter() - start, outcome)
+
+        if error is None:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hdel(ATTEMPTS_KEY, client_id)
+            await pipe.execute()
+            await self._finish(keys=[queue_key, DUE_KEY], args=[len(raw), time.time(), client_id])
+            return
+
+        attempts = await self.redis.hincrby(ATTEMPTS_KEY, client_id, 1)
+        if attempts >= self.max_attempts:
+            await self._dead_letter(client_id, queue_key, batch_id, events, error)
+            return
+        delay = backoff_delay(attempts)
+        logger.info(f"Webhook {client_id} falhou ({error}); tentativa {attempts}, nova tentativa em {delay:.1f}s")
+        await self.redis.zadd(DUE_KEY, {client_id: time.time() + delay}, xx=True)
+
+    async def _dead_letter(self, client_id: str, queue_key: str, batch_id: str, events: list, error: str):
+        webhook_deliveries_total.inc("dead_letter")
+        logger.warning(f"Webhook {client_id}: lote {batch_id} com {len(events)} eventos movido para dead-letter ({error})")
+        entry = json.dumps({"id": batch_id, "error": error, "failed_at": datetime.now(timezone.utc).isoformat(), "events": events})
+        dead_key = DEAD_KEY.format(client_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(dead_key, entry)
+        pipe.ltrim(dead_key, -WEBHOOK_DEAD_LETTER_MAX, -1)
+        pipe.hdel(ATTEMPTS_KEY, client_id)
+        await pipe.execute()
+        await self._finish(keys=[queue_key, DUE_KEY], args=[len(events), time.time(), client_id])
+
+    async def requeue_dead_letters(self, client_id: str) -> int:
+        """ Devolve os lotes em dead-letter para a fila (ex.: após o cliente corrigir o endpoint). """
+        redis = await self.get_redis()
+        dead_key = DEAD_KEY.format(client_id)
+        entries = await redis.lrange(dead_key, 0, -1)
+        if not entries:
+            return 0
+        payloads = [json.dumps(event, separators=(",", ":")) for entry in entries for event in json.loads(entry)["events"]]
+        pipe = redis.pipeline(transaction=False)
+        pipe.rpush(QUEUE_KEY.format(client_id), *payloads)
+        pipe.delete(dead_key)
+        pipe.zadd(DUE_KEY, {client_id: time.time()}, nx=True)
+        await pipe.execute()
+        self._destinations.delete(client_id)
+        return len(payloads)
+
+
+webhook_dispatcher = WebhookDispatcher()
@@ -0,0 +1,62 @@
+"""
+WMS falso para benchmarks: responde às rotas de produtos com latência e
+tamanho de payload configuráveis.
+
+Uso isolado:
+    python benchmarks/fake_wms.py --port 8900 --latency-ms 20 --item-bytes 512
+"""
+import argparse
+import asyncio
+import random
+
+from fastapi import FastAPI, Request
+
+ENDPOINT_PROD_LIST = "/products"
+ENDPOINT_FEAT_PROD = "/products/featured"
+
+
+def create_fake_wms(latency_ms: float = 20.0, jitter_ms: float = 5.0, item_bytes: int = 512, total_items: int = 5000) -> FastAPI:
+    app = FastAPI(title="fake-wms")
+    filler = "x" * max(0, item_bytes - 200)
+
+    def product(i: int) -> dict:
+        return {
+            "id_produto": i,
+            "nome_comercial": f"Produto {i}",
+            "preco_venda": round(10 + (i % 500) * 1.37, 2),
+            "imagem_principal": f"https://img.example.com/{i}.jpg",
+            "categoria_nome": f"Categoria {i % 20}",
+            "ativo": True,
+            "data_criacao": "2024-01-01T00:00:00",
+            "descricao": filler,
+        }
+
+    async def delay():
+        await asyncio.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+    @app.get(ENDPOINT_PROD_LIST)
+    async def list_products(request: Request, page: int = 1, per_page: int = 20, ids: str = None):
+        await delay()
+        if ids:
+            return [product(int(i)) for i in ids.split(",") if i.isdigit() and int(i) <= total_items]
+        start = (page - 1) * per_page
+        items = [product(i) for i in range(start + 1, min(start + per_page, total_items) + 1)]
+        return {"products": items, "total": total_items, "page": page, "pages": -(-total_items // per_page)}
+
+    @app.get(ENDPOINT_FEAT_PROD)
+    async def featured(limit: int = 6):
+        await delay()
+        return [product(i) for i in range(1, limit + 1)]
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--item-bytes", type=int, default=512)
+    args = parser.parse_args()
+    uvicorn.run(create_fake_wms(args.latency_ms, item_bytes=args.item_bytes), port=args.port, log_level="warning")
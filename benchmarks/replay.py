@@ -0,0 +1,301 @@
+"""
+Captura e replay de tráfego real a partir dos audit logs.
+
+Subcomandos:
+
+  export   Exporta uma janela de tempo de `audit_logs` (Postgres) ou das listas
+           `audit:{client_id}` (Redis) para um arquivo .jsonl.gz compacto.
+
+      python benchmarks/replay.py export --database-url postgresql+asyncpg://... \\
+          --since 2024-05-01T10:00 --until 2024-05-01T11:00 --out capture.jsonl.gz
+
+  replay   Reenvia a captura para uma instância local respeitando os intervalos
+           originais (--speed 1, 4, ... ou max), reassinando HMAC com
+           credenciais de teste, e grava a latência de cada requisição.
+
+      python benchmarks/replay.py replay capture.jsonl.gz --target http://127.0.0.1:8000 \\
+          --site-key bench-site-stripe --api-key bench-api-key --api-signing-key <hex> \\
+          --speed 4 --out build-a.json
+
+  compare  Compara dois resultados de replay (ex.: build A x build B) por rota.
+
+      python benchmarks/replay.py compare build-a.json build-b.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FORMAT_VERSION = 1
+# Headers recalculados no replay ou irrelevantes para o servidor
+DROP_HEADERS = {"host", "content-length", "x-signature", "x-timestamp", "authorization", "cookie", "connection", "accept-encoding"}
+
+
+# --- Export ---
+def body_complete(body: Optional[str], size: Optional[int], tail_sha256: Optional[str]) -> bool:
+    """
+    O corpo armazenado é o original? Truncado (sha256 do trecho descartado) ou
+    alterado na decodificação (tamanho diferente) seria reenviado como outro
+    payload, com outra assinatura: essas entradas ficam fora da captura.
+    Registros anteriores a `request_body_size` são aceitos como estão.
+    """
+    if tail_sha256:
+        return False
+    return size is None or len((body or "").encode("utf-8")) == size
+
+
+def _compact_entry(created_at: datetime, method: str, path: str, headers: dict, body, site_key: str) -> dict:
+    headers = {k.lower(): v for k, v in (headers or {}).items() if k.lower() not in DROP_HEADERS}
+    entry = {"ts": created_at.timestamp(), "m": method, "p": path, "sk": site_key}
+    if headers:
+        entry["h"] = headers
+    if body:
+        entry["b"] = body
+    return entry
+
+
+async def _load_from_postgres(args) -> list:
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.models.client import AuditLog
+    from app.services.audit_policy import decode_body
+
+    engine = create_async_engine(args.database_url)
+    stmt = (
+        select(AuditLog.created_at, AuditLog.request_method, AuditLog.request_path,
+               AuditLog.request_headers, AuditLog.request_body, AuditLog.site_key_used,
+               AuditLog.request_body_encoding, AuditLog.request_body_size, AuditLog.request_body_sha256)
+        .where(AuditLog.created_at >= args.since, AuditLog.created_at < args.until)
+        .order_by(AuditLog.created_at)
+    )
+    entries, skipped = [], 0
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt)
+        async for created_at, method, path, headers, body, site_key, encoding, size, tail_sha256 in result:
+            body = decode_body(body, encoding)
+            if not body_complete(body, size, tail_sha256):
+                skipped += 1
+                continue
+            entries.append(_compact_entry(created_at, method, path, headers, body, site_key))
+    await engine.dispose()
+    return entries, skipped
+
+
+async def _load_from_redis(args) -> list:
+    import redis.asyncio as redis
+    from app.services.audit_policy import decode_body
+
+    client = redis.from_url(args.redis_url)
+    entries, skipped = [], 0
+    async for key in client.scan_iter(match="audit:*"):
+        for raw in await client.lrange(key, 0, -1):
+            log = json.loads(raw)
+            created_at = datetime.fromisoformat(str(log["created_at"]))
+            if not args.since <= created_at < args.until:
+                continue
+            body = decode_body(log.get("request_body"), log.get("request_body_encoding"))
+            if not body_complete(body, log.get("request_body_size"), log.get("request_body_sha256")):
+                skipped += 1
+                continue
+            entries.append(_compact_entry(
+                created_at, log["request_method"], log["request_path"],
+                log.get("request_headers"), body, log["site_key_used"]
+            ))
+    await client.aclose()
+    entries.sort(key=lambda e: e["ts"])
+    return entries, skipped
+
+
+def write_capture(path: str, entries: list, meta: dict):
+    """ Linha 1: metadados; demais: uma requisição por linha com `t` relativo ao início (ms). """
+    start = entries[0]["ts"] if entries else 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"version": FORMAT_VERSION, "count": len(entries), **meta}, default=str) + "\n")
+        for entry in entries:
+            entry["t"] = round((entry.pop("ts") - start) * 1000, 1)
+            f.write(json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+
+def read_capture(path: str):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        meta = json.loads(f.readline())
+        if meta.get("version") != FORMAT_VERSION:
+            raise SystemExit(f"Versão de captura não suportada: {meta.get('version')}")
+        return meta, [json.loads(line) for line in f if line.strip()]
+
+
+async def cmd_export(args):
+    entries, skipped = await (_load_from_redis(args) if args.source == "redis" else _load_from_postgres(args))
+    write_capture(args.out, entries, {"source": args.source, "since": args.since, "until": args.until, "skipped_incomplete": skipped})
+    print(f"{len(entries)} requisições exportadas para {args.out} ({skipped} ignoradas: corpo truncado ou alterado)")
+
+
+# --- Replay ---
+def resign(entry: dict, args) -> dict:
+    headers = dict(entry.get("h", {}))
+    timestamp = str(int(time.time()))
+    headers["x-timestamp"] = timestamp
+    headers["x-site-key"] = args.site_key_map.get(entry["sk"], args.site_key or entry["sk"])
+    if "x-api-key" in headers or args.api_key:
+        payload = entry.get("b") or "{}"
+        headers["x-api-key"] = args.api_key or headers["x-api-key"]
+        headers["x-signature"] = args.sign(timestamp, payload)
+    if args.bearer:
+        headers["authorization"] = f"Bearer {args.bearer}"
+    return headers
+
+
+async def cmd_replay(args):
+    import httpx
+
+    from app.services.credential_service import sign_request
+
+    signing_key = bytes.fromhex(args.api_signing_key) if args.api_key else b""
+    args.sign = lambda timestamp, payload: sign_request(signing_key, timestamp, payload)
+    meta, entries = read_capture(args.capture)
+    speed = None if args.speed == "max" else args.speed
+    semaphore = asyncio.Semaphore(args.max_inflight)
+    results = []
+
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout) as client:
+        async def send(entry):
+            async with semaphore:
+                headers = resign(entry, args)
+                body = entry.get("b")
+                start = time.perf_counter()
+                try:
+                    response = await client.request(entry["m"], entry["p"], headers=headers, content=body.encode() if body else None)
+                    status = response.status_code
+                except Exception as e:
+                    status = type(e).__name__
+                results.append({"p": entry["p"], "m": entry["m"], "status": status, "ms": round((time.perf_counter() - start) * 1000, 3)})
+
+        began = time.perf_counter()
+        tasks = []
+        for entry in entries:
+            if speed is not None:
+                # Mantém o intervalo original entre chegadas, escalado pela velocidade
+                delay = entry["t"] / 1000 / speed - (time.perf_counter() - began)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(entry)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - began
+
+    summary = summarize(results)
+    output = {"capture": args.capture, "target": args.target, "speed": args.speed,
+              "skipped_incomplete": meta.get("skipped_incomplete", 0),
+              "elapsed_s": round(elapsed, 3), "requests": len(results), "routes": summary, "samples": results}
+    with open(args.out, "w") as f:
+        json.dump(output, f)
+    print(json.dumps({k: v for k, v in output.items() if k != "samples"}, indent=2))
+
+
+def _percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summarize(results: list) -> dict:
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    for r in results:
+        key = f"{r['m']} {r['p']}"
+        by_route[key].append(r["ms"])
+        if not isinstance(r["status"], int) or r["status"] >= 500:
+            errors[key] += 1
+    return {
+        key: {"count": len(v), "p50_ms": _percentile(v, 50), "p99_ms": _percentile(v, 99), "errors": errors[key]}
+        for key, v in sorted(by_route.items())
+    }
+
+
+# --- Compare ---
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["routes"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["routes"]
+
+    print(f"{'rota':<50} {'p50 A':>9} {'p50 B':>9} {'Δ%':>7} {'p99 A':>9} {'p99 B':>9} {'Δ%':>7}")
+    report = {}
+    for route in sorted(set(baseline) | set(candidate)):
+        a, b = baseline.get(route), candidate.get(route)
+        if not a or not b:
+            continue
+        d50 = (b["p50_ms"] - a["p50_ms"]) / a["p50_ms"] * 100 if a["p50_ms"] else 0.0
+        d99 = (b["p99_ms"] - a["p99_ms"]) / a["p99_ms"] * 100 if a["p99_ms"] else 0.0
+        report[route] = {"p50_delta_pct": round(d50, 2), "p99_delta_pct": round(d99, 2)}
+        print(f"{route[:50]:<50} {a['p50_ms']:>9.2f} {b['p50_ms']:>9.2f} {d50:>+7.1f} {a['p99_ms']:>9.2f} {b['p99_ms']:>9.2f} {d99:>+7.1f}")
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+def _speed(value: str):
+    if value == "max":
+        return value
+    try:
+        speed = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"velocidade inválida: {value!r}")
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("a velocidade deve ser maior que zero (ou 'max')")
+    return speed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export")
+    export.add_argument("--source", choices=("postgres", "redis"), default="postgres")
+    export.add_argument("--database-url")
+    export.add_argument("--redis-url")
+    export.add_argument("--since", type=datetime.fromisoformat, required=True)
+    export.add_argument("--until", type=datetime.fromisoformat, required=True)
+    export.add_argument("--out", required=True)
+
+    replay = sub.add_parser("replay")
+    replay.add_argument("capture")
+    replay.add_argument("--target", default="http://127.0.0.1:8000")
+    replay.add_argument("--speed", type=_speed, default=1.0, help="fator de velocidade (1, 2, 10...) ou 'max'")
+    replay.add_argument("--site-key", help="site key de teste usada em todas as requisições")
+    replay.add_argument("--site-key-map", type=json.loads, default={}, help='JSON {"site_key_original": "site_key_teste"}')
+    replay.add_argument("--api-key")
+    replay.add_argument("--api-signing-key", default="", help="chave de assinatura (hex) emitida para a credencial de teste")
+    replay.add_argument("--bearer", help="token Bearer de teste")
+    replay.add_argument("--max-inflight", type=int, default=256)
+    replay.add_argument("--timeout", type=float, default=30.0)
+    replay.add_argument("--out", required=True)
+
+    compare = sub.add_parser("compare")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--json", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        if args.source == "postgres" and not args.database_url:
+            parser.error("--database-url é obrigatório para --source postgres")
+        if args.source == "redis" and not args.redis_url:
+            parser.error("--redis-url é obrigatório para --source redis")
+        asyncio.run(cmd_export(args))
+    elif args.command == "replay":
+        asyncio.run(cmd_replay(args))
+    else:
+        cmd_compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Mede o tempo de import da aplicação (cold start) por módulo.
+
+Uso:
+    python benchmarks/startup.py [--module main] [--top 25] [--json]
+
+Executa `python -X importtime -c "import <module>"` em um processo novo e
+agrega o tempo cumulativo de cada módulo. Com --json a saída é legível por
+máquina, para acompanhar regressões.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules.append({
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+        except ValueError:
+            continue
+
+    errors = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "wall_ms": round(wall * 1000, 2),
+        "modules": modules,
+        "errors": errors[-20:],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    result = measure(args.module)
+    top = sorted(result["modules"], key=lambda m: m["cumulative_ms"], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({**result, "modules": top}, indent=2))
+    else:
+        print(f"import {result['module']}: {result['wall_ms']} ms (processo completo)"
+              + ("" if result["ok"] else " [FALHOU]"))
+        print(f"{'cumulativo ms':>14} {'próprio ms':>11}  módulo")
+        for m in top:
+            print(f"{m['cumulative_ms']:>14.2f} {m['self_ms']:>11.2f}  {'  ' * m['depth']}{m['module'].strip()}")
+        for line in result["errors"]:
+            print(line, file=sys.stderr)
+
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Receptor de webhooks para testes do WebhookDispatcher: valida a assinatura
+HMAC, deduplica lotes pelo X-Webhook-Id e simula destinos lentos ou com falhas.
+
+Só o receptor (apontar o webhook_url de um cliente de teste para ele):
+    python benchmarks/webhook_receiver.py serve --port 8901 --secret s3cr3t \\
+        --latency-ms 50 --failure-rate 0.2 --slow-rate 0.05 --slow-ms 3000
+
+Receptor + dispatcher em processo (fakeredis quando instalado, ou --redis-url):
+    python benchmarks/webhook_receiver.py drive --events 5000 --clients 20 \\
+        --failure-rate 0.3 --latency-ms 30
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import sys
+import time
+import types
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HOOK_PATH = "/hook"
+
+
+def create_receiver(secret: str = "", latency_ms: float = 20.0, jitter_ms: float = 5.0,
+                    failure_rate: float = 0.0, slow_rate: float = 0.0, slow_ms: float = 2000.0) -> FastAPI:
+    app = FastAPI(title="webhook-receiver")
+    stats = app.state.stats = {
+        "batches": 0, "events": 0, "duplicates": 0, "failures": 0,
+        "bad_signatures": 0, "in_flight": 0, "max_in_flight": 0,
+    }
+    seen_batches = set()
+    seen_events = app.state.seen_events = set()
+
+    @app.post(HOOK_PATH)
+    async def receive(request: Request):
+        body = await request.body()
+        if secret:
+            timestamp = request.headers.get("x-webhook-timestamp", "")
+            expected = "sha256=" + hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(expected, request.headers.get("x-webhook-signature", "")):
+                stats["bad_signatures"] += 1
+                return JSONResponse({"error": "assinatura inválida"}, status_code=401)
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            delay = slow_ms if random.random() < slow_rate else latency_ms + random.uniform(-jitter_ms, jitter_ms)
+            await asyncio.sleep(max(0.0, delay) / 1000)
+            if random.random() < failure_rate:
+                stats["failures"] += 1
+                return JSONResponse({"error": "falha simulada"}, status_code=503)
+        finally:
+            stats["in_flight"] -= 1
+
+        batch_id = request.headers.get("x-webhook-id")
+        if batch_id in seen_batches:
+            stats["duplicates"] += 1
+            return {"ok": True, "duplicate": True}
+        seen_batches.add(batch_id)
+        events = json.loads(body)["events"]
+        stats["batches"] += 1
+        stats["events"] += len(events)
+        seen_events.update(e["id"] for e in events)
+        return {"ok": True}
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, "unique_events": len(seen_events)}
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def drive(args):
+    import uvicorn
+
+    os.environ.setdefault("REDIS_URL", args.redis_url or "redis://127.0.0.1:6379/15")
+    os.environ.setdefault("PROJECT_NAME", "bench")
+    redis_client = None
+    if not args.redis_url:
+        import fakeredis
+        redis_client = fakeredis.FakeAsyncRedis()
+    from app.services.webhook_service import WebhookDispatcher
+
+    port = _free_port()
+    receiver = create_receiver(args.secret, args.latency_ms, args.jitter_ms, args.failure_rate, args.slow_rate, args.slow_ms)
+    server = uvicorn.Server(uvicorn.Config(receiver, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    server_task = asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    url = f"http://127.0.0.1:{port}{HOOK_PATH}"
+
+    async def resolver(client_id):
+        return url, args.secret
+
+    dispatcher = WebhookDispatcher(workers=args.workers, per_host_concurrency=args.per_host, batch_size=args.batch_size,
+                                   max_attempts=args.max_attempts, timeout=args.timeout)
+    await dispatcher.start(redis=redis_client, resolver=resolver)
+
+    clients = [types.SimpleNamespace(id=uuid.uuid4(), webhook_url=url) for _ in range(args.clients)]
+    emit_start = time.perf_counter()
+    for i in range(args.events):
+        dispatcher.emit(clients[i % len(clients)], "bench.event", {"seq": i})
+    emit_us = (time.perf_counter() - emit_start) / max(1, args.events) * 1e6
+
+    began = time.perf_counter()
+    stats = receiver.state.stats
+    while len(receiver.state.seen_events) < args.events and time.perf_counter() - began < args.deadline:
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - began
+
+    dead = 0
+    for client in clients:
+        dead += await dispatcher.redis.llen(f"webhook:dead:{client.id}")
+    await dispatcher.stop()
+    server.should_exit = True
+    await server_task
+
+    print(json.dumps({
+        "events": args.events,
+        "delivered_unique": len(receiver.state.seen_events),
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(len(receiver.state.seen_events) / elapsed, 1) if elapsed else None,
+        "emit_us_per_call": round(emit_us, 2),
+        "dead_letter_batches": dead,
+        "receiver": stats,
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "drive"):
+        p = sub.add_parser(name)
+        p.add_argument("--secret", default="bench-webhook-secret")
+        p.add_argument("--latency-ms", type=float, default=20.0)
+        p.add_argument("--jitter-ms", type=float, default=5.0)
+        p.add_argument("--failure-rate", type=float, default=0.0)
+        p.add_argument("--slow-rate", type=float, default=0.0)
+        p.add_argument("--slow-ms", type=float, default=2000.0)
+        if name == "serve":
+            p.add_argument("--port", type=int, default=8901)
+        else:
+            p.add_argument("--redis-url", default=None)
+            p.add_argument("--events", type=int, default=2000)
+            p.add_argument("--clients", type=int, default=10)
+            p.add_argument("--workers", type=int, default=16)
+            p.add_argument("--per-host", type=int, default=4)
+            p.add_argument("--batch-size", type=int, default=50)
+            p.add_argument("--max-attempts", type=int, default=8)
+            p.add_argument("--timeout", type=float, default=5.0)
+            p.add_argument("--deadline", type=float, default=120.0)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        import uvicorn
+        app = create_receiver(args.secret, args.latency_ms, args.jitter_ms, args.failure_rate, args.slow_rate, args.slow_ms)
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        asyncio.run(drive(args))
+
+
+if __name__ == "__main__":
+    main()
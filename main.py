@@ -1,29 +1,76 @@
 
+import hmac
 import logging
-from app.api import auth_routes, ship_routes, product_routes, google_routes
+from app.api import auth_routes, ship_routes, product_routes, google_routes, batch_routes, pdf_routes, image_routes, admin_routes
 from app.core.config import settings
-from app.core.logging_config import setup_logging
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.core.metrics import registry
+from app.core.profiling import loop_lag_monitor
+from app.database.database import init_engines, dispose_engines, db_pool_stats, get_engine, SessionLocal, ReplicaSessionLocal
 from app.middlewares.auth_middleware import SecurityMiddleware, LoggingMiddleware
-from app.services.firebase_service import initialize_firebase
+from app.middlewares.cache_middleware import ResponseCacheMiddleware
+from app.services.audit_partitions import audit_partitions
+from app.services.firestore_service import firestore_db
+from app.services.client_context import client_contexts
+from app.services.client_snapshot import client_snapshot
+from app.services.cors_policy import cors_registry
+from app.services.credential_service import credential_engine
+from app.services.image_proxy import image_proxy
+from app.services.pdf_queue import pdf_queue
+from app.services.quota_service import quota_engine
+from app.services.site_key_filter import site_key_filter
+from app.services.webhook_service import webhook_dispatcher
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 
 
-# --- Configuração Inicial ---
-setup_logging("fastapi_app", settings.LOG_FILE_PATH) 
 logger = logging.getLogger("fastapi_app")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # --- Sequência de inicialização ---
+    # Nada disso roda no import: logging, engines e SDKs são preparados aqui.
+    setup_logging(
+        "fastapi_app",
+        settings.LOG_FILE_PATH,
+        json_format=getattr(settings, "LOG_JSON", True),
+        sample_rates=getattr(settings, "LOG_SAMPLE_RATES", None)
+    )
     logger.info(f"Iniciando a aplicação: {settings.PROJECT_NAME} v{settings.PROJECT_VERSION}")
-    initialize_firebase()
+    init_engines()
+    # Inicializa o Firebase Admin SDK e o cliente assíncrono do Firestore
+    await firestore_db.start()
+    loop_lag_monitor.start()
+    await quota_engine.start(SessionLocal)
+    await credential_engine.start(ReplicaSessionLocal, SessionLocal)
+    cors_registry.session_factory = ReplicaSessionLocal
+    await client_snapshot.start(ReplicaSessionLocal)
+    # Cliente alterado no banco (status, origens, políticas): invalida os caches derivados
+    site_key_filter.on_change(client_contexts.invalidate_all)
+    site_key_filter.on_change(cors_registry.invalidate)
+    await site_key_filter.start(ReplicaSessionLocal)
+    await audit_partitions.start(get_engine("primary"))
+    await webhook_dispatcher.start()
+    await pdf_queue.start()
 
     yield
     logger.info("Encerrando a aplicação.")
+    await loop_lag_monitor.stop()
+    await pdf_queue.stop()
+    await quota_engine.stop()
+    await credential_engine.stop()
+    await webhook_dispatcher.stop()
+    await client_snapshot.stop()
+    await site_key_filter.stop()
+    await firestore_db.stop()
+    await audit_partitions.stop()
+    image_proxy.shutdown()
+    await dispose_engines()
     print("\nRotas registradas:")
     for route in app.routes:
         print(f"{route.path} -> {route.methods}")
+    shutdown_logging()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -32,14 +79,10 @@ app = FastAPI(
 )
 
 # --- Middlewares ---
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.ALLOWED_HOSTS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*", "x-api-token"],
-)
+# CORS por cliente (allowed_origins) + ALLOWED_HOSTS: tratado no SecurityMiddleware
 
+# Executa após a autenticação (middlewares adicionados depois ficam por fora)
+app.add_middleware(ResponseCacheMiddleware)
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(SecurityMiddleware)
 
@@ -51,6 +94,10 @@ app.include_router(auth_routes.router, prefix="/api/v1/auth", tags=["Authenticat
 app.include_router(ship_routes.router, prefix="/api/v1/shipping", tags=["Shipping Services"])
 app.include_router(product_routes.router, prefix="/api/v1/products", tags=["Products Services"])
 app.include_router(google_routes.router, prefix="/api/v1/google", tags=["Google Backend Services"])
+app.include_router(pdf_routes.router, prefix="/api/v1/pdf", tags=["PDF Services"])
+app.include_router(batch_routes.router, prefix="/api/v1/batch", tags=["Batch Services"])
+app.include_router(image_routes.router, prefix="/api/v1/images", tags=["Image Services"])
+app.include_router(admin_routes.router, prefix="/api/v1/admin", tags=["Admin"])
 
 @app.get("/", tags=["Root"])
 async def read_root():
@@ -60,6 +107,20 @@ async def read_root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/db", tags=["Health Check"])
+async def health_check_db():
+    return {"engines": db_pool_stats()}
+
+@app.get("/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+async def metrics(request: Request):
+    # Fecha por padrão: os rótulos expõem os client_id dos tenants
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not token:
+        raise HTTPException(status_code=403, detail="Métricas desabilitadas")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Não autorizado")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/secure-data/")
 def get_secure_data():
     return {"data": "Este ambiente é protegido por Akira FN Solutions!"}